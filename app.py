@@ -1,17 +1,61 @@
 # app.py
 
-from flask import Flask, request, jsonify, render_template
-from models import db, Task # dbとTaskはmodels.pyからインポート
-from datetime import datetime
-from sqlalchemy import or_
+import base64
+import json
+import click
+from types import SimpleNamespace
+from flask import Flask, request, jsonify, render_template, stream_with_context
+from models import db, Task, TaskArchive, ACTIVE_STATUSES # dbとTaskはmodels.pyからインポート
+from schema import upgrade_schema
+from db_config import database_profile, database_uri, engine_options, init_engine
+from task_actions import ACTION_NAMES, ACTIONS, ActionError, parse_datetime, plan_delete, plan_end, plan_pause, plan_restore, plan_start, plan_update
+from serializers import FULL_FIELDS, SUMMARY_FIELDS, dumps, fetch_dicts, rows_to_dicts, select_fields
+from cache import STATUS_LISTS, init_list_cache, list_versions, mark_lists_changed, response_cache
+from changes import acquire_stream_slot, change_feeds, event_stream, record_changes, release_stream_slot
+from deadlines import deadline_schedulers
+from search import SEARCH_TIERS, parse_terms, rebuild_search_index, search_available, search_tasks
+from intervals import RANGE_KINDS, overlap_statement, range_index_available
+from archive import archive_tasks, compact_database, thaw_tasks
+from stats import BUCKETS, STATS_FIELDS, StatsDelta, completion_series, overdue_count, rebuild_stats, snapshot
+from metrics import init_metrics, instrument_engine, metrics_enabled
+from compression import COMPRESS_RESPONSES, init_compression, is_compressed
+from assets import build_assets, init_assets
+from group_commit import group_writer
+from boards import DEFAULT_BOARD, board_key, board_option, current_board, init_boards, shards, valid_board_name
+from transfer import EXPORT_FORMATS, TASK_STATUSES, ImportAborted, export_chunks, import_tasks, read_lines
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_
+from werkzeug.exceptions import BadRequest
 
 # Initialize Flask app
 app = Flask(__name__)
 # Configure the SQLAlchemy part of the app instance
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tasks.db' # Use SQLite for simplicity
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri() # DATABASE_URL, defaults to SQLite (sqlite:///tasks.db)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False # Disable modification tracking to save resources
+# Engine tuning profile (DB_PROFILE): WAL/pragmas/pool sizing, see db_config.py
+app.config['DB_PROFILE'] = database_profile()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config['DB_PROFILE'])
 # Initialize SQLAlchemy with the Flask app
 db.init_app(app)
+with app.app_context():
+    init_engine(db.engine, app.config['DB_PROFILE'])
+# Bump list versions for the ETags/response cache when a write commits
+init_list_cache(db.session)
+# Wake the board's change feed (/events, /changes) when a write commits
+change_feeds.init_app(app, db.session)
+# Overdue / due-soon tasks (/due) and 'overdue' change events, kept current by the feed, see deadlines.py
+deadline_schedulers.init_app(app, change_feeds)
+# Opt-in request/SQL instrumentation and /metrics (METRICS_ENABLED), see metrics.py
+if metrics_enabled():
+    with app.app_context():
+        init_metrics(app, db.engine)
+    shards.on_engine(instrument_engine)
+# gzip/brotli for larger JSON responses (after metrics: it records the compressed size), see compression.py
+init_compression(app)
+# Content-hashed static files with immutable caching (flask build-assets), see assets.py
+init_assets(app)
+# Boards under /boards/<board>/, each in its own database shard (after metrics: unknown boards are counted), see boards.py
+init_boards(app, db)
 
 # init_database関数はそのまま残す
 def init_database():
@@ -19,8 +63,42 @@ def init_database():
     print("Initializing database...") # デバッグ用として追加
     with app.app_context():
         db.create_all()
+        upgrade_schema() # 既存の tasks.db に不足しているインデックスを追加
     print("Database initialized.") # デバッグ用として追加
 
+@app.cli.command('upgrade-db')
+@board_option
+def upgrade_db_command():
+    """Creates missing tables and indexes in an existing database."""
+    engine = db.session.get_bind()
+    db.metadata.create_all(engine)
+    created = upgrade_schema(engine)
+    print(f"Created: {', '.join(created)}" if created else "Database is up to date.")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Writes content-hashed, precompressed copies of the static files to static/dist."""
+    manifest = build_assets(app.static_folder)
+    print(f"Built {len(manifest)} asset(s) into static/dist (restart the server to use them).")
+
+@app.cli.command('archive-tasks')
+@click.option('--days', default=90, show_default=True, type=click.IntRange(min=0),
+              help='Archive completed/deleted tasks that ended more than this many days ago.')
+@click.option('--batch-size', default=5000, show_default=True, type=click.IntRange(min=1),
+              help='Tasks moved per transaction.')
+@click.option('--compact', type=click.Choice(['full', 'incremental', 'none']), default='full', show_default=True,
+              help='Compaction afterwards: VACUUM, PRAGMA incremental_vacuum, or nothing.')
+@board_option
+def archive_tasks_command(days, batch_size, compact):
+    """Moves old completed/deleted tasks to tasks_archive and compacts the database."""
+    moved = archive_tasks(days, batch_size)
+    print(f"Archived {moved} task(s).")
+    if moved and compact != 'none':
+        if compact_database(db.session.get_bind(), incremental=compact == 'incremental'):
+            print("Database compacted.")
+        else:
+            print("Compaction skipped (SQLite only; incremental requires PRAGMA auto_vacuum=INCREMENTAL).")
+
 # init_database() # グローバルスコープでの呼び出しは削除しました
 
 @app.route('/')
@@ -30,90 +108,117 @@ def index():
     """
     return render_template('index.html')
 
-def parse_datetime(date_string):
+def touch_lists(*statuses, session=None):
     """
-    Helper function to parse a date string into a datetime object.
-    Supports 'YYYY-MM-DDTHH:MM' and 'YYYY-MM-DD' formats.
-    Returns None if the string is empty or parsing fails.
+    Marks the task listings that show tasks in the given statuses as changed
+    by the current transaction. Their versions are bumped on commit, which
+    invalidates the cached responses and ETags of those lists.
+    """
+    session = session or db.session
+    board = current_board(session)
+    mark_lists_changed(session, *(board_key(STATUS_LISTS[status], board) for status in statuses if status in STATUS_LISTS))
+
+# Answers to a request body that is not valid JSON or not a JSON object (same in the ASGI app)
+INVALID_JSON_ERROR = 'Invalid JSON payload'
+JSON_OBJECT_ERROR = 'Invalid payload. Expected a JSON object.'
+
+def request_json(silent=False):
+    """
+    Reads the request's JSON payload, which must be an object, whatever the
+    Content-Type. Returns (data, None), or (None, error response) for a body
+    that is missing, not valid JSON or not an object. With silent, a missing
+    or unreadable body reads as {}.
     """
-    if not date_string:
-        return None
     try:
-        # Try parsing with time first
-        return datetime.strptime(date_string, '%Y-%m-%dT%H:%M')
-    except ValueError:
-        try:
-            # Fallback to date-only parsing
-            return datetime.strptime(date_string, '%Y-%m-%d')
-        except ValueError:
-            # Return None if both parsing attempts fail
-            return None
+        data = request.get_json(force=True)
+    except BadRequest:
+        if silent:
+            return {}, None
+        return None, (jsonify({'error': INVALID_JSON_ERROR}), 400)
+    if not isinstance(data, dict):
+        return None, (jsonify({'error': JSON_OBJECT_ERROR}), 400)
+    return data, None
+
+def json_response(obj, status=200):
+    """
+    Builds a JSON response with the fast encoder from serializers.py.
+    """
+    return app.response_class(dumps(obj), status=status, mimetype='application/json')
 
+def cached_list_response(list_name, build):
+    """
+    Serves a task listing with a strong ETag derived from the list's version.
+    Answers 304 if the client already has the current version, and otherwise
+    serves the serialized JSON from the in-process cache when possible, so an
+    unchanged list costs neither a query nor serialization.
+    build() is only called on a cache miss and returns the object to serialize.
+    The 304 carries the ETag exactly as the 200 would (weak when compressed).
+    """
+    list_name = board_key(list_name, current_board())
+    key = (list_name, tuple(sorted(request.args.items(multi=True))))
+    # Read the version before querying: a write committed meanwhile bumps it,
+    # so the entry built here is simply never served again.
+    version = list_versions.get(list_name)
+    etag = response_cache.etag(key, version)
+
+    body = response_cache.get(key, version)
+    if body is None:
+        # Also on a 304 whose entry was evicted: the body's size decides
+        # whether the 200 was compressed, and so the form of its ETag
+        body = dumps(build())
+        response_cache.put(key, version, body)
+
+    # Weak comparison (RFC 9110): compressed responses carry the ETag as W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        if COMPRESS_RESPONSES:
+            response.vary.add('Accept-Encoding')
+        response.set_etag(etag, weak=is_compressed(len(body), request.accept_encodings))
+    else:
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag) # compression.py makes it weak if it compresses the body
+
+    response.headers['Cache-Control'] = 'no-cache' # Browsers revalidate with If-None-Match on every fetch
+    return response
+
+def active_tasks_statement(sort_by, fields):
+    """
+    SELECT of the active tasks (plain row tuples of the projected columns),
+    sorted by 'display_order' (default) or 'limit_date'.
+    """
+    statement = select_fields(fields).where(Task.active_filter())
+    if sort_by == 'limit_date':
+        return statement.order_by(Task.limit_date.asc(), Task.display_order.asc())
+    return statement.order_by(Task.display_order.asc(), Task.limit_date.asc())
 
 @app.route('/get_tasks', methods=['GET'])
 def get_tasks():
     """
     API endpoint to fetch active tasks (status 'todo' or 'doing').
     Supports sorting by 'display_order' (default) or 'limit_date'.
+    Returns the summary projection without 'detail' unless ?view=full is given.
     """
     try:
         sort_by = request.args.get('sort_by', 'display_order') # Default sort by display_order
 
-        # Base query for active tasks
-        query = Task.query.filter(or_(Task.status == 'todo', Task.status == 'doing'))
-
-        # Apply sorting based on query parameter
-        if sort_by == 'limit_date':
-            query = query.order_by(Task.limit_date.asc(), Task.display_order.asc())
-        else: # Default or sort_by == 'display_order'
-            query = query.order_by(Task.display_order.asc(), Task.limit_date.asc())
-        
-        tasks = query.all()
-        
-        # Serialize tasks to a list of dictionaries
-        output = []
-        for task in tasks:
-            output.append({
-                'id': task.id,
-                'name': task.name,
-                'detail': task.detail,
-                'limit_date': task.limit_date.isoformat() if task.limit_date else None,
-                'scheduled_start_date': task.scheduled_start_date.isoformat() if task.scheduled_start_date else None,
-                'scheduled_end_date': task.scheduled_end_date.isoformat() if task.scheduled_end_date else None,
-                'actual_start_date': task.actual_start_date.isoformat() if task.actual_start_date else None,
-                'actual_end_date': task.actual_end_date.isoformat() if task.actual_end_date else None,
-                'is_not_main': task.is_not_main,
-                'status': task.status,
-                'display_order': task.display_order,
-                'created_at': task.created_at.isoformat(),
-                'updated_at': task.updated_at.isoformat()
-            })
-        return jsonify(output)
+        # List views get the summary projection (no 'detail'); ?view=full includes it
+        fields = FULL_FIELDS if request.args.get('view') == 'full' else SUMMARY_FIELDS
+
+        return cached_list_response('active', lambda: fetch_dicts(active_tasks_statement(sort_by, fields), fields))
     except Exception as e:
         # Generic error handler for unexpected issues
         return jsonify({'error': f'Failed to retrieve tasks: {str(e)}'}), 500
 
-def task_to_dict(task):
-    """
-    Helper function to convert a Task model object to a dictionary.
-    This is useful for JSON serialization.
-    """
-    return {
-        'id': task.id,
-        'name': task.name,
-        'detail': task.detail,
-        'limit_date': task.limit_date.isoformat() if task.limit_date else None,
-        'scheduled_start_date': task.scheduled_start_date.isoformat() if task.scheduled_start_date else None,
-        'scheduled_end_date': task.scheduled_end_date.isoformat() if task.scheduled_end_date else None,
-        'actual_start_date': task.actual_start_date.isoformat() if task.actual_start_date else None,
-        'actual_end_date': task.actual_end_date.isoformat() if task.actual_end_date else None,
-        'is_not_main': task.is_not_main,
-        'status': task.status,
-        'display_order': task.display_order,
-        'delete_reason': task.delete_reason,
-        'created_at': task.created_at.isoformat(),
-        'updated_at': task.updated_at.isoformat()
-    }
+def find_task_detail(task_id, session=None):
+    """
+    Returns the full projection of a task, from either tier, as a dict
+    (None if there is no such task).
+    """
+    session = session or db.session
+    row = session.execute(select_fields(FULL_FIELDS).where(Task.id == task_id)).first()
+    if row is None: # Not in the hot table: look in the archive
+        row = session.execute(select_fields(FULL_FIELDS, TaskArchive).where(TaskArchive.id == task_id)).first()
+    return rows_to_dicts([row], FULL_FIELDS)[0] if row else None
 
 @app.route('/task/<int:task_id>', methods=['GET'])
 def get_task_detail(task_id):
@@ -121,72 +226,74 @@ def get_task_detail(task_id):
     API endpoint to fetch details for a specific task by its ID.
     """
     try:
-        task = db.session.get(Task, task_id)
+        task = find_task_detail(task_id)
         if task:
-            return jsonify(task_to_dict(task))
+            return json_response(task)
         else:
             return jsonify({'error': 'Task not found'}), 404 # Not Found
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve task details: {str(e)}'}), 500
 
+def apply_action(plan, task_id, data, now, session=None):
+    """
+    Validates and applies one lifecycle action (a plan_* function from
+    task_actions.py) to a task in the current transaction, without committing.
+    An archived task is planned in place and moved back to the tasks table
+    only if the action changes it. Returns (body, status, changed).
+    """
+    session = session or db.session
+    task = session.get(Task, task_id) or session.get(TaskArchive, task_id)
+    if task is None:
+        return {'error': 'Task not found'}, 404, False
+    try:
+        values, body = plan(task, data or {}, now)
+    except ActionError as e:
+        return {'error': e.message}, e.status, False
+    if not values:
+        return body, 200, False
+
+    if isinstance(task, TaskArchive):
+        session.expunge(task)
+        thaw_tasks(session, [task_id])
+        task = session.get(Task, task_id)
+    touch_lists(task.status, values.get('status', task.status), session=session)
+    before = snapshot(task)
+    for column, value in values.items():
+        setattr(task, column, value)
+    stats = StatsDelta()
+    stats.change(before, task) # Completing, restoring or deleting moves the task in or out of /stats
+    stats.apply(session)
+    record_changes(session, [(task.id, ACTION_NAMES[plan])])
+    return body, 200, True
+
+def run_action(plan, task_id, data=None):
+    """
+    Applies a lifecycle action and commits it, either directly or, in
+    group-commit mode (GROUP_COMMIT), batched with concurrent writes by the
+    writer thread (see group_commit.py). Returns the JSON response.
+    """
+    now = datetime.utcnow()
+    if group_writer.enabled:
+        body, status, changed = group_writer.submit(plan, task_id, data, now)
+    else:
+        body, status, changed = apply_action(plan, task_id, data, now)
+        if changed:
+            db.session.commit()
+    return jsonify(body), status
+
+# Optional single writer thread batching the task actions into shared commits (GROUP_COMMIT), see group_commit.py
+group_writer.init_app(app, apply_action)
+
 @app.route('/update_task/<int:task_id>', methods=['POST'])
 def update_task(task_id):
     """
     API endpoint to update an existing task's details.
     """
+    data, error = request_json() # Get data from JSON payload
+    if error:
+        return error
     try:
-        task = db.session.get(Task, task_id)
-        if not task:
-            return jsonify({'error': 'Task not found'}), 404
-
-        data = request.get_json() # Get data from JSON payload
-
-        # Extract and validate required fields
-        name = data.get('name')
-        if not name:
-            return jsonify({'error': 'Name is required'}), 400 # Bad Request
-
-        limit_date_str = data.get('limit_date')
-        if not limit_date_str:
-            return jsonify({'error': 'Limit date is required'}), 400
-        
-        limit_date = parse_datetime(limit_date_str)
-        if not limit_date:
-            return jsonify({'error': f'Invalid limit_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}), 400
-
-        # Extract and validate optional date fields
-        scheduled_start_date_str = data.get('scheduled_start_date')
-        scheduled_end_date_str = data.get('scheduled_end_date')
-        
-        scheduled_start_date = parse_datetime(scheduled_start_date_str)
-        scheduled_end_date = parse_datetime(scheduled_end_date_str)
-
-        if scheduled_start_date_str and not scheduled_start_date:
-             return jsonify({'error': f'Invalid scheduled_start_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}), 400
-        
-        if scheduled_end_date_str and not scheduled_end_date:
-            return jsonify({'error': f'Invalid scheduled_end_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}), 400
-
-        # Validate consistency of scheduled dates
-        if (scheduled_start_date and not scheduled_end_date) or \
-           (not scheduled_start_date and scheduled_end_date):
-            return jsonify({'error': 'Both scheduled_start_date and scheduled_end_date must be provided if one is present, or both left empty.'}), 400
-
-        # Extract is_not_main (newly added for update)
-        is_not_main = data.get('is_not_main', task.is_not_main) # Default to existing value if not provided
-
-        # Update task attributes
-        task.name = name
-        task.detail = data.get('detail') # Detail is optional
-        task.limit_date = limit_date
-        task.scheduled_start_date = scheduled_start_date
-        task.scheduled_end_date = scheduled_end_date
-        task.is_not_main = is_not_main # ★★★ ADDED: Update is_not_main ★★★
-        # is_not_main and status are handled by other specific routes or not updated here by default
-        task.updated_at = datetime.utcnow() # Update timestamp
-
-        db.session.commit() # Commit changes to the database
-        return jsonify({'message': 'Task updated successfully'})
+        return run_action(plan_update, task_id, data)
 
     except Exception as e:
         db.session.rollback() # Rollback in case of error
@@ -197,22 +304,11 @@ def delete_task_route(task_id):
     """
     API endpoint to soft-delete a task (mark as 'deleted').
     """
+    data, error = request_json(silent=True)
+    if error:
+        return error
     try:
-        task = db.session.get(Task, task_id)
-        if not task:
-            return jsonify({'error': 'Task not found'}), 404
-
-        data = request.get_json()
-        delete_reason = data.get('delete_reason', None) # Optional reason for deletion
-
-        # Perform soft delete
-        task.status = 'deleted'
-        task.delete_reason = delete_reason
-        task.actual_end_date = datetime.utcnow() # Mark deletion time as actual end time
-        task.updated_at = datetime.utcnow()
-
-        db.session.commit()
-        return jsonify({'message': 'Task deleted successfully'})
+        return run_action(plan_delete, task_id, data)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to delete task: {str(e)}'}), 500
@@ -223,25 +319,7 @@ def start_task_route(task_id):
     API endpoint to mark a task as 'doing' and set its actual start time.
     """
     try:
-        task = db.session.get(Task, task_id)
-        if not task:
-            return jsonify({'error': 'Task not found'}), 404
-
-        # Handle idempotency: if already completed, do nothing further.
-        if task.status == 'completed':
-            return jsonify({'message': 'Task is already completed', 'actual_start_date': task.actual_start_date.isoformat() if task.actual_start_date else None}), 200
-        
-        # Set actual_start_date only if not already set (first time starting)
-        task.actual_start_date = task.actual_start_date or datetime.utcnow() 
-        task.status = 'doing' # Update status
-        task.updated_at = datetime.utcnow()
-
-        db.session.commit()
-        return jsonify({
-            'message': 'Task started', 
-            'actual_start_date': task.actual_start_date.isoformat(),
-            'status': task.status
-        })
+        return run_action(plan_start, task_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to start task: {str(e)}'}), 500
@@ -254,23 +332,7 @@ def pause_task_route(task_id):
     Keeps actual_start_date if already set, but clears actual_end_date (if it was set).
     """
     try:
-        task = db.session.get(Task, task_id)
-        if not task:
-            return jsonify({'error': 'Task not found'}), 404
-
-        if task.status != 'doing':
-            return jsonify({'error': 'Task is not in a "doing" state and cannot be paused.'}), 400
-
-        task.status = 'todo'
-        task.actual_end_date = None # Clear end date if it was set (e.g. if it was completed and then restored)
-        task.updated_at = datetime.utcnow()
-
-        db.session.commit()
-        return jsonify({
-            'message': 'Task paused (returned to todo)',
-            'task_id': task.id,
-            'new_status': task.status
-        })
+        return run_action(plan_pause, task_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to pause task: {str(e)}'}), 500
@@ -282,83 +344,254 @@ def end_task_route(task_id):
     API endpoint to mark a task as 'completed' and set its actual end time.
     """
     try:
-        task = db.session.get(Task, task_id)
-        if not task:
-            return jsonify({'error': 'Task not found'}), 404
-
-        # Handle idempotency: if already completed, do nothing further.
-        if task.status == 'completed':
-            return jsonify({'message': 'Task is already completed', 'actual_end_date': task.actual_end_date.isoformat() if task.actual_end_date else None}), 200
-
-        # Ensure task has a start time; if not, set it to now (e.g., if started and ended immediately)
-        if not task.actual_start_date: 
-            task.actual_start_date = datetime.utcnow()
-        
-        task.actual_end_date = datetime.utcnow() # Set actual end time
-        task.status = 'completed' # Update status
-        task.updated_at = datetime.utcnow()
-
-        db.session.commit()
-        return jsonify({
-            'message': 'Task completed', 
-            'actual_start_date': task.actual_start_date.isoformat(),
-            'actual_end_date': task.actual_end_date.isoformat(),
-            'status': task.status
-        })
+        return run_action(plan_end, task_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to end task: {str(e)}'}), 500
 
+# Gap left between the display_order values of neighbouring tasks.
+# Moving a task between two others then only rewrites the moved task's row;
+# the list is renumbered only when two neighbours have no gap left between them.
+DISPLAY_ORDER_STEP = 1024
+
+def parse_task_id(value):
+    """
+    Converts a task ID from a JSON payload (number or numeric string) to int.
+    Raises ValueError for anything else.
+    """
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f'Invalid task ID: {value!r}')
+    return int(value)
+
+def write_display_orders(new_orders, current_orders):
+    """
+    Writes the display_order of every task whose value actually changes, in a
+    single executemany UPDATE. Returns the number of rows written.
+    """
+    now = datetime.utcnow()
+    changed = [
+        {'id': task_id, 'display_order': order, 'updated_at': now}
+        for task_id, order in new_orders.items()
+        if current_orders.get(task_id) != order
+    ]
+    if changed:
+        db.session.execute(db.update(Task), changed)
+        record_changes(db.session, [(row['id'], 'reorder') for row in changed], now)
+        touch_lists(*ACTIVE_STATUSES)
+    return len(changed)
+
+def reorder_all(ordered_ids):
+    """
+    Handles the full form of update_task_order: the complete list of task IDs
+    in their new order. One SELECT validates the IDs, then only the tasks
+    whose position changed are written.
+    """
+    current_orders = dict(db.session.execute(
+        db.select(Task.id, Task.display_order).where(Task.id.in_(ordered_ids))
+    ).all())
+    for task_id in ordered_ids:
+        if task_id not in current_orders:
+            # This case should ideally not happen if frontend and backend are in sync.
+            return jsonify({'error': f'Task with ID {task_id} not found during reorder.'}), 404
+
+    new_orders = {task_id: index * DISPLAY_ORDER_STEP for index, task_id in enumerate(ordered_ids)}
+    updated = write_display_orders(new_orders, current_orders)
+    db.session.commit()
+    return jsonify({'message': 'Task order updated successfully', 'updated': updated})
+
+def move_task(task_id, prev_id, next_id):
+    """
+    Handles the delta form of update_task_order: place task_id between the
+    tasks prev_id (shown above it) and next_id (shown below it). Either
+    neighbour may be None when the task is moved to the top or the bottom.
+    """
+    if task_id in (prev_id, next_id) or (prev_id is not None and prev_id == next_id):
+        return jsonify({'error': 'Invalid payload. "prev_id" and "next_id" must be two other tasks.'}), 400
+    ids = [i for i in (task_id, prev_id, next_id) if i is not None]
+    rows = {row.id: row for row in db.session.execute(
+        db.select(Task.id, Task.display_order, Task.status).where(Task.id.in_(ids))
+    )}
+    for i in ids:
+        if i not in rows:
+            return jsonify({'error': f'Task with ID {i} not found during reorder.'}), 404
+    if any(row.status not in ACTIVE_STATUSES for row in rows.values()):
+        return jsonify({'error': 'Only active tasks can be reordered.'}), 400
+
+    prev_order = rows[prev_id].display_order if prev_id is not None else None
+    next_order = rows[next_id].display_order if next_id is not None else None
+
+    if prev_order is not None and next_order is not None:
+        new_order = (prev_order + next_order) // 2 if next_order - prev_order > 1 else None
+    elif prev_order is not None:
+        new_order = prev_order + DISPLAY_ORDER_STEP
+    elif next_order is not None:
+        new_order = next_order - DISPLAY_ORDER_STEP
+    else:
+        return jsonify({'message': 'Task order updated successfully', 'updated': 0})
+
+    if new_order is not None:
+        updated = write_display_orders({task_id: new_order}, {task_id: rows[task_id].display_order})
+    else:
+        # No gap left between the neighbours: renumber the active list with
+        # fresh gaps, inserting the moved task right after prev_id.
+        current_orders = dict(db.session.execute(
+            db.select(Task.id, Task.display_order).where(Task.active_filter())
+            .order_by(Task.display_order.asc(), Task.limit_date.asc())
+        ).all())
+        active_ids = [i for i in current_orders if i != task_id]
+        active_ids.insert(active_ids.index(prev_id) + 1, task_id)
+        new_orders = {i: index * DISPLAY_ORDER_STEP for index, i in enumerate(active_ids)}
+        updated = write_display_orders(new_orders, current_orders)
+
+    db.session.commit()
+    return jsonify({'message': 'Task order updated successfully', 'updated': updated})
+
 @app.route('/update_task_order', methods=['POST'])
 def update_task_order():
     """
     API endpoint to update the display order of tasks.
-    Expects a JSON payload with a list of task IDs in the new desired order.
-    """
-    data = request.get_json()
-    ordered_ids = data.get('ordered_ids')
-
-    if not ordered_ids or not isinstance(ordered_ids, list):
-        return jsonify({'error': 'Invalid payload. "ordered_ids" must be a list.'}), 400
-
-    try:
-        # Use a nested transaction to ensure all order updates succeed or fail together.
-        with db.session.begin_nested(): 
-            for index, task_id in enumerate(ordered_ids):
-                task = db.session.get(Task, task_id)
-                if task:
-                    task.display_order = index # Update display_order based on new position
-                    task.updated_at = datetime.utcnow()
-                else:
-                    # This case should ideally not happen if frontend and backend are in sync.
-                    return jsonify({'error': f'Task with ID {task_id} not found during reorder.'}), 404 
-        db.session.commit() # Commit the main transaction if nested transaction was successful
-        return jsonify({'message': 'Task order updated successfully'})
+    Accepts either of two JSON payloads:
+      - {"ordered_ids": [...]}: the full list of task IDs in the new desired order.
+      - {"task_id": X, "prev_id": Y, "next_id": Z}: move task X between tasks
+        Y and Z (either may be null at the top/bottom of the list). Only the
+        moved task's row is written in the common case.
+    """
+    data, error = request_json()
+    if error:
+        return error
+
+    try:
+        if 'task_id' in data:
+            task_id = parse_task_id(data.get('task_id'))
+            prev_id = parse_task_id(data['prev_id']) if data.get('prev_id') is not None else None
+            next_id = parse_task_id(data['next_id']) if data.get('next_id') is not None else None
+        else:
+            ordered_ids = data.get('ordered_ids')
+            if not ordered_ids or not isinstance(ordered_ids, list):
+                return jsonify({'error': 'Invalid payload. "ordered_ids" must be a list.'}), 400
+            ordered_ids = [parse_task_id(task_id) for task_id in ordered_ids]
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid payload. {str(e)}'}), 400
+
+    try:
+        if 'task_id' in data:
+            return move_task(task_id, prev_id, next_id)
+        return reorder_all(ordered_ids)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to update task order: {str(e)}'}), 500
 
+# Page size for the completed/deleted archives (overridable with ?limit=)
+ARCHIVE_PAGE_SIZE = 50
+ARCHIVE_PAGE_SIZE_MAX = 500
+
+def encode_cursor(sort_value, task_id):
+    """
+    Encodes the keyset position (sort column value, id) of the last row of a
+    page into an opaque, URL-safe cursor string. The sort value may be None.
+    """
+    payload = json.dumps([sort_value.isoformat() if sort_value is not None else None, task_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor created by encode_cursor().
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, task_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(sort_value) if sort_value is not None else None), int(task_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def parse_page_limit(args=None):
+    """
+    Reads the ?limit= query parameter for paginated listings.
+    Raises ValueError if it is not a positive integer; values above the
+    maximum are clamped.
+    """
+    args = request.args if args is None else args
+    limit = args.get('limit', ARCHIVE_PAGE_SIZE, type=int)
+    if limit < 1:
+        raise ValueError('"limit" must be a positive integer')
+    return min(limit, ARCHIVE_PAGE_SIZE_MAX)
+
+def paginate_archive(status, sort_field, args=None, session=None):
+    """
+    Fetches one page of tasks with the given status, newest first, using
+    keyset pagination on (sort_field, id). Tasks without a sort value come
+    last, newest ID first. The next page starts strictly after the cursor,
+    so it costs one or two index range scans per tier (tasks and
+    tasks_archive; the second one reads the NULL sort values of a nullable
+    sort_field) however deep
+    the client has scrolled.
+    Returns a dict with the tasks (summary projection) and the cursor for the
+    next page (None on the last page).
+    """
+    args = request.args if args is None else args
+    session = session or db.session
+    limit = parse_page_limit(args)
+    cursor = args.get('cursor')
+    position = decode_cursor(cursor) if cursor else None
+
+    # The first limit + 1 rows of each tier, merged: the page is the first
+    # rows of the merge (one extra row tells whether another page exists)
+    rows = []
+    for model in (Task, TaskArchive):
+        sort_column = getattr(model, sort_field)
+        statement = select_fields(SUMMARY_FIELDS, model).where(model.status == status)
+        tier = []
+        if position is None or position[0] is not None:
+            dated = statement.where(sort_column.isnot(None))
+            if position:
+                dated = dated.where(tuple_(sort_column, model.id) < tuple_(*position))
+            tier = session.execute(dated.order_by(sort_column.desc(), model.id.desc()).limit(limit + 1)).all()
+        if len(tier) <= limit and sort_column.nullable:
+            # Then the rows without a sort value (their own range of the same
+            # index; a NOT NULL column such as updated_at has none to read)
+            undated = statement.where(sort_column.is_(None))
+            if position and position[0] is None:
+                undated = undated.where(model.id < position[1])
+            tier += session.execute(undated.order_by(model.id.desc()).limit(limit + 1 - len(tier))).all()
+        rows += tier
+    # Merge in the same order: NULL sort values last
+    rows.sort(key=lambda row: (row._mapping[sort_field] is not None, row._mapping[sort_field] or datetime.min, row.id),
+              reverse=True)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(last[sort_field], last['id'])
+
+    return {'tasks': rows_to_dicts(rows, SUMMARY_FIELDS), 'next_cursor': next_cursor}
+
 @app.route('/get_completed_tasks', methods=['GET'])
 def get_completed_tasks():
     """
-    API endpoint to fetch all tasks marked as 'completed'.
+    API endpoint to fetch tasks marked as 'completed', one page at a time.
     Tasks are ordered by their actual end date, descending (most recent first).
+    Pass the returned 'next_cursor' as ?cursor= to fetch the following page.
     """
     try:
-        tasks = Task.query.filter_by(status='completed').order_by(Task.actual_end_date.desc()).all()
-        return jsonify([task_to_dict(task) for task in tasks]) # Serialize using helper
+        return cached_list_response('completed', lambda: paginate_archive('completed', 'actual_end_date'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve completed tasks: {str(e)}'}), 500
 
 @app.route('/get_deleted_tasks', methods=['GET'])
 def get_deleted_tasks():
     """
-    API endpoint to fetch all tasks marked as 'deleted'.
+    API endpoint to fetch tasks marked as 'deleted', one page at a time.
     Tasks are ordered by their last update time (deletion time), descending.
+    Pass the returned 'next_cursor' as ?cursor= to fetch the following page.
     """
     try:
-        tasks = Task.query.filter_by(status='deleted').order_by(Task.updated_at.desc()).all()
-        return jsonify([task_to_dict(task) for task in tasks]) # Serialize using helper
+        return cached_list_response('deleted', lambda: paginate_archive('deleted', 'updated_at'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve deleted tasks: {str(e)}'}), 500
 
@@ -368,51 +601,153 @@ def restore_task_route(task_id):
     API endpoint to restore a 'completed' or 'deleted' task back to 'todo'.
     """
     try:
-        task = db.session.get(Task, task_id)
-        if not task:
-            return jsonify({'error': 'Task not found'}), 404
+        return run_action(plan_restore, task_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to restore task: {str(e)}'}), 500
+
+# Maximum number of operations accepted by one /tasks/batch request
+BATCH_MAX_OPERATIONS = 1000
+
+@app.route('/tasks/batch', methods=['POST'])
+def batch_tasks():
+    """
+    API endpoint to apply many lifecycle actions in a single transaction.
+    Expects a JSON payload such as:
+        {"operations": [{"action": "end", "task_id": 1},
+                        {"action": "delete", "task_id": 2, "delete_reason": "..."},
+                        {"action": "update", "task_id": 3, "name": "...", "limit_date": "..."}],
+         "atomic": false}
+    Actions are 'update', 'delete', 'start', 'pause', 'end' and 'restore', with
+    the same validation as the single-task routes. Operations run in order, so
+    later operations see the effect of earlier ones on the same task.
+    Every operation gets a result entry with its own HTTP-style 'code'. Failed
+    operations are skipped; with "atomic": true any failure rejects the whole batch.
+    All tasks are read with one SELECT and written with one executemany UPDATE
+    per set of changed columns, followed by a single commit.
+    """
+    data, error = request_json()
+    if error:
+        return error
+    operations = data.get('operations')
+    atomic = bool(data.get('atomic', False))
+
+    if not operations or not isinstance(operations, list):
+        return jsonify({'error': 'Invalid payload. "operations" must be a non-empty list.'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'Too many operations (maximum is {BATCH_MAX_OPERATIONS}).'}), 400
+
+    results = []
+    planned = [] # (result index, task_id, action, values) of the operations that passed validation
+    try:
+        task_ids = set()
+        for op in operations:
+            if not isinstance(op, dict):
+                continue
+            try:
+                task_ids.add(parse_task_id(op.get('task_id')))
+            except (TypeError, ValueError):
+                pass
+        task_ids.discard(None)
+
+        # Snapshot of the columns the planners and /stats look at, for every
+        # task in the batch (archived tasks included: they are only moved back
+        # if an operation changes them)
+        states = {}
+        for model in (Task, TaskArchive):
+            for row in db.session.execute(
+                db.select(model.id, *(getattr(model, field) for field in STATS_FIELDS))
+                .where(model.id.in_(task_ids))
+            ):
+                states.setdefault(row.id, SimpleNamespace(**row._mapping))
+        stats = StatsDelta()
+
+        now = datetime.utcnow()
+        for index, op in enumerate(operations):
+            if not isinstance(op, dict):
+                results.append({'index': index, 'task_id': None, 'action': None,
+                                'code': 400, 'error': 'Invalid operation. Expected a JSON object.'})
+                continue
+            action = op.get('action')
+            result = {'index': index, 'task_id': op.get('task_id'), 'action': action}
+            try:
+                plan = ACTIONS.get(action)
+                if plan is None:
+                    raise ActionError(f'Unknown action: {action!r}')
+                try:
+                    task_id = parse_task_id(op.get('task_id'))
+                except (TypeError, ValueError) as e:
+                    raise ActionError(str(e))
+                task = states.get(task_id)
+                if task is None:
+                    raise ActionError('Task not found', 404)
+
+                values, body = plan(task, op, now)
+                if values:
+                    touch_lists(task.status, values.get('status', task.status))
+                    before = snapshot(task)
+                    vars(task).update((column, value) for column, value in values.items() if column in vars(task))
+                    stats.change(before, task)
+                    planned.append((index, task_id, action, values))
+                result.update(code=200, result=body)
+            except ActionError as e:
+                result.update(code=e.status, error=e.message)
+            results.append(result)
 
-        if task.status not in ['completed', 'deleted']:
-            return jsonify({'error': 'Task is not in a restorable state (must be completed or deleted).'}), 400
+        failed = sum(1 for result in results if result['code'] != 200)
+        if atomic and failed:
+            db.session.rollback()
+            return jsonify({'error': f'Batch rejected: {failed} operation(s) failed.',
+                            'applied': 0, 'failed': failed, 'results': results}), 400
 
-        # Restore logic
-        task.status = 'todo'  # Always restore to 'todo'
-        task.actual_end_date = None # Clear actual end date
-        task.delete_reason = None   # Clear delete reason
-        # actual_start_date can remain, indicating it was once started.
-        # display_order is kept. It will reappear in active tasks based on this order.
-        # If it needs to go to the top, display_order should be reset to 0 or handled by a specific re-prioritization feature.
-        task.updated_at = datetime.utcnow()
+        # Merge the changes per task, then group rows by the set of columns
+        # they change so each group is one executemany UPDATE.
+        merged = {}
+        for _, task_id, _, values in planned:
+            merged.setdefault(task_id, {}).update(values)
+        if merged:
+            thaw_tasks(db.session, merged) # Changed archived tasks are written in the tasks table
+        groups = {}
+        for task_id, values in merged.items():
+            groups.setdefault(tuple(sorted(values)), []).append({'id': task_id, **values})
+        for rows in groups.values():
+            shared = {column: value for column, value in rows[0].items() if column != 'id'}
+            if all(row.items() - {('id', row['id'])} == shared.items() for row in rows):
+                # Identical values (e.g. bulk restore): one UPDATE ... WHERE id IN (...)
+                ids = [row['id'] for row in rows]
+                for start in range(0, len(ids), 500):
+                    db.session.execute(db.update(Task).where(Task.id.in_(ids[start:start + 500])).values(**shared),
+                                       execution_options={'synchronize_session': False})
+            else:
+                db.session.execute(db.update(Task), rows)
+        record_changes(db.session, [(task_id, action) for _, task_id, action, _ in planned], now)
+        stats.apply(db.session)
 
         db.session.commit()
-        return jsonify({
-            'message': 'Task restored successfully',
-            'task_id': task.id,
-            'new_status': task.status 
-        })
+        return jsonify({'applied': len(results) - failed, 'failed': failed, 'results': results})
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': f'Failed to restore task: {str(e)}'}), 500
+        return jsonify({'error': f'Failed to apply batch: {str(e)}'}), 500
 
-@app.route('/add_task', methods=['POST'])
-def add_task():
+def apply_add_task(data, session=None):
     """
-    API endpoint to create a new task.
+    Validates the payload of /add_task and adds the task in the current
+    transaction, without committing. Returns (body, status).
     """
-    data = request.get_json()
+    session = session or db.session
 
     # Required fields
     name = data.get('name')
     limit_date_str = data.get('limit_date')
 
     if not name:
-        return jsonify({'error': 'Name is required'}), 400
+        return {'error': 'Name is required'}, 400
     if not limit_date_str: 
-        return jsonify({'error': 'Limit date is required'}), 400
+        return {'error': 'Limit date is required'}, 400
     
     limit_date = parse_datetime(limit_date_str)
     if not limit_date:
-        return jsonify({'error': f'Invalid limit_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}), 400
+        return {'error': f'Invalid limit_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}, 400
 
     # Optional fields
     detail = data.get('detail')
@@ -425,14 +760,14 @@ def add_task():
 
     # Validate format of optional dates if strings were provided but parsing failed
     if scheduled_start_date_str and not scheduled_start_date:
-        return jsonify({'error': f'Invalid scheduled_start_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}), 400
+        return {'error': f'Invalid scheduled_start_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}, 400
     if scheduled_end_date_str and not scheduled_end_date:
-        return jsonify({'error': f'Invalid scheduled_end_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}), 400
+        return {'error': f'Invalid scheduled_end_date format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}, 400
             
     # Validate consistency: if one scheduled date is given, the other must also be.
     if (scheduled_start_date and not scheduled_end_date) or \
        (not scheduled_start_date and scheduled_end_date):
-        return jsonify({'error': 'Both scheduled_start_date and scheduled_end_date must be provided if one is present, or both left empty.'}), 400
+        return {'error': 'Both scheduled_start_date and scheduled_end_date must be provided if one is present, or both left empty.'}, 400
 
     # Create new Task object
     new_task = Task(
@@ -445,14 +780,412 @@ def add_task():
         # status, display_order, created_at, updated_at will use defaults from the model
     )
 
+    session.add(new_task) # Add to session
+    session.flush()       # Assigns new_task.id for the change log
+    record_changes(session, [(new_task.id, 'create')])
+    touch_lists('todo', session=session) # New tasks start in the active list
+    return {'message': 'Task created successfully', 'task_id': new_task.id}, 201 # Created
+
+@app.route('/add_task', methods=['POST'])
+def add_task():
+    """
+    API endpoint to create a new task.
+    """
+    data, error = request_json()
+    if error:
+        return error
+
     try:
-        db.session.add(new_task) # Add to session
-        db.session.commit()      # Commit to database
-        return jsonify({'message': 'Task created successfully', 'task_id': new_task.id}), 201 # Created
+        body, status = apply_add_task(data)
+        if status == 201:
+            db.session.commit()      # Commit to database
+        return jsonify(body), status
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to create task: {str(e)}'}), 500
 
+@app.cli.command('rebuild-stats')
+@board_option
+def rebuild_stats_command():
+    """Recomputes the /stats aggregates from the task history."""
+    counted = rebuild_stats()
+    print(f"Statistics rebuilt from {counted} completed task(s).")
+
+# Longest range /stats accepts, in days
+STATS_MAX_DAYS = 3660
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    API endpoint for completion analytics, read from the precomputed daily
+    aggregates (see stats.py), so the cost depends on the requested range,
+    not on the size of the archive.
+    Query parameters:
+      - bucket: 'day' (default) or 'week' (weeks start on Monday).
+      - from / to: date range (YYYY-MM-DD, UTC, inclusive). Defaults to the
+        last 30 days (day buckets) or the last 12 weeks (week buckets).
+      - is_not_main: 'true' or 'false' to count only sub-tasks or main tasks.
+    Returns per-bucket and total completion counts, average cycle time
+    (start -> end), lead time (created -> end) and slip against limit_date and
+    scheduled_end_date in hours, plus the current number of overdue active tasks.
+    """
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return jsonify({'error': f'Invalid bucket: {bucket!r} (expected one of: {", ".join(BUCKETS)})'}), 400
+
+    now = datetime.utcnow()
+    end = parse_datetime(request.args.get('to')) if request.args.get('to') else now
+    start = parse_datetime(request.args.get('from')) if request.args.get('from') else \
+        now - timedelta(days=29 if bucket == 'day' else 7 * 12 - 1)
+    if start is None or end is None:
+        return jsonify({'error': 'Invalid from/to date. Use YYYY-MM-DD'}), 400
+    start, end = start.date(), end.date()
+    if start > end:
+        return jsonify({'error': '"from" must not be after "to"'}), 400
+    if (end - start).days > STATS_MAX_DAYS:
+        return jsonify({'error': f'The range may span at most {STATS_MAX_DAYS} days'}), 400
+
+    is_not_main = request.args.get('is_not_main')
+    if is_not_main not in (None, 'true', 'false'):
+        return jsonify({'error': '"is_not_main" must be "true" or "false"'}), 400
+    is_not_main = None if is_not_main is None else is_not_main == 'true'
+
+    try:
+        series, totals = completion_series(start, end, bucket, is_not_main)
+        return json_response({
+            'bucket': bucket,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'is_not_main': is_not_main,
+            'series': series,
+            'totals': totals,
+            'overdue': overdue_count(now, is_not_main),
+        })
+    except Exception as e:
+        return jsonify({'error': f'Failed to compute statistics: {str(e)}'}), 500
+
+def parse_statuses():
+    """
+    Reads the optional ?status= filter (comma-separated statuses).
+    Raises ValueError for an unknown status.
+    """
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    for status in statuses:
+        if status not in TASK_STATUSES:
+            raise ValueError(f'Invalid status: {status!r}')
+    return statuses
+
+@app.cli.command('rebuild-search')
+@board_option
+def rebuild_search_command():
+    """Rebuilds the full-text search indexes from the tasks and tasks_archive tables."""
+    if not search_available(db.session):
+        print("The search indexes do not exist (run upgrade-db first; requires SQLite with FTS5).")
+        return
+    for _, fts_table in SEARCH_TIERS:
+        rebuild_search_index(db.session.get_bind(), fts_table)
+    print("Search indexes rebuilt.")
+
+# Maximum number of words in a search query
+SEARCH_MAX_TERMS = 10
+
+@app.route('/search', methods=['GET'])
+def search():
+    """
+    API endpoint for full-text search over task names and details.
+    Query parameters:
+      - q: the search words (required). Every word must appear in the name or
+        the detail, as a substring (also works for Japanese text).
+      - status: optional comma-separated statuses to search in (e.g. completed,deleted).
+      - limit / offset: paging (default 50 results per page); the response's
+        'next_offset' is the offset of the next page, or null on the last page.
+    Results are ranked by relevance (matches in the name weigh more) when a
+    word has three or more characters; otherwise newest tasks come first.
+    """
+    terms = parse_terms(request.args.get('q', ''))
+    if not terms:
+        return jsonify({'error': 'Query parameter "q" is required'}), 400
+    if len(terms) > SEARCH_MAX_TERMS:
+        return jsonify({'error': f'Too many search words (maximum is {SEARCH_MAX_TERMS}).'}), 400
+    try:
+        statuses = parse_statuses()
+        limit = parse_page_limit()
+        offset = request.args.get('offset', 0, type=int)
+        if offset < 0:
+            raise ValueError('"offset" must not be negative')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        rows, ranked = search_tasks(terms, statuses, limit, offset, use_fts=search_available(db.session))
+        next_offset = offset + limit if len(rows) > limit else None
+        return json_response({
+            'tasks': rows_to_dicts(rows[:limit], SUMMARY_FIELDS + ('score',)),
+            'ranked': ranked,
+            'next_offset': next_offset,
+        })
+    except Exception as e:
+        return jsonify({'error': f'Failed to search tasks: {str(e)}'}), 500
+
+# Maximum number of tasks returned by /tasks/range
+RANGE_MAX_RESULTS = 5000
+
+@app.route('/tasks/range', methods=['GET'])
+def get_tasks_in_range():
+    """
+    API endpoint for calendar/Gantt views: the tasks whose period overlaps a
+    time window, in the summary projection, ordered by the start of the period.
+    Query parameters:
+      - from / to: the window (required, YYYY-MM-DD or YYYY-MM-DDTHH:MM, both
+        inclusive; a 'to' without a time covers that whole day).
+      - kind: 'scheduled' (default, scheduled_start_date..scheduled_end_date)
+        or 'actual' (actual_start_date..actual_end_date; a task that has
+        started but not ended is treated as still running).
+      - status: optional comma-separated statuses (default: all but deleted).
+    Only the tasks in the window are read (interval index, see intervals.py),
+    however long the history is. 'truncated' is true if more than
+    RANGE_MAX_RESULTS tasks overlap the window.
+    """
+    kind = request.args.get('kind', 'scheduled')
+    if kind not in RANGE_KINDS:
+        return jsonify({'error': f'Invalid kind: {kind!r} (expected one of: {", ".join(RANGE_KINDS)})'}), 400
+    from_str, to_str = request.args.get('from'), request.args.get('to')
+    if not from_str or not to_str:
+        return jsonify({'error': 'Query parameters "from" and "to" are required'}), 400
+    start, end = parse_datetime(from_str), parse_datetime(to_str)
+    if start is None or end is None:
+        return jsonify({'error': 'Invalid from/to date. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}), 400
+    if 'T' not in to_str:
+        end += timedelta(days=1, microseconds=-1) # The whole day
+    if start > end:
+        return jsonify({'error': '"from" must not be after "to"'}), 400
+    try:
+        statuses = parse_statuses() or [status for status in TASK_STATUSES if status != 'deleted']
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        use_rtree = range_index_available(db.session)
+        tasks = []
+        for model in (Task, TaskArchive):
+            statement = overlap_statement(start, end, kind, statuses, use_rtree, model)
+            tasks += fetch_dicts(statement.limit(RANGE_MAX_RESULTS + 1), SUMMARY_FIELDS)
+        start_field = RANGE_KINDS[kind][0]
+        tasks.sort(key=lambda task: (task[start_field], task['id']))
+        return json_response({
+            'kind': kind,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'tasks': tasks[:RANGE_MAX_RESULTS],
+            'truncated': len(tasks) > RANGE_MAX_RESULTS,
+        })
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch tasks in range: {str(e)}'}), 500
+
+# Limits of /due: the widest window, in hours, and the number of tasks returned
+DUE_MAX_HOURS = 366 * 24
+DUE_MAX_RESULTS = 1000
+
+@app.route('/due', methods=['GET'])
+def get_due_tasks():
+    """
+    API endpoint for deadline reminders, in the summary projection:
+      - overdue: active tasks whose limit_date has passed
+      - due_soon: active tasks whose limit_date is within the next ?within=
+        hours (default 24)
+      - starting_soon: "todo" tasks whose scheduled_start_date is within that
+        window (or already passed)
+    each ordered by that date. Served from the deadline scheduler's heaps
+    (see deadlines.py), so only the tasks returned are read from the
+    database. 'truncated' is true if more than DUE_MAX_RESULTS tasks match.
+    """
+    try:
+        within = float(request.args.get('within', 24))
+    except ValueError:
+        within = -1
+    if not 0 <= within <= DUE_MAX_HOURS:
+        return jsonify({'error': f'"within" must be a number of hours between 0 and {DUE_MAX_HOURS}'}), 400
+
+    try:
+        scheduler, feed = deadline_schedulers.get()
+        feed.start() # Builds the scheduler's heaps on first use
+        now = datetime.utcnow()
+        overdue, due_soon, starting_soon, truncated = scheduler.due(
+            now, now + timedelta(hours=within), DUE_MAX_RESULTS)
+        ids = set(overdue) | set(due_soon) | set(starting_soon)
+        # The heaps follow the change feed: drop a task that changed in the meantime
+        tasks = {task['id']: task for task in fetch_dicts(
+            select_fields(SUMMARY_FIELDS).where(Task.id.in_(ids), Task.active_filter()))} if ids else {}
+        return json_response({
+            'now': now.isoformat(),
+            'within_hours': within,
+            'overdue': [tasks[i] for i in overdue if i in tasks],
+            'due_soon': [tasks[i] for i in due_soon if i in tasks],
+            'starting_soon': [tasks[i] for i in starting_soon if i in tasks and tasks[i]['status'] == 'todo'],
+            'truncated': truncated,
+        })
+    except Exception as e:
+        return jsonify({'error': f'Failed to retrieve due tasks: {str(e)}'}), 500
+
+@app.route('/export', methods=['GET'])
+def export_tasks():
+    """
+    API endpoint streaming every task (all statuses and columns, ordered by ID)
+    as NDJSON (default) or CSV with ?format=csv. ?status=completed,deleted
+    restricts the export to some statuses. Rows are read from a server-side
+    cursor and written chunk by chunk, so memory use does not grow with the
+    number of tasks.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt!r} (expected one of: {", ".join(EXPORT_FORMATS)})'}), 400
+    try:
+        statuses = parse_statuses()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = app.response_class(stream_with_context(export_chunks(fmt, statuses)), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=tasks.{fmt}'
+    return response
+
+@app.route('/import', methods=['POST'])
+def import_tasks_route():
+    """
+    API endpoint bulk-importing tasks from an NDJSON or CSV request body (the
+    formats written by /export; CSV is detected from ?format=csv or a text/csv
+    Content-Type). Rows are validated like /add_task; invalid rows are skipped
+    and reported with their line number. Task IDs in the file are ignored
+    unless ?keep_ids=1 is given (e.g. when migrating into an empty database).
+    Valid rows are inserted and committed in chunks, so a large file is never
+    held in memory.
+    """
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt!r} (expected one of: {", ".join(EXPORT_FORMATS)})'}), 400
+    keep_ids = request.args.get('keep_ids') in ('1', 'true')
+
+    def before_commit(rows):
+        touch_lists(*{row['status'] for row in rows})
+        stats = StatsDelta()
+        for row in rows:
+            stats.add(SimpleNamespace(**row))
+        stats.apply(db.session)
+        # One 'import' entry per chunk instead of one per task: clients reload their lists
+        record_changes(db.session, [(0, 'import')])
+
+    try:
+        summary = import_tasks(read_lines(request.stream), fmt, keep_ids, before_commit)
+        return jsonify(summary), 200
+    except ImportAborted as e:
+        return jsonify({'error': e.message, **e.summary}), e.status
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'error': 'The request body must be UTF-8 encoded.'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to import tasks: {str(e)}'}), 500
+
+def parse_since(value):
+    """
+    Reads a change log position (?since= or Last-Event-ID).
+    Raises ValueError if it is not a non-negative integer.
+    """
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        since = -1
+    if since < 0:
+        raise ValueError('"since" must be a non-negative integer')
+    return since
+
+@app.route('/changes', methods=['GET'])
+def get_changes():
+    """
+    API endpoint returning the task changes after a position in the change log.
+    Without ?since= it only returns the current position ('last_seq'): call it
+    before loading the lists, then ask for everything after that position.
+    Each change carries the task's current summary ('task' is null if the
+    task no longer exists). 'reset' is true when the requested position is no
+    longer in the log; the client must then reload its lists. 'has_more' is
+    true when more changes are waiting; ask again from 'last_seq'.
+    """
+    try:
+        change_feed = change_feeds.get()
+        change_feed.start()
+        if request.args.get('since') is None:
+            return json_response({'changes': [], 'last_seq': change_feed.last_seq, 'reset': False, 'has_more': False})
+        since = parse_since(request.args['since'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        changes, reset = change_feed.changes_since(since)
+        last_seq = changes[-1]['seq'] if changes else (change_feed.last_seq if reset else since)
+        return json_response({'changes': changes, 'last_seq': last_seq, 'reset': reset,
+                              'has_more': bool(changes) and last_seq < change_feed.last_seq})
+    except Exception as e:
+        return jsonify({'error': f'Failed to retrieve changes: {str(e)}'}), 500
+
+@app.route('/events', methods=['GET'])
+def get_events():
+    """
+    Server-sent events stream of task changes ('change' events, with the seq
+    as event id, and 'reset' events when the client fell too far behind).
+    Starts after ?since= or, when the browser reconnects, after the
+    Last-Event-ID header. Answers 503 when too many streams are open; the
+    client should then poll /changes instead.
+    """
+    try:
+        change_feed = change_feeds.get()
+        change_feed.start()
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        since = parse_since(since) if since is not None else change_feed.last_seq
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not acquire_stream_slot():
+        return jsonify({'error': 'Too many open event streams, poll /changes instead.'}), 503
+
+    response = app.response_class(stream_with_context(event_stream(change_feed, since)),
+                                  mimetype='text/event-stream')
+    response.call_on_close(release_stream_slot) # Also runs if the client leaves before the first event
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Disable proxy buffering (nginx)
+    return response
+
+@app.route('/boards', methods=['GET'])
+def get_boards():
+    """
+    API endpoint listing the boards, the default board first. Each board's
+    page and API are served under /boards/<name>/ (the default board also
+    without the prefix).
+    """
+    try:
+        return jsonify({'boards': [{'name': name, 'url': '/' if name == DEFAULT_BOARD else f'/boards/{name}/'}
+                                   for name in shards.boards()]})
+    except Exception as e:
+        return jsonify({'error': f'Failed to list boards: {str(e)}'}), 500
+
+@app.route('/boards', methods=['POST'])
+def create_board():
+    """
+    API endpoint to create a board (its own database shard) from {'name': ...}.
+    Names are 1-63 lowercase letters, digits, '-' or '_'.
+    """
+    data, error = request_json()
+    if error:
+        return error
+    name = data.get('name')
+    if not valid_board_name(name):
+        return jsonify({'error': 'Invalid board name (1-63 lowercase letters, digits, "-" or "_")'}), 400
+    if shards.exists(name):
+        return jsonify({'error': f'Board already exists: {name}'}), 409
+    try:
+        shards.create(name)
+        return jsonify({'name': name, 'url': f'/boards/{name}/'}), 201
+    except Exception as e:
+        return jsonify({'error': f'Failed to create board: {str(e)}'}), 500
+
 if __name__ == '__main__':
     # このブロックでのみデータベースを初期化するように変更
     init_database() # <-- init_database()の呼び出しをここに移動
@@ -0,0 +1,127 @@
+# archive.py
+
+"""
+Hot/cold tiering of the task history.
+
+Completed and deleted tasks never appear in the active list, yet they share
+its table and, as the history grows, make up nearly all of its pages and
+index entries. archive_tasks() moves the ones that ended more than N days
+ago into tasks_archive (TaskArchive: same columns, same IDs) batch by batch,
+and compact_database() then rebuilds the file so the tasks table and its
+indexes are packed into few, cache-resident pages again.
+
+The archive is a table of the same database rather than an attached file:
+with WAL, a transaction spanning attached databases is not atomic across
+them, and every move between the tiers must be.
+
+New task IDs are max(id) + 1 of the tasks table, so the task with the
+highest ID always stays hot; otherwise a new task could reuse the ID of an
+archived one.
+
+Writes only ever go to the hot table. thaw_tasks() moves archived tasks back
+as part of the caller's transaction, so every route that changes a task
+works on archived ones too, and a request that does not commit leaves them
+in the archive.
+"""
+
+from datetime import datetime, timedelta
+
+from models import db, Task, TaskArchive
+
+ARCHIVED_STATUSES = ('completed', 'deleted')
+ARCHIVE_BATCH_SIZE = 5000 # Tasks moved per transaction
+MOVE_CHUNK_SIZE = 500 # IDs per INSERT/DELETE statement (SQLite parameter limit)
+
+TASK_COLUMNS = [column.name for column in Task.__table__.columns]
+
+
+def _move(session, source, target, task_ids):
+    """
+    Moves the rows with the given IDs from one tier to the other
+    (INSERT ... SELECT, then DELETE). Returns the number of rows moved.
+    """
+    source_table, target_table = source.__table__, target.__table__
+    moved = 0
+    for start in range(0, len(task_ids), MOVE_CHUNK_SIZE):
+        chunk = task_ids[start:start + MOVE_CHUNK_SIZE]
+        session.execute(target_table.insert().from_select(
+            TASK_COLUMNS,
+            db.select(*(source_table.c[name] for name in TASK_COLUMNS)).where(source_table.c.id.in_(chunk)),
+        ))
+        moved += session.execute(source_table.delete().where(source_table.c.id.in_(chunk))).rowcount
+    return moved
+
+
+def archive_candidates(cutoff):
+    """
+    SELECT of the IDs of the completed/deleted tasks that ended before cutoff
+    (tasks without an end date count from their last update), except the
+    task with the highest ID.
+    """
+    newest_id = db.select(db.func.max(Task.id)).scalar_subquery()
+    return db.select(Task.id).where(
+        Task.status.in_(ARCHIVED_STATUSES),
+        db.or_(Task.actual_end_date < cutoff,
+               db.and_(Task.actual_end_date.is_(None), Task.updated_at < cutoff)),
+        Task.id < newest_id,
+    )
+
+
+def archive_tasks(days, batch_size=ARCHIVE_BATCH_SIZE, now=None, session=None):
+    """
+    Moves the completed/deleted tasks that ended more than `days` days ago
+    to the archive, committing every batch_size tasks so the database is
+    never locked for long. Returns the number of tasks moved.
+    """
+    session = session or db.session
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    statement = archive_candidates(cutoff).limit(batch_size)
+    moved = 0
+    while True:
+        task_ids = session.execute(statement).scalars().all()
+        if not task_ids:
+            return moved
+        moved += _move(session, Task, TaskArchive, task_ids)
+        session.commit()
+
+
+def thaw_tasks(session, task_ids):
+    """
+    Moves the archived tasks among task_ids back to the tasks table, in the
+    current transaction. Returns the number of tasks moved (0 without writing
+    anything when none of them is archived).
+    """
+    task_ids = list(task_ids)
+    archived = []
+    for start in range(0, len(task_ids), MOVE_CHUNK_SIZE):
+        archived += session.execute(
+            db.select(TaskArchive.id).where(TaskArchive.id.in_(task_ids[start:start + MOVE_CHUNK_SIZE]))
+        ).scalars().all()
+    if not archived:
+        return 0
+    return _move(session, TaskArchive, Task, archived)
+
+
+def compact_database(engine, incremental=False):
+    """
+    Gives the pages freed by archiving back to the file system (SQLite only).
+    The default is a full VACUUM, which rewrites the whole file so every table
+    and index is stored contiguously; it needs free disk space for a copy of
+    the file and blocks writers while it runs. incremental=True only releases
+    the free pages (PRAGMA incremental_vacuum), which is cheap but requires a
+    database using auto_vacuum=INCREMENTAL and does not defragment.
+    Returns False if nothing could be done.
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if incremental:
+            if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2: # 2 = INCREMENTAL
+                return False
+            conn.exec_driver_sql('PRAGMA incremental_vacuum').all()
+        else:
+            conn.exec_driver_sql('VACUUM')
+        # In WAL mode the rewritten pages sit in the WAL until checkpointed
+        conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').all()
+    return True
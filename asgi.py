@@ -0,0 +1,373 @@
+# asgi.py
+
+"""
+ASGI serving mode: `uvicorn asgi:application` (requirements-asgi.txt).
+
+Under gunicorn (app:app) every request, /events stream or slow client holds
+one of the worker's threads for as long as it lasts. Here the task routes
+(the lists, task details, add/update and the lifecycle actions, /changes and
+/events) are coroutines on SQLAlchemy's async engine (aiosqlite for SQLite,
+asyncpg for PostgreSQL): while one waits for the database, for the network
+or for the next change it holds a suspended coroutine, not a thread.
+/events waits with ChangeFeed.wait_async(), so thousands of idle streams
+cost a few kilobytes each and SSE_MAX_STREAMS does not apply.
+
+The routes reuse the synchronous helpers of app.py (apply_action,
+apply_add_task, paginate_archive, ...) through AsyncSession.run_sync(), so
+both modes validate and write exactly the same way. Every other route (the
+page and static files, batch, order, stats, search, range, export/import,
+/metrics) is the unchanged Flask app, mounted behind a WSGI adapter that
+runs it in a thread pool. Both halves share the process state: the list
+versions and response cache, the change feed and the compressed-body memo.
+Metrics and GROUP_COMMIT apply to the Flask half only.
+
+Boards (see boards.py): each coroutine route is also served under
+/boards/{board}/, with sessions on the board's own async engine (SQLite)
+or schema (server databases); other /boards/ paths go to the Flask app,
+which handles the prefix itself.
+
+The WSGI entry point (gunicorn app:app) is unchanged and stays the default.
+"""
+
+import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from app import (INVALID_JSON_ERROR, JSON_OBJECT_ERROR, active_tasks_statement, app as flask_app, apply_action,
+                 apply_add_task, find_task_detail, paginate_archive, parse_since)
+from boards import DEFAULT_BOARD, board_key, shards
+from cache import init_list_cache, list_versions, response_cache
+from changes import async_event_stream, change_feeds
+from compression import COMPRESS_RESPONSES, compress_body, is_compressed
+from db_config import async_database_uri, engine_options, init_engine
+from models import db
+from serializers import FULL_FIELDS, SUMMARY_FIELDS, dumps, rows_to_dicts
+from task_actions import plan_delete, plan_end, plan_pause, plan_restore, plan_start, plan_update
+
+
+class AsyncTaskSession(Session):
+    """
+    Session class behind the async sessions. It carries the same commit hooks
+    as the Flask session: list versions and change feed wake-ups.
+    """
+
+
+init_list_cache(AsyncTaskSession)
+change_feeds.watch_session(AsyncTaskSession)
+
+with flask_app.app_context():
+    # The resolved URL: Flask-SQLAlchemy places relative SQLite paths in instance/
+    DATABASE_URI = async_database_uri(db.engine.url.render_as_string(hide_password=False))
+engine = create_async_engine(DATABASE_URI, **engine_options(DATABASE_URI, flask_app.config['DB_PROFILE']))
+init_engine(engine.sync_engine, flask_app.config['DB_PROFILE'])
+AsyncSessionLocal = async_sessionmaker(engine, sync_session_class=AsyncTaskSession, expire_on_commit=False)
+
+
+class AsyncShards:
+    """
+    Async engines and session factories of the boards, opened on first use
+    and kept in an LRU like the synchronous shard engines (boards.py). The
+    sessions carry the board in session.info, for the shared helpers.
+    Only used from the event loop, so no lock.
+    """
+
+    def __init__(self, max_open):
+        self.max_open = max_open
+        self._boards = OrderedDict() # board -> (engine, session factory)
+
+    async def sessionmaker(self, board):
+        if board == DEFAULT_BOARD:
+            return AsyncSessionLocal
+        entry = self._boards.get(board)
+        if entry is not None:
+            self._boards.move_to_end(board)
+            return entry[1]
+        if shards.is_sqlite:
+            # The board's own file; ASYNC_DATABASE_URL only names the default board's database
+            uri = async_database_uri(shards.shard_uri(board), override=False)
+            board_engine = create_async_engine(uri, **engine_options(uri, flask_app.config['DB_PROFILE']))
+            init_engine(board_engine.sync_engine, flask_app.config['DB_PROFILE'])
+        else:
+            board_engine = engine.execution_options(schema_translate_map=shards.schema_translate_map(board))
+        factory = async_sessionmaker(board_engine, sync_session_class=AsyncTaskSession, expire_on_commit=False,
+                                     info={'board': board})
+        self._boards[board] = (board_engine, factory)
+        while len(self._boards) > self.max_open:
+            old_engine, _ = self._boards.popitem(last=False)[1]
+            if shards.is_sqlite:
+                await old_engine.dispose()
+        return factory
+
+    async def dispose(self):
+        while self._boards:
+            old_engine, _ = self._boards.popitem()[1]
+            if shards.is_sqlite:
+                await old_engine.dispose()
+
+
+async_shards = AsyncShards(shards.max_open)
+
+
+def query_args(request):
+    # Same interface as Flask's request.args, for the helpers shared with app.py
+    return MultiDict(request.query_params.multi_items())
+
+
+def json_response(request, obj, status=200, headers=None, etag=None):
+    """
+    JSON response compressed like the Flask responses (see compression.py).
+    obj may already be encoded bytes. etag: strong ETag of the body.
+    """
+    body = obj if isinstance(obj, bytes) else dumps(obj)
+    headers = dict(headers or {})
+    encoding = None
+    if COMPRESS_RESPONSES:
+        headers['Vary'] = 'Accept-Encoding'
+        body, encoding = compress_body(body, parse_accept_header(request.headers.get('accept-encoding')), etag)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if etag:
+        headers['ETag'] = quote_etag(etag, weak=encoding is not None)
+    return Response(body, status_code=status, media_type='application/json', headers=headers)
+
+
+def error_response(request, message, status):
+    return json_response(request, {'error': message}, status)
+
+
+async def read_json(request, silent=False):
+    """
+    The request's JSON payload, which must be an object (like request_json()
+    in app.py). A missing or invalid body, or one that is not an object,
+    raises ValueError with the error message; with silent, a missing or
+    invalid body reads as {}.
+    """
+    body = await request.body()
+    try:
+        data = json.loads(body)
+    except ValueError:
+        if silent:
+            return {}
+        raise ValueError(INVALID_JSON_ERROR)
+    if not isinstance(data, dict):
+        raise ValueError(JSON_OBJECT_ERROR)
+    return data
+
+
+def board_endpoint(endpoint):
+    """
+    Resolves the board of a request (the {board} path parameter, else the
+    default board) for `endpoint`: request.state.board and
+    request.state.sessions, its session factory. Unknown boards get a 404.
+    """
+    async def wrapper(request):
+        board = request.path_params.get('board', DEFAULT_BOARD)
+        if board != DEFAULT_BOARD and not await run_in_threadpool(shards.exists, board):
+            return error_response(request, f'Board not found: {board}', 404)
+        request.state.board = board
+        request.state.sessions = await async_shards.sessionmaker(board)
+        return await endpoint(request)
+    return wrapper
+
+
+async def cached_list_response(request, list_name, build):
+    """
+    app.cached_list_response() for coroutines: same keys, ETags and cache
+    entries, so both modes serve each other's cached lists.
+    build(session, args) is awaited on a cache miss.
+    """
+    list_name = board_key(list_name, request.state.board)
+    args = query_args(request)
+    key = (list_name, tuple(sorted(args.items(multi=True))))
+    version = list_versions.get(list_name)
+    etag = response_cache.etag(key, version)
+    headers = {'Cache-Control': 'no-cache'}
+
+    body = response_cache.get(key, version)
+    if body is None:
+        # Also needed for a 304: the body's size decides the form of the ETag
+        async with request.state.sessions() as session:
+            body = dumps(await build(session, args))
+        response_cache.put(key, version, body)
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+        weak = is_compressed(len(body), parse_accept_header(request.headers.get('accept-encoding')))
+        if COMPRESS_RESPONSES:
+            headers['Vary'] = 'Accept-Encoding'
+        return Response(status_code=304, headers={**headers, 'ETag': quote_etag(etag, weak=weak)})
+    return json_response(request, body, headers=headers, etag=etag)
+
+
+async def get_tasks(request):
+    args = query_args(request)
+    sort_by = args.get('sort_by', 'display_order')
+    fields = FULL_FIELDS if args.get('view') == 'full' else SUMMARY_FIELDS
+
+    async def build(session, args):
+        rows = (await session.execute(active_tasks_statement(sort_by, fields))).all()
+        return rows_to_dicts(rows, fields)
+
+    try:
+        return await cached_list_response(request, 'active', build)
+    except Exception as e:
+        return error_response(request, f'Failed to retrieve tasks: {str(e)}', 500)
+
+
+def archive_listing(status, sort_field, failure):
+    async def endpoint(request):
+        async def build(session, args):
+            return await session.run_sync(lambda sync_session: paginate_archive(status, sort_field, args, sync_session))
+
+        try:
+            return await cached_list_response(request, status, build)
+        except ValueError as e:
+            return error_response(request, str(e), 400)
+        except Exception as e:
+            return error_response(request, f'{failure}: {str(e)}', 500)
+    return endpoint
+
+
+async def get_task_detail(request):
+    task_id = request.path_params['task_id']
+    try:
+        async with request.state.sessions() as session:
+            task = await session.run_sync(lambda sync_session: find_task_detail(task_id, sync_session))
+        if task:
+            return json_response(request, task)
+        return error_response(request, 'Task not found', 404)
+    except Exception as e:
+        return error_response(request, f'Failed to retrieve task details: {str(e)}', 500)
+
+
+def action_route(plan, verb, payload=None):
+    """
+    Endpoint applying one lifecycle action. payload: None (no body),
+    'json' (required, like request.get_json()) or 'silent' (optional).
+    """
+    async def endpoint(request):
+        task_id = request.path_params['task_id']
+        try:
+            data = await read_json(request, silent=payload == 'silent') if payload else None
+        except ValueError as e:
+            return error_response(request, str(e), 400)
+        try:
+            now = datetime.utcnow()
+            async with request.state.sessions() as session:
+                body, status, changed = await session.run_sync(
+                    lambda sync_session: apply_action(plan, task_id, data, now, sync_session))
+                if changed:
+                    await session.commit()
+            return json_response(request, body, status)
+        except Exception as e:
+            return error_response(request, f'Failed to {verb} task: {str(e)}', 500)
+    return endpoint
+
+
+async def add_task(request):
+    try:
+        data = await read_json(request)
+    except ValueError as e:
+        return error_response(request, str(e), 400)
+    try:
+        async with request.state.sessions() as session:
+            body, status = await session.run_sync(lambda sync_session: apply_add_task(data, sync_session))
+            if status == 201:
+                await session.commit()
+        return json_response(request, body, status)
+    except Exception as e:
+        return error_response(request, f'Failed to create task: {str(e)}', 500)
+
+
+def change_reader(request, change_feed):
+    """
+    Returns read_changes(since): change_feed.changes_since() without blocking
+    the event loop, from the buffer or from the board's log table through
+    the async engine.
+    """
+    async def read_changes(since):
+        buffered = change_feed.buffered_changes(since)
+        if buffered is not None:
+            return buffered
+        async with request.state.sessions() as session:
+            return await session.run_sync(lambda sync_session: change_feed.changes_since(since, session=sync_session))
+    return read_changes
+
+
+async def get_changes(request):
+    try:
+        change_feed = change_feeds.get(request.state.board)
+        await run_in_threadpool(change_feed.start) # Reads the log head once, on first use
+        if request.query_params.get('since') is None:
+            return json_response(request, {'changes': [], 'last_seq': change_feed.last_seq, 'reset': False, 'has_more': False})
+        since = parse_since(request.query_params['since'])
+    except ValueError as e:
+        return error_response(request, str(e), 400)
+
+    try:
+        changes, reset = await change_reader(request, change_feed)(since)
+        last_seq = changes[-1]['seq'] if changes else (change_feed.last_seq if reset else since)
+        return json_response(request, {'changes': changes, 'last_seq': last_seq, 'reset': reset,
+                                       'has_more': bool(changes) and last_seq < change_feed.last_seq})
+    except Exception as e:
+        return error_response(request, f'Failed to retrieve changes: {str(e)}', 500)
+
+
+async def get_events(request):
+    try:
+        change_feed = change_feeds.get(request.state.board)
+        await run_in_threadpool(change_feed.start)
+        since = request.headers.get('last-event-id') or request.query_params.get('since')
+        since = parse_since(since) if since is not None else change_feed.last_seq
+    except ValueError as e:
+        return error_response(request, str(e), 400)
+    # Starlette cancels the generator when the client disconnects
+    return StreamingResponse(async_event_stream(change_feed, since, change_reader(request, change_feed)), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_shards.dispose()
+    await engine.dispose()
+
+
+def board_routes(path, endpoint, methods):
+    """
+    The route of `endpoint` for the default board and under /boards/{board}.
+    """
+    endpoint = board_endpoint(endpoint)
+    return [Route(path, endpoint, methods=methods), Route('/boards/{board}' + path, endpoint, methods=methods)]
+
+
+routes = [
+    *board_routes('/get_tasks', get_tasks, ['GET']),
+    *board_routes('/get_completed_tasks', archive_listing('completed', 'actual_end_date', 'Failed to retrieve completed tasks'),
+                  ['GET']),
+    *board_routes('/get_deleted_tasks', archive_listing('deleted', 'updated_at', 'Failed to retrieve deleted tasks'),
+                  ['GET']),
+    *board_routes('/task/{task_id:int}', get_task_detail, ['GET']),
+    *board_routes('/add_task', add_task, ['POST']),
+    *board_routes('/update_task/{task_id:int}', action_route(plan_update, 'update', 'json'), ['POST']),
+    *board_routes('/delete_task/{task_id:int}', action_route(plan_delete, 'delete', 'silent'), ['POST']),
+    *board_routes('/start_task/{task_id:int}', action_route(plan_start, 'start'), ['POST']),
+    *board_routes('/pause_task/{task_id:int}', action_route(plan_pause, 'pause'), ['POST']),
+    *board_routes('/end_task/{task_id:int}', action_route(plan_end, 'end'), ['POST']),
+    *board_routes('/restore_task/{task_id:int}', action_route(plan_restore, 'restore'), ['POST']),
+    *board_routes('/changes', get_changes, ['GET']),
+    *board_routes('/events', get_events, ['GET']),
+    # Everything else, including the other /boards/ paths: the Flask app
+    Mount('/', app=WSGIMiddleware(flask_app)),
+]
+
+application = Starlette(routes=routes, lifespan=lifespan)
@@ -0,0 +1,132 @@
+# assets.py
+
+"""
+Content-hashed static assets.
+
+`flask build-assets` copies every file of static/ to
+static/dist/<name>.<hash>.<ext>, where the hash is taken from the file's
+content, writes a gzip (and, with the `brotli` package, a brotli) copy of
+the text files next to it, and records the names in
+static/dist/manifest.json. The template links its assets through
+asset_url(), which looks the names up in the manifest: a changed file gets a
+new URL, so the hashed files are served with
+`Cache-Control: public, max-age=31536000, immutable` and a returning browser
+loads them from its cache without even revalidating. The precompressed copy
+matching the request's Accept-Encoding is sent as it is, so serving an asset
+costs no compression.
+
+Without a manifest (a checkout where build-assets has not been run), and
+in debug mode so that edits show up without a rebuild, asset_url() falls
+back to the plain /static/ URLs Flask serves with its default headers. The
+manifest is read at startup: restart after rebuilding.
+"""
+
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import abort, request, send_from_directory, url_for
+
+from compression import available_encodings, choose_encoding, compress
+
+DIST_DIR = 'dist' # Inside the static folder
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+ASSET_MAX_AGE = 365 * 24 * 3600
+PRECOMPRESSED_EXTENSIONS = ('.js', '.css', '.html', '.json', '.svg', '.txt', '.ico')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+MIN_SAVING = 0.9 # Keep a compressed copy only if it is at most 90% of the original
+
+
+def _hashed_name(filename, data):
+    digest = hashlib.blake2s(data, digest_size=16).hexdigest()[:HASH_LENGTH]
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{digest}{ext}'
+
+
+def build_assets(static_folder):
+    """
+    Writes the hashed copies, their compressed variants and the manifest to
+    static/dist/, replacing the previous build. Returns the manifest
+    ({source name: {'file': hashed name, 'encodings': [...]}}).
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    os.makedirs(dist)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            source = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            hashed = _hashed_name(source, data)
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+
+            encodings = []
+            if name.lower().endswith(PRECOMPRESSED_EXTENSIONS):
+                for encoding in available_encodings():
+                    compressed = compress(data, encoding, best=True)
+                    if len(compressed) <= len(data) * MIN_SAVING:
+                        with open(target + ENCODING_SUFFIXES[encoding], 'wb') as f:
+                            f.write(compressed)
+                        encodings.append(encoding)
+            manifest[source] = {'file': hashed, 'encodings': encodings}
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """
+    Reads static/dist/manifest.json; an empty dict if there is none.
+    """
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def init_assets(app):
+    """
+    Loads the manifest, registers asset_url() for the templates and the
+    route serving the hashed files.
+    """
+    dist = os.path.join(app.static_folder, DIST_DIR)
+    manifest = load_manifest(app.static_folder)
+    # Hashed name -> precompressed codings, in preference order
+    encodings = {entry['file']: [e for e in available_encodings() if e in entry['encodings']]
+                 for entry in manifest.values()}
+
+    def asset_url(filename):
+        entry = manifest.get(filename)
+        if entry is None or app.debug:
+            return url_for('static', filename=filename)
+        return url_for('hashed_asset', filename=entry['file'])
+
+    def hashed_asset(filename):
+        if filename not in encodings: # Only files of the current build
+            abort(404)
+        encoding = choose_encoding(request.accept_encodings, encodings[filename])
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(dist, filename + ENCODING_SUFFIXES.get(encoding, ''),
+                                       mimetype=mimetype, max_age=ASSET_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if encodings[filename]:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.add_template_global(asset_url)
+    app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>', 'hashed_asset', hashed_asset)
+    return manifest
@@ -0,0 +1,119 @@
+# benchmarks/bench_list_queries.py
+
+"""
+Seeds a scratch database with N tasks, then calls each listing endpoint
+through the Flask test client and reports its latency together with the
+EXPLAIN QUERY PLAN of every SQL statement the endpoint issued.
+
+Exits with status 1 if any plan falls back to a full table scan or a temp
+B-tree sort, so it can be used to catch index regressions:
+
+    python benchmarks/bench_list_queries.py --tasks 200000
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+from seed import parse_status_mix, seed_tasks, use_scratch_database
+
+ENDPOINTS = [
+    '/get_tasks?sort_by=display_order',
+    '/get_tasks?sort_by=limit_date',
+    '/get_completed_tasks',
+    '/get_deleted_tasks',
+]
+
+
+def is_regression(plan_detail):
+    """
+    A plan line is a regression if it scans the whole tasks table or sorts
+    the result in a temporary B-tree instead of reading an index in order.
+    """
+    scans_table = plan_detail.startswith('SCAN tasks') and 'USING' not in plan_detail
+    return scans_table or 'TEMP B-TREE' in plan_detail
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=100000, help='number of tasks to seed')
+    parser.add_argument('--mix', default=None, help='status mix, e.g. todo=0.04,doing=0.01,completed=0.8,deleted=0.15')
+    parser.add_argument('--repeat', type=int, default=5, help='requests per endpoint')
+    parser.add_argument('--db', default=None, help='database file to create (default: temp file)')
+    args = parser.parse_args()
+
+    path = use_scratch_database(args.db)
+
+    from app import app
+    from models import db
+    from schema import upgrade_schema
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        started = time.perf_counter()
+        seed_tasks(args.tasks, parse_status_mix(args.mix))
+        print(f'Seeded {args.tasks} tasks into {path} in {time.perf_counter() - started:.1f}s')
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            captured.append((statement, parameters))
+
+        db.event.listen(db.engine, 'before_cursor_execute', capture)
+        client = app.test_client()
+        regressions = 0
+
+        urls = list(ENDPOINTS)
+        for url in urls:
+            # Distinct query strings defeat the in-process response cache, so
+            # every request runs the SQL. The plain URL is requested last and
+            # its statements are the ones explained below.
+            timings = []
+            for i in range(args.repeat):
+                captured.clear()
+                separator = '&' if '?' in url else '?'
+                request_url = url if i == args.repeat - 1 else f'{url}{separator}_bench={i}'
+                started = time.perf_counter()
+                response = client.get(request_url)
+                timings.append((time.perf_counter() - started) * 1000)
+                response.close()
+            statements = list(captured)
+
+            started = time.perf_counter()
+            client.get(url).close()
+            cached_ms = (time.perf_counter() - started) * 1000
+
+            # Also measure a follow-up page of the paginated archive listings
+            body = response.get_json(silent=True)
+            if isinstance(body, dict) and body.get('next_cursor') and 'cursor=' not in url:
+                urls.append(f"{url}?cursor={body['next_cursor']}")
+
+            print(f'\n{url}  [{response.status_code}, {len(response.data)} bytes]')
+            print(f'  latency ms: min {min(timings):.1f}  median {statistics.median(timings):.1f}  max {max(timings):.1f}'
+                  f'  (cached: {cached_ms:.1f})')
+            with db.engine.connect() as conn:
+                for statement, parameters in statements:
+                    if not statement.lstrip().upper().startswith('SELECT'):
+                        continue
+                    plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+                    print('  ' + ' '.join(statement.split()))
+                    for row in plan:
+                        flag = '  <-- REGRESSION' if is_regression(row[3]) else ''
+                        regressions += bool(flag)
+                        print(f'    {row[3]}{flag}')
+
+        db.event.remove(db.engine, 'before_cursor_execute', capture)
+
+    if regressions:
+        print(f'\n{regressions} query plan regression(s) found.')
+        return 1
+    print('\nAll listing queries use an index.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
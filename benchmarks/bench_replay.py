@@ -0,0 +1,458 @@
+# benchmarks/bench_replay.py
+
+"""
+Trace-replay regression benchmark.
+
+Seeds a scratch database through models.Task, builds a deterministic trace
+of a typical session mix (list reads with both sort_by values, archive
+pages and task details, drag reorders through update_task_order, task
+creation, edits and lifecycle transitions) and replays it:
+
+  inprocess  through the Flask test client, from --clients threads
+  http       against a real server (gunicorn, or uvicorn with --server asgi)
+             on a copy of the same database, over keep-alive connections
+
+Each target replays the trace --rounds times, each time on a fresh copy of
+the database, and keeps the median of every figure across the rounds.
+Reports p50/p95/p99 latency and throughput per route, then compares them
+with a stored baseline (benchmarks/baseline.json by default). The run exits
+with status 1 if a route's p50 or p95 latency, or a target's throughput, is
+worse than the baseline by more than --tolerance, so it can gate a change:
+
+    python benchmarks/bench_replay.py                     # compare
+    python benchmarks/bench_replay.py --update-baseline   # record a new baseline
+
+Baselines depend on the machine: record one on the machine that runs the
+comparison. The trace settings (--tasks, --mix, --requests, --seed,
+--clients) must match the baseline's. --save-trace writes the generated
+trace as NDJSON and --trace replays such a file instead of generating one.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from seed import ROOT, parse_status_mix, use_scratch_database
+from bench_serving import MODES, free_port
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Relative weight of each kind of request in the generated trace
+TRACE_MIX = {
+    'list_display_order': 0.20,
+    'list_limit_date': 0.10,
+    'list_completed': 0.06,
+    'task_detail': 0.14,
+    'reorder': 0.15,
+    'start': 0.08,
+    'pause': 0.08,
+    'update': 0.07,
+    'end': 0.04,
+    'restore': 0.03,
+    'add': 0.05,
+}
+MIN_SAMPLES = 20 # Routes with fewer requests are reported but not compared
+MIN_REGRESSION_MS = 1.0 # Latency differences below this are noise, whatever the ratio
+SETTINGS = ('tasks', 'mix', 'requests', 'seed', 'clients', 'rounds')
+
+
+def seed_database(path, args):
+    """
+    Seeds `path` in a child process (the app reads DATABASE_URL at import
+    time) and returns the IDs of the active and completed tasks.
+    """
+    code = (
+        'import json, sys; sys.path.insert(0, %r)\n'
+        'from seed import parse_status_mix, seed_tasks, use_scratch_database\n'
+        'use_scratch_database(%r)\n'
+        'from app import app\n'
+        'from models import db, Task\n'
+        'from schema import upgrade_schema\n'
+        'with app.app_context():\n'
+        '    db.create_all(); upgrade_schema(); seed_tasks(%d, parse_status_mix(%r))\n'
+        '    active = db.session.execute(db.select(Task.id).where(Task.active_filter())'
+        '.order_by(Task.id)).scalars().all()\n'
+        '    completed = db.session.execute(db.select(Task.id).where(Task.status == "completed")'
+        '.order_by(Task.id)).scalars().all()\n'
+        'print(json.dumps([active, completed]))\n'
+    ) % (os.path.dirname(os.path.abspath(__file__)), path, args.tasks, args.mix)
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=dict(os.environ),
+                            capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def generate_trace(count, active_ids, completed_ids, seed=0):
+    """
+    Returns `count` requests {'route', 'method', 'path', 'json'}. The
+    generator follows the lifecycle transitions it emits (an ended task
+    becomes restorable, a restored one can be reordered again), so a
+    sequential replay only sends requests that are valid at that point.
+    """
+    rng = random.Random(seed)
+    active = list(active_ids)
+    completed = list(completed_ids)
+    kinds, weights = zip(*TRACE_MIX.items())
+    trace = []
+    while len(trace) < count:
+        kind = rng.choices(kinds, weights)[0]
+        if kind in ('reorder', 'start', 'pause', 'update', 'end') and len(active) < 3:
+            continue
+        if kind == 'restore' and not completed:
+            continue
+        entry = {'route': kind, 'method': 'POST', 'json': None}
+        if kind == 'list_display_order':
+            entry.update(method='GET', path='/get_tasks?sort_by=display_order')
+        elif kind == 'list_limit_date':
+            entry.update(method='GET', path='/get_tasks?sort_by=limit_date')
+        elif kind == 'list_completed':
+            entry.update(method='GET', path='/get_completed_tasks?limit=50')
+        elif kind == 'task_detail':
+            entry.update(method='GET', path=f'/task/{rng.choice(active + completed)}')
+        elif kind == 'reorder':
+            task_id, prev_id, next_id = rng.sample(active, 3)
+            entry.update(path='/update_task_order',
+                         json={'task_id': task_id, 'prev_id': prev_id, 'next_id': next_id})
+        elif kind in ('start', 'pause'):
+            entry['path'] = f'/{kind}_task/{rng.choice(active)}'
+        elif kind == 'update':
+            entry.update(path=f'/update_task/{rng.choice(active)}',
+                         json={'name': f'Edited {rng.randrange(10 ** 6)}', 'limit_date': '2030-01-01'})
+        elif kind == 'end':
+            task_id = active.pop(rng.randrange(len(active)))
+            completed.append(task_id)
+            entry['path'] = f'/end_task/{task_id}'
+        elif kind == 'restore':
+            task_id = completed.pop(rng.randrange(len(completed)))
+            active.append(task_id)
+            entry['path'] = f'/restore_task/{task_id}'
+        elif kind == 'add':
+            entry.update(path='/add_task', json={'name': f'New task {len(trace)}', 'limit_date': '2030-06-01'})
+        trace.append(entry)
+    return trace
+
+
+def save_trace(path, settings, trace):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'settings': settings}) + '\n')
+        for entry in trace:
+            f.write(json.dumps(entry) + '\n')
+
+
+def load_trace(path):
+    """
+    Reads a trace written by save_trace(). Returns (settings, trace).
+    """
+    with open(path, encoding='utf-8') as f:
+        settings = json.loads(f.readline())['settings']
+        return settings, [json.loads(line) for line in f if line.strip()]
+
+
+def replay(trace, clients, send):
+    """
+    Replays the trace from `clients` threads, which take the requests in
+    trace order. send(state, entry) performs one request and returns its
+    status (None on a connection failure); state is a per-thread dict.
+    Returns ({route: [latency ms]}, {route: 5xx/failure count}, seconds).
+    """
+    position = iter(range(len(trace)))
+    lock = threading.Lock()
+    latencies = {}
+    errors = {}
+
+    def worker():
+        state = {}
+        while True:
+            with lock:
+                index = next(position, None)
+            if index is None:
+                break
+            entry = trace[index]
+            started = time.perf_counter()
+            status = send(state, entry)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.setdefault(entry['route'], []).append(elapsed)
+                if status is None or status >= 500:
+                    errors[entry['route']] = errors.get(entry['route'], 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of sorted samples.
+    """
+    return samples[max(0, min(len(samples) - 1, int(len(samples) * fraction + 0.5) - 1))]
+
+
+def summarize(latencies, errors, seconds):
+    routes = {}
+    for route, samples in sorted(latencies.items()):
+        samples = sorted(samples)
+        routes[route] = {
+            'count': len(samples),
+            'per_second': len(samples) / seconds,
+            'p50_ms': percentile(samples, 0.50),
+            'p95_ms': percentile(samples, 0.95),
+            'p99_ms': percentile(samples, 0.99),
+            'errors': errors.get(route, 0),
+        }
+    total = sum(route['count'] for route in routes.values())
+    return {'seconds': seconds, 'per_second': total / seconds, 'count': total,
+            'errors': sum(errors.values()), 'routes': routes}
+
+
+def replay_in_process(path, trace, clients):
+    """
+    Replays through the Flask test client. Imports the app, so it can run
+    only once per process.
+    """
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}' # Before importing the app
+    from app import app
+
+    def send(state, entry):
+        client = state.get('client')
+        if client is None:
+            client = state['client'] = app.test_client()
+        response = client.open(entry['path'], method=entry['method'], json=entry['json'])
+        response.close()
+        return response.status_code
+
+    return replay(trace, clients, send)
+
+
+def replay_http(path, trace, clients, server):
+    """
+    Starts the server on the database copy and replays over HTTP.
+    """
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.abspath(path)}')
+    process = subprocess.Popen(MODES[server](port), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port, process)
+
+        def send(state, entry):
+            body = json.dumps(entry['json']).encode() if entry['json'] is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            for attempt in range(2): # A kept-alive connection may have been closed by the server
+                connection = state.get('connection')
+                if connection is None:
+                    connection = state['connection'] = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                try:
+                    connection.request(entry['method'], entry['path'], body=body, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    return response.status
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    state['connection'] = None
+            return None
+
+        return replay(trace, clients, send)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def wait_until_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        try:
+            connection.request('GET', '/changes')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+        finally:
+            connection.close()
+    raise RuntimeError('server did not start')
+
+
+def median_result(rounds):
+    """
+    Combines the summaries of several rounds: the median of every figure.
+    """
+    median = statistics.median
+    routes = {}
+    for route in rounds[0]['routes']:
+        per_round = [r['routes'][route] for r in rounds if route in r['routes']]
+        routes[route] = {key: median([stats[key] for stats in per_round]) for key in per_round[0]}
+        routes[route]['count'] = per_round[0]['count']
+        routes[route]['errors'] = max(stats['errors'] for stats in per_round)
+    return {'seconds': median([r['seconds'] for r in rounds]), 'per_second': median([r['per_second'] for r in rounds]),
+            'count': rounds[0]['count'], 'errors': max(r['errors'] for r in rounds), 'routes': routes}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of regression messages: routes whose p50 or p95 grew, or
+    targets whose throughput dropped, by more than `tolerance` (a fraction).
+    """
+    regressions = []
+    for target, result in results.items():
+        base = baseline.get(target)
+        if base is None:
+            continue
+        if result['per_second'] < base['per_second'] * (1 - tolerance):
+            regressions.append(f"{target}: throughput {result['per_second']:.1f} req/s "
+                               f"(baseline {base['per_second']:.1f})")
+        for route, stats in result['routes'].items():
+            base_stats = base['routes'].get(route)
+            if base_stats is None or min(stats['count'], base_stats['count']) < MIN_SAMPLES:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                current, previous = stats[key], base_stats[key]
+                if current > previous * (1 + tolerance) and current - previous > MIN_REGRESSION_MS:
+                    regressions.append(f'{target} {route}: {key[:3]} {current:.1f} ms (baseline {previous:.1f} ms)')
+            if stats['errors'] > base_stats['errors']:
+                regressions.append(f"{target} {route}: {stats['errors']} errors (baseline {base_stats['errors']})")
+    return regressions
+
+
+def print_result(target, result):
+    print(f"\n[{target}]  {result['count']} requests in {result['seconds']:.1f}s, "
+          f"{result['per_second']:.1f} req/s, {result['errors']} errors")
+    print(f"  {'route':20} {'count':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for route, r in result['routes'].items():
+        print(f"  {route:20} {r['count']:6} {r['per_second']:8.1f} {r['p50_ms']:8.1f} "
+              f"{r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['errors']:6}")
+
+
+def run_inprocess_child(args):
+    """
+    --run-inprocess: replays in this (fresh) process and prints the summary
+    as JSON on the last line of stdout.
+    """
+    _, trace = load_trace(args.trace)
+    latencies, errors, seconds = replay_in_process(args.db, trace, args.clients)
+    print(json.dumps(summarize(latencies, errors, seconds)))
+
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20000, help='number of tasks to seed')
+    parser.add_argument('--mix', default=None, help='status mix, e.g. todo=0.04,doing=0.01,completed=0.8,deleted=0.15')
+    parser.add_argument('--requests', type=int, default=3000, help='length of the generated trace')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the generated trace')
+    parser.add_argument('--clients', type=int, default=1, help='concurrent replay threads (1: sequential, the most stable)')
+    parser.add_argument('--rounds', type=int, default=3, help='replays per target (the median is kept)')
+    parser.add_argument('--targets', default='inprocess,http', help='comma-separated: inprocess, http')
+    parser.add_argument('--server', default='wsgi', choices=sorted(MODES), help='server of the http target')
+    parser.add_argument('--trace', default=None, help='replay this NDJSON trace instead of generating one')
+    parser.add_argument('--save-trace', default=None, help='write the generated trace to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='allowed slowdown before failing (0.3 = 30%%)')
+    parser.add_argument('--output', default=None, help='also write the results to this JSON file')
+    parser.add_argument('--run-inprocess', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--db', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    parse_status_mix(args.mix) # Fail early on a malformed mix
+
+    if args.run_inprocess:
+        run_inprocess_child(args)
+        return 0
+
+    base_path = use_scratch_database()
+    copies = []
+    try:
+        active_ids, completed_ids = seed_database(base_path, args)
+        settings = {key: getattr(args, key) for key in SETTINGS}
+        if args.trace:
+            trace_settings, trace = load_trace(args.trace)
+            settings.update(trace_settings, clients=args.clients)
+        else:
+            trace = generate_trace(args.requests, active_ids, completed_ids, args.seed)
+        trace_path = args.save_trace or base_path + '.trace.ndjson'
+        save_trace(trace_path, settings, trace)
+        if not args.save_trace:
+            copies.append(trace_path)
+
+        results = {}
+        for target in args.targets.split(','):
+            if target not in ('inprocess', 'http'):
+                parser.error(f'unknown target {target!r}')
+            rounds = []
+            path = f'{base_path}.{target}'
+            copies.append(path)
+            for _ in range(args.rounds):
+                shutil.copyfile(base_path, path) # Every round starts from the same data
+                if target == 'inprocess':
+                    # A fresh interpreter, so the app binds to this copy
+                    output = subprocess.run([sys.executable, __file__, '--run-inprocess', '--trace', trace_path,
+                                             '--db', path, '--clients', str(args.clients)],
+                                            cwd=ROOT, capture_output=True, text=True)
+                    if output.returncode != 0:
+                        print(f'[inprocess] failed:\n{output.stderr}')
+                        return 2
+                    rounds.append(json.loads(output.stdout.strip().splitlines()[-1]))
+                else:
+                    rounds.append(summarize(*replay_http(path, trace, args.clients, args.server)))
+                remove_database(path)
+            results[target] = median_result(rounds)
+            print_result(target, results[target])
+    finally:
+        for path in [base_path] + copies:
+            remove_database(path)
+
+    recorded = {'settings': settings, 'server': args.server, 'python': platform.python_version(),
+                'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'\nBaseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline at {args.baseline}: run with --update-baseline to record one.')
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline['settings'] != settings or baseline.get('server') != args.server:
+        print(f"\nThe baseline was recorded with other settings ({baseline['settings']}, "
+              f"server {baseline.get('server')}); not comparable.")
+        return 2
+    regressions = compare(results, baseline['results'], args.tolerance)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) against {args.baseline}:')
+        for message in regressions:
+            print(f'  {message}')
+        return 1
+    print(f'\nNo regression against {args.baseline} (tolerance {args.tolerance:.0%}).')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
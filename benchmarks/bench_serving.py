@@ -0,0 +1,304 @@
+# benchmarks/bench_serving.py
+
+"""
+Compares the WSGI (gunicorn app:app, as in the Dockerfile) and ASGI
+(uvicorn asgi:application) serving modes under the same workload.
+
+For each mode a fresh database is seeded identically and the server is
+started as a subprocess on a free port. An asyncio HTTP client (standard
+library only) then runs three phases:
+
+  load   --clients concurrent clients for --seconds: reads of single tasks
+         and archive pages, start/pause/edit writes (as in load_test.py)
+  idle   the same load while --idle-streams /events connections are held
+         open; reports how many streams were accepted and how long a change
+         takes to reach all of them
+  slow   the same load while --slow-clients connections send their request
+         headers one byte at a time
+
+    python benchmarks/bench_serving.py --tasks 20000 --clients 32 --idle-streams 2000
+
+Requires gunicorn and the ASGI dependencies (requirements-asgi.txt).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from seed import ROOT, parse_status_mix, use_scratch_database
+
+MODES = {
+    'wsgi': lambda port: ['gunicorn', '--workers', '1', '--threads', '4', '--bind', f'127.0.0.1:{port}', 'app:app'],
+    'asgi': lambda port: ['uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(port), '--no-access-log',
+                          '--timeout-graceful-shutdown', '5'],
+}
+REQUEST_TIMEOUT = 30
+
+
+def seed_database(args):
+    """
+    Seeds a scratch database in a child process (the app reads DATABASE_URL
+    at import time) and returns its path with the task IDs to use.
+    """
+    path = use_scratch_database()
+    code = (
+        'import json, sys; sys.path.insert(0, %r)\n'
+        'from seed import parse_status_mix, seed_tasks\n'
+        'from app import app\n'
+        'from models import db, Task\n'
+        'from schema import upgrade_schema\n'
+        'with app.app_context():\n'
+        '    db.create_all(); upgrade_schema(); seed_tasks(%d, parse_status_mix(%r))\n'
+        '    active = db.session.execute(db.select(Task.id).where(Task.active_filter())).scalars().all()\n'
+        '    every = db.session.execute(db.select(Task.id)).scalars().all()\n'
+        'print(json.dumps([active, every]))\n'
+    ) % (os.path.dirname(os.path.abspath(__file__)), args.tasks, args.mix)
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=dict(os.environ),
+                            capture_output=True, text=True, check=True)
+    active_ids, all_ids = json.loads(output.stdout.strip().splitlines()[-1])
+    return path, active_ids, all_ids
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def http_request(port, method, path, body=None):
+    """
+    One request on a new connection (Connection: close). Returns the status.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        data = json.dumps(body).encode() if body is not None else b''
+        head = f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\nContent-Length: {len(data)}\r\n'
+        if body is not None:
+            head += 'Content-Type: application/json\r\n'
+        writer.write(head.encode() + b'\r\n' + data)
+        response = await reader.read(-1) # Until the server closes the connection
+        return int(response.split(b' ', 2)[1])
+    finally:
+        writer.close()
+
+
+async def wait_until_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            await http_request(port, 'GET', '/changes')
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+async def run_load(port, args, active_ids, all_ids):
+    """
+    Runs the read/write mix with args.clients concurrent clients.
+    """
+    stop_at = time.perf_counter() + args.seconds
+    stats = {'read': [], 'write': [], 'errors': 0}
+
+    async def client(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < stop_at:
+            is_write = rng.random() < args.write_ratio
+            body = None
+            if is_write:
+                task_id = rng.choice(active_ids)
+                choice = rng.random()
+                if choice < 0.4:
+                    path = f'/start_task/{task_id}'
+                elif choice < 0.8:
+                    path = f'/pause_task/{task_id}'
+                else:
+                    path = f'/update_task/{task_id}'
+                    body = {'name': f'Edited {rng.random():.6f}', 'limit_date': '2030-01-01'}
+                method = 'POST'
+            else:
+                method = 'GET'
+                if rng.random() < 0.7:
+                    path = f'/task/{rng.choice(all_ids)}'
+                else:
+                    path = f'/get_completed_tasks?limit={rng.randint(20, 80)}'
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(http_request(port, method, path, body), REQUEST_TIMEOUT)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                status = None
+            elapsed = (time.perf_counter() - started) * 1000
+            stats['write' if is_write else 'read'].append(elapsed)
+            if status is None or status >= 500:
+                stats['errors'] += 1
+
+    await asyncio.gather(*(client(i) for i in range(args.clients)))
+    return stats
+
+
+async def open_stream(port):
+    """
+    Opens an /events stream. Returns (reader, writer) once the server
+    answered 200, or None if it refused or failed.
+    """
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /events HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+        status_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    if b' 200 ' not in status_line:
+        writer.close()
+        return None
+    return reader, writer
+
+
+async def wait_for_change(reader):
+    while True:
+        line = await reader.readline()
+        if not line:
+            return False
+        if line.startswith(b'event: change'):
+            return True
+
+
+async def run_idle(port, args, active_ids, all_ids):
+    streams = await asyncio.gather(*(open_stream(port) for _ in range(args.idle_streams)))
+    opened = [stream for stream in streams if stream is not None]
+    load = await run_load(port, args, active_ids, all_ids)
+
+    # One more change: how long until every open stream has received it
+    fan_out = None
+    if opened:
+        started = time.perf_counter()
+        waiters = [asyncio.ensure_future(wait_for_change(reader)) for reader, _ in opened]
+        await http_request(port, 'POST', f'/start_task/{active_ids[0]}')
+        done, pending = await asyncio.wait(waiters, timeout=REQUEST_TIMEOUT)
+        for waiter in pending:
+            waiter.cancel()
+        # Earlier changes may still be queued in the streams: count all that finished
+        fan_out = {'received': sum(1 for w in done if not w.cancelled() and w.result()),
+                   'seconds': time.perf_counter() - started}
+    for _, writer in opened:
+        writer.close()
+    await asyncio.gather(*(writer.wait_closed() for _, writer in opened), return_exceptions=True)
+    return load, len(opened), fan_out
+
+
+async def run_slow(port, args, active_ids, all_ids):
+    stop = asyncio.Event()
+
+    async def slow_client():
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            return
+        request = b'GET /task/1 HTTP/1.1\r\nHost: localhost\r\nX-Padding: ' + b'x' * 4096
+        try:
+            for byte in request:
+                if stop.is_set():
+                    break
+                writer.write(bytes([byte]))
+                await writer.drain()
+                await asyncio.sleep(0.5)
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    slow = [asyncio.ensure_future(slow_client()) for _ in range(args.slow_clients)]
+    await asyncio.sleep(1) # Let them connect
+    load = await run_load(port, args, active_ids, all_ids)
+    stop.set()
+    await asyncio.gather(*slow)
+    return load
+
+
+def summarize(stats, seconds):
+    samples = sorted(stats['read'] + stats['write'])
+    if not samples:
+        return {'count': 0, 'errors': stats['errors']}
+    return {
+        'count': len(samples),
+        'per_second': len(samples) / seconds,
+        'p50_ms': statistics.median(samples),
+        'p95_ms': samples[int(len(samples) * 0.95) - 1],
+        'max_ms': samples[-1],
+        'errors': stats['errors'],
+    }
+
+
+def format_load(name, result):
+    if not result['count']:
+        return f"  {name:5}  no requests completed, errors {result['errors']}"
+    return (f"  {name:5}  {result['per_second']:8.1f} req/s   p50 {result['p50_ms']:7.1f} ms   "
+            f"p95 {result['p95_ms']:7.1f} ms   max {result['max_ms']:8.1f} ms   errors {result['errors']}")
+
+
+async def bench_mode(mode, args):
+    path, active_ids, all_ids = seed_database(args)
+    port = free_port()
+    process = subprocess.Popen(MODES[mode](port), cwd=ROOT, env=dict(os.environ),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await wait_until_ready(port, process)
+        print(f'\n[{mode}]')
+        print(format_load('load', summarize(await run_load(port, args, active_ids, all_ids), args.seconds)))
+        if args.idle_streams:
+            load, opened, fan_out = await run_idle(port, args, active_ids, all_ids)
+            print(format_load('idle', summarize(load, args.seconds)))
+            line = f'         {opened}/{args.idle_streams} event streams accepted'
+            if fan_out:
+                line += f", change delivered to {fan_out['received']} of them in {fan_out['seconds'] * 1000:.0f} ms"
+            print(line)
+        if args.slow_clients:
+            print(format_load('slow', summarize(await run_slow(port, args, active_ids, all_ids), args.seconds)))
+            print(f'         with {args.slow_clients} clients trickling their request headers')
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20000, help='number of tasks to seed')
+    parser.add_argument('--mix', default=None, help='status mix, e.g. todo=0.2,doing=0.05,completed=0.6,deleted=0.15')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent clients of the load phases')
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each load phase')
+    parser.add_argument('--write-ratio', type=float, default=0.3, help='fraction of requests that write')
+    parser.add_argument('--idle-streams', type=int, default=1000, help='/events connections held open (0 = skip)')
+    parser.add_argument('--slow-clients', type=int, default=16, help='clients sending headers slowly (0 = skip)')
+    parser.add_argument('--modes', default='wsgi,asgi', help='comma-separated serving modes to compare')
+    args = parser.parse_args()
+    parse_status_mix(args.mix) # Fail early on a malformed mix
+
+    # Every held connection is a file descriptor, in this process and in the server
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = args.idle_streams + args.slow_clients + args.clients + 256
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard) if hard != resource.RLIM_INFINITY else wanted, hard))
+
+    for mode in args.modes.split(','):
+        asyncio.run(bench_mode(mode, args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# benchmarks/load_test.py
+
+"""
+Concurrent read/write load test for the database engine profiles.
+
+For each profile (DB_PROFILE=default and DB_PROFILE=production) a fresh
+database is seeded and the app is driven in a separate process by a pool of
+threads, like gunicorn --threads. Readers fetch single tasks and archive
+pages; writers start/pause tasks and edit them. Reports throughput, latency
+and the number of failed requests ("database is locked" shows up as 500s):
+
+    python benchmarks/load_test.py --tasks 50000 --threads 8 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from seed import parse_status_mix, seed_tasks, use_scratch_database
+
+
+def run_profile(args):
+    """
+    Runs the load in this process (DB_PROFILE is already set) and prints
+    the results as JSON on the last line of stdout.
+    """
+    path = use_scratch_database()
+
+    from app import app
+    from models import db, Task
+    from schema import upgrade_schema
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        seed_tasks(args.tasks, parse_status_mix(args.mix))
+        active_ids = db.session.execute(db.select(Task.id).where(Task.active_filter())).scalars().all()
+        all_ids = db.session.execute(db.select(Task.id)).scalars().all()
+
+    stop_at = time.perf_counter() + args.seconds
+    lock = threading.Lock()
+    stats = {'read': [], 'write': [], 'errors': 0, 'error_samples': []}
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        while time.perf_counter() < stop_at:
+            is_write = rng.random() < args.write_ratio
+            if is_write:
+                task_id = rng.choice(active_ids)
+                choice = rng.random()
+                if choice < 0.4:
+                    request = lambda: client.post(f'/start_task/{task_id}')
+                elif choice < 0.8:
+                    request = lambda: client.post(f'/pause_task/{task_id}')
+                else:
+                    request = lambda: client.post(f'/update_task/{task_id}', json={
+                        'name': f'Edited {rng.random():.6f}', 'limit_date': '2030-01-01'})
+            else:
+                if rng.random() < 0.7:
+                    task_id = rng.choice(all_ids)
+                    request = lambda: client.get(f'/task/{task_id}')
+                else:
+                    # limit varies so the response cache does not hide the database
+                    request = lambda: client.get(f'/get_completed_tasks?limit={rng.randint(20, 80)}')
+            started = time.perf_counter()
+            response = request()
+            elapsed = (time.perf_counter() - started) * 1000
+            ok = response.status_code < 500
+            with lock:
+                stats['write' if is_write else 'read'].append(elapsed)
+                if not ok:
+                    stats['errors'] += 1
+                    if len(stats['error_samples']) < 3:
+                        stats['error_samples'].append(response.get_json(silent=True))
+            response.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def summarize(samples):
+        if not samples:
+            return {'count': 0}
+        samples = sorted(samples)
+        return {
+            'count': len(samples),
+            'per_second': len(samples) / args.seconds,
+            'p50_ms': statistics.median(samples),
+            'p95_ms': samples[int(len(samples) * 0.95) - 1],
+            'max_ms': samples[-1],
+        }
+
+    print(json.dumps({
+        'read': summarize(stats['read']),
+        'write': summarize(stats['write']),
+        'errors': stats['errors'],
+        'error_samples': stats['error_samples'],
+    }))
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20000, help='number of tasks to seed')
+    parser.add_argument('--mix', default=None, help='status mix, e.g. todo=0.2,doing=0.05,completed=0.6,deleted=0.15')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--seconds', type=float, default=10, help='duration per profile')
+    parser.add_argument('--write-ratio', type=float, default=0.3, help='fraction of requests that write')
+    parser.add_argument('--profiles', default='default,production', help='comma-separated DB_PROFILE values to compare')
+    parser.add_argument('--run-profile', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        run_profile(args)
+        return 0
+
+    forwarded = [a for a in sys.argv[1:] if a != '--run-profile']
+    for profile in args.profiles.split(','):
+        env = dict(os.environ, DB_PROFILE=profile)
+        output = subprocess.run([sys.executable, __file__, '--run-profile', *forwarded],
+                                env=env, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f'[{profile}] failed:\n{output.stderr}')
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f'\n[{profile}]')
+        for kind in ('read', 'write'):
+            r = result[kind]
+            if r['count']:
+                print(f"  {kind:5}  {r['per_second']:8.1f} req/s   p50 {r['p50_ms']:7.1f} ms   "
+                      f"p95 {r['p95_ms']:7.1f} ms   max {r['max_ms']:7.1f} ms")
+        print(f"  errors {result['errors']}")
+        for sample in result['error_samples']:
+            print(f'    {sample}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# benchmarks/seed.py
+
+"""
+Helpers shared by the benchmark scripts: point the app at a scratch database
+and fill it with synthetic tasks.
+
+The scripts import app.py, which reads DATABASE_URL at import time, so
+use_scratch_database() must be called before `import app`.
+"""
+
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Default status mix of a long-lived board: a small active set and a large archive.
+DEFAULT_STATUS_MIX = {'todo': 0.04, 'doing': 0.01, 'completed': 0.80, 'deleted': 0.15}
+
+
+def use_scratch_database(path=None):
+    """
+    Sets DATABASE_URL to a fresh SQLite file and returns its path.
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix='task_manager_bench_', suffix='.db')
+        os.close(fd)
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    return path
+
+
+def parse_status_mix(text):
+    """
+    Parses "todo=0.04,doing=0.01,completed=0.8,deleted=0.15" into a dict.
+    """
+    if not text:
+        return dict(DEFAULT_STATUS_MIX)
+    mix = {}
+    for part in text.split(','):
+        status, _, weight = part.partition('=')
+        mix[status.strip()] = float(weight)
+    return mix
+
+
+def generate_tasks(count, status_mix=None, seed=0, now=None):
+    """
+    Yields dicts of Task column values with plausible dates for each status.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    statuses = list((status_mix or DEFAULT_STATUS_MIX).items())
+    names, weights = zip(*statuses)
+    for i in range(count):
+        status = rng.choices(names, weights)[0]
+        created_at = now - timedelta(days=rng.uniform(0, 730))
+        limit_date = created_at + timedelta(days=rng.randint(1, 60))
+        row = {
+            'name': f'Task {i}',
+            'detail': 'Lorem ipsum dolor sit amet. ' * rng.randint(0, 20),
+            'limit_date': limit_date,
+            'scheduled_start_date': None,
+            'scheduled_end_date': None,
+            'actual_start_date': None,
+            'actual_end_date': None,
+            'display_order': rng.randint(0, count),
+            'is_not_main': rng.random() < 0.2,
+            'status': status,
+            'delete_reason': None,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+        if rng.random() < 0.5:
+            row['scheduled_start_date'] = created_at + timedelta(days=rng.randint(0, 5))
+            row['scheduled_end_date'] = row['scheduled_start_date'] + timedelta(days=rng.randint(0, 20))
+        if status in ('doing', 'completed'):
+            row['actual_start_date'] = created_at + timedelta(hours=rng.randint(1, 240))
+        if status in ('completed', 'deleted'):
+            end = created_at + timedelta(hours=rng.randint(241, 2000))
+            row['actual_end_date'] = min(end, now)
+            row['updated_at'] = row['actual_end_date']
+        if status == 'deleted' and rng.random() < 0.5:
+            row['delete_reason'] = 'No longer needed'
+        yield row
+
+
+def seed_tasks(count, status_mix=None, seed=0, chunk_size=10000):
+    """
+    Bulk-inserts `count` synthetic tasks through models.Task.
+    Must be called inside an application context.
+    """
+    from models import db, Task
+
+    chunk = []
+    for row in generate_tasks(count, status_mix, seed):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(db.insert(Task), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(db.insert(Task), chunk)
+    db.session.commit()
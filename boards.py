@@ -0,0 +1,294 @@
+# boards.py
+
+"""
+Boards: independent task lists, each stored in its own database shard.
+
+Every route of the app can be reached under /boards/<board>/ (the page,
+the API, /events, ...); without the prefix it works on the default board,
+which is the DATABASE_URL database as before. BoardPrefixMiddleware moves
+the prefix to SCRIPT_NAME, so url_for() and request.script_root include
+it, and select_board() stores the board in g.board.
+
+BoardSession, the session class of models.db, routes every statement to
+the engine of the current board, so the routes, the change feed, the
+stats and the CLI commands run unchanged against the board's shard:
+
+  SQLite      one file per board in BOARDS_DIR (default: boards/ next to
+              the main database file). Each board has its own write lock,
+              so writes to different boards proceed in parallel, and a
+              board's queries only ever read that board's tables and
+              indexes.
+  PostgreSQL  one schema per board (board_<name>) in the same database,
+              selected with schema_translate_map on the shared pool.
+
+Shard engines are opened on first use, each with its own connection pool
+and the profile's PRAGMAs. At most BOARD_MAX_OPEN of them are kept; the
+least recently used one is disposed, which closes its idle connections
+(connections still in use are closed when they are returned).
+
+Boards are created with POST /boards and listed with GET /boards. Process
+state that describes a database (list versions and response cache, change
+feed, deadline scheduler, group commit writer) is kept per board. The
+background threads of a board other than the default one stop after
+BOARD_IDLE_SECONDS without requests or /events clients, and are started
+again on the next request; while its shard engine is closed, a board's
+feed does not poll it (which would reopen it).
+"""
+
+import functools
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import click
+from flask import g, has_app_context, jsonify, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.schema import CreateSchema
+
+from db_config import engine_options, init_engine
+
+DEFAULT_BOARD = 'default'
+BOARD_NAME = re.compile(r'[a-z0-9][a-z0-9_-]{0,62}')
+BOARD_PATH = re.compile(r'/boards/([^/]+)(/.*)?')
+BOARD_ENVIRON_KEY = 'task_manager.board'
+SCHEMA_PREFIX = 'board_'
+BOARD_IDLE_SECONDS = float(os.environ.get('BOARD_IDLE_SECONDS') or 300)
+
+
+def valid_board_name(name):
+    return isinstance(name, str) and BOARD_NAME.fullmatch(name) is not None
+
+
+def current_board(session=None):
+    """
+    The board being worked on: the one a session was opened for (the ASGI
+    app's sessions carry it in session.info), otherwise g.board.
+    """
+    if session is not None:
+        board = session.info.get('board')
+        if board is not None:
+            return board
+    if has_app_context():
+        return g.get('board', DEFAULT_BOARD)
+    return DEFAULT_BOARD
+
+
+def board_key(name, board):
+    """
+    Qualifies a per-process key (e.g. a list name of cache.py) with the
+    board. Keys of the default board are unchanged.
+    """
+    return name if board == DEFAULT_BOARD else f'{board}/{name}'
+
+
+@contextmanager
+def board_context(app, board):
+    """
+    Application context working on `board`, for background threads.
+    """
+    with app.app_context():
+        g.board = board
+        yield
+
+
+class BoardSession(Session):
+    """
+    Session class of models.db: statements go to the current board's shard.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            board = current_board(self)
+            if board != DEFAULT_BOARD:
+                return shards.engine(board)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ShardRegistry:
+    """
+    Engines of the board shards, opened on first use and kept in an LRU.
+    """
+
+    def __init__(self, max_open=16):
+        self.max_open = max_open
+        self.app = None
+        self.db = None
+        self.directory = None # SQLite: where the board files are
+        self._engines = OrderedDict()
+        self._known = set() # Boards whose shard was seen to exist
+        self._engine_hooks = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        with app.app_context():
+            url = db.engine.url
+        self.profile = app.config['DB_PROFILE']
+        self.is_sqlite = url.get_backend_name() == 'sqlite'
+        if self.is_sqlite and url.database and url.database != ':memory:':
+            self.directory = os.environ.get('BOARDS_DIR') or os.path.join(os.path.dirname(url.database), 'boards')
+
+    def on_engine(self, hook):
+        """
+        Calls hook(engine) on every shard engine opened from now on (e.g. to
+        instrument it like the main engine).
+        """
+        self._engine_hooks.append(hook)
+
+    def shard_path(self, board):
+        return os.path.join(self.directory, f'{board}.db')
+
+    def shard_uri(self, board):
+        """
+        Database URI of a board (for SQLite, its own file).
+        """
+        if board == DEFAULT_BOARD or not self.is_sqlite:
+            return self.db.engine.url.render_as_string(hide_password=False)
+        return f'sqlite:///{os.path.abspath(self.shard_path(board))}'
+
+    def schema_translate_map(self, board):
+        """
+        Server databases: tables of the default schema go to the board's schema.
+        """
+        return {None: SCHEMA_PREFIX + board}
+
+    def is_open(self, board):
+        """
+        False if reading the board would open (or reopen) its shard engine.
+        """
+        return board == DEFAULT_BOARD or not self.is_sqlite or board in self._engines
+
+    def exists(self, board):
+        if board == DEFAULT_BOARD:
+            return True
+        if not valid_board_name(board):
+            return False
+        if board in self._known:
+            return True
+        if self.is_sqlite:
+            found = self.directory is not None and os.path.exists(self.shard_path(board))
+        else:
+            found = inspect(self.db.engine).has_schema(SCHEMA_PREFIX + board)
+        if found:
+            self._known.add(board)
+        return found
+
+    def engine(self, board):
+        """
+        The engine of a board's shard. Opening one may dispose the least
+        recently used shard engine.
+        """
+        with self._lock:
+            engine = self._engines.get(board)
+            if engine is not None:
+                self._engines.move_to_end(board)
+                return engine
+            if self.is_sqlite:
+                uri = self.shard_uri(board)
+                engine = create_engine(uri, **engine_options(uri, self.profile))
+                init_engine(engine, self.profile)
+                for hook in self._engine_hooks:
+                    hook(engine)
+            else:
+                # Same pool as the main engine, other schema
+                engine = self.db.engine.execution_options(schema_translate_map=self.schema_translate_map(board))
+            self._engines[board] = engine
+            evicted = []
+            while len(self._engines) > self.max_open:
+                evicted.append(self._engines.popitem(last=False)[1])
+        for old in evicted:
+            if self.is_sqlite:
+                old.dispose() # Closes its idle pooled connections
+        return engine
+
+    def create(self, board):
+        """
+        Creates a board's shard with every table and index. Must be called
+        within an application context.
+        """
+        from schema import upgrade_schema
+
+        if self.is_sqlite:
+            if self.directory is None:
+                raise ValueError('Boards need a file-based SQLite database or a server database')
+            os.makedirs(self.directory, exist_ok=True)
+        else:
+            with self.db.engine.begin() as conn:
+                conn.execute(CreateSchema(SCHEMA_PREFIX + board, if_not_exists=True))
+        engine = self.engine(board)
+        self.db.metadata.create_all(engine)
+        if self.is_sqlite:
+            # Full-text and interval indexes (SQLite only); on a server
+            # database create_all() already made every index
+            with board_context(self.app, board):
+                upgrade_schema(engine)
+        self._known.add(board)
+
+    def boards(self):
+        """
+        Names of the existing boards, the default board first.
+        """
+        if self.is_sqlite:
+            names = []
+            if self.directory is not None and os.path.isdir(self.directory):
+                names = [name[:-3] for name in os.listdir(self.directory) if name.endswith('.db')]
+        else:
+            names = [schema[len(SCHEMA_PREFIX):] for schema in inspect(self.db.engine).get_schema_names()
+                     if schema.startswith(SCHEMA_PREFIX)]
+        return [DEFAULT_BOARD] + sorted(name for name in names if valid_board_name(name) and name != DEFAULT_BOARD)
+
+
+shards = ShardRegistry(max_open=int(os.environ.get('BOARD_MAX_OPEN') or 16))
+
+
+class BoardPrefixMiddleware:
+    """
+    WSGI middleware serving /boards/<board>/<path> as <path> of the wrapped
+    app: the prefix moves to SCRIPT_NAME and the board name into the environ.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        match = BOARD_PATH.fullmatch(environ.get('PATH_INFO', ''))
+        if match:
+            board = match.group(1)
+            environ[BOARD_ENVIRON_KEY] = board
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + f'/boards/{board}'
+            environ['PATH_INFO'] = match.group(2) or '/'
+        return self.wsgi_app(environ, start_response)
+
+
+def init_boards(app, db):
+    """
+    Sets up the shard registry, the URL prefix and the board selection of
+    each request.
+    """
+    shards.init_app(app, db)
+    app.wsgi_app = BoardPrefixMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def select_board():
+        board = request.environ.get(BOARD_ENVIRON_KEY, DEFAULT_BOARD)
+        if not shards.exists(board):
+            return jsonify({'error': f'Board not found: {board}'}), 404
+        g.board = board
+
+
+def board_option(command):
+    """
+    Adds --board to a CLI command: it then works on that board's shard.
+    """
+    @click.option('--board', default=DEFAULT_BOARD, show_default=True, help='Board to work on.')
+    @functools.wraps(command)
+    def wrapper(*args, board, **kwargs):
+        if not shards.exists(board):
+            raise click.ClickException(f'Board not found: {board}')
+        g.board = board
+        return command(*args, **kwargs)
+    return wrapper
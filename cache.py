@@ -0,0 +1,107 @@
+# cache.py
+
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+# Which task listing shows a task in a given status
+STATUS_LISTS = {
+    'todo': 'active',
+    'doing': 'active',
+    'completed': 'completed',
+    'deleted': 'deleted',
+}
+
+
+class ListVersions:
+    """
+    Per-list version counters for the task listings ('active', 'completed',
+    'deleted'). Every committed write bumps the counters of the lists it
+    touched, so an unchanged counter means the list content is unchanged.
+
+    The counters live in process memory. Together with a per-process token in
+    the ETag this is exact for a single worker process (the Dockerfile runs
+    gunicorn with --workers 1); with several processes, writes made by another
+    process are not seen here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self.token = uuid.uuid4().hex[:8]
+
+    def get(self, list_name):
+        with self._lock:
+            return self._versions.get(list_name, 0)
+
+    def bump(self, *list_names):
+        with self._lock:
+            for name in list_names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+
+class ResponseCache:
+    """
+    Small LRU cache of serialized JSON list responses, keyed by
+    (list name, query parameters). An entry is only served while the list's
+    version is the one it was built for.
+    """
+
+    def __init__(self, versions, max_entries=128):
+        self.versions = versions
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def etag(self, key, version):
+        """
+        Strong ETag for one representation of a list at a given version.
+        """
+        variant = hashlib.blake2s(repr(key).encode(), digest_size=6).hexdigest()
+        return f'{key[0]}-{self.versions.token}-{version}-{variant}'
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, body):
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+list_versions = ListVersions()
+response_cache = ResponseCache(list_versions)
+
+
+def mark_lists_changed(session, *list_names):
+    """
+    Records that the current transaction changes the given lists. Their
+    versions are bumped once the transaction commits (and forgotten if it is
+    rolled back), so a reader never caches a version that was not committed.
+    """
+    session.info.setdefault('changed_lists', set()).update(list_names)
+
+
+def init_list_cache(session):
+    """
+    Registers the commit/rollback hooks on the application's session.
+    """
+    @event.listens_for(session, 'after_commit')
+    def bump_changed_lists(sess):
+        changed = sess.info.pop('changed_lists', None)
+        if changed:
+            list_versions.bump(*changed)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_changed_lists(sess):
+        sess.info.pop('changed_lists', None)
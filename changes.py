@@ -0,0 +1,508 @@
+# changes.py
+
+"""
+Append-only change log and the live change feed built on top of it.
+
+Every mutating route records one task_changes row per changed task, in the
+same transaction as the change itself, so the log never lists a change that
+was rolled back and never misses one that committed.
+
+ChangeFeed turns the log into events for /events (server-sent events) and
+/changes?since=<seq>. A single background thread reads new log entries
+(woken right away by commits in this process, and polling for writes made by
+other processes), loads the current summary of the changed tasks with one
+query, and keeps the most recent events in a ring buffer. Every connected
+client is served from that buffer, so database reads grow with the number of
+changes rather than with the number of clients.
+
+Each board (see boards.py) has its own change log, so ChangeFeeds keeps one
+feed per board, created on first use.
+
+With SQLite, writers are serialized and log entries become visible in `seq`
+order. On PostgreSQL a transaction that commits late can expose a smaller
+`seq` after a larger one was already read; the feed does not try to detect
+that case.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import event
+
+from boards import BOARD_IDLE_SECONDS, DEFAULT_BOARD, board_context, current_board, shards
+from models import db, Task, TaskArchive, TaskChange
+from serializers import SUMMARY_FIELDS, dumps, fetch_dicts, select_fields
+
+logger = logging.getLogger(__name__)
+
+
+def _env_number(name, default, convert=int):
+    value = os.environ.get(name)
+    return convert(value) if value else default
+
+
+def record_changes(session, changes, now=None):
+    """
+    Appends (task_id, action) pairs to the change log as part of the current
+    transaction, with a single executemany INSERT.
+    """
+    now = now or datetime.utcnow()
+    rows = [{'task_id': task_id, 'action': action, 'changed_at': now} for task_id, action in changes]
+    if rows:
+        session.execute(db.insert(TaskChange), rows)
+        session.info['logged_changes'] = current_board(session) # Whose feed to wake on commit
+
+
+class ChangeFeed:
+    """
+    In-process fan-out of the change log of one board.
+
+    Events are dicts {'seq', 'task_id', 'action', 'task'} where 'task' is the
+    summary projection of the task as read by the feed thread, from either
+    tier (None if the row no longer exists, e.g. the 'import' entries). Several changes of one task read in the same round
+    therefore carry the same, latest state, which is what a client applying
+    them as upserts needs.
+    """
+
+    def __init__(self, board=DEFAULT_BOARD, buffer_size=1000, poll_interval=1.0, batch_size=500, retention=100000,
+                 idle_seconds=BOARD_IDLE_SECONDS, on_retire=None):
+        self.board = board
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.retention = retention # Log entries kept in the database
+        self.idle_seconds = idle_seconds # Boards other than the default one: stop after this long unused
+        self.on_retire = on_retire # Called with the feed once its thread has stopped
+        self.retired = False
+        self.app = None
+        self.last_seq = None # Newest seq read from the log
+        self._events = deque(maxlen=buffer_size)
+        self._floor = None # The buffer holds every event with floor < seq <= last_seq
+        self._pruned_through = 0
+        self._condition = threading.Condition()
+        self._async_waiters = set() # Futures of coroutines in wait_async()
+        self._formatted = {} # seq -> SSE text of the event, shared by every stream
+        self._listeners = []
+        self._subscribers = 0 # Open /events streams
+        self._last_used = time.monotonic()
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        """
+        Makes the feed thread read the log now (a transaction wrote to it).
+        """
+        self._wakeup.set()
+
+    def touch(self):
+        """
+        Records a use of the feed. Returns False if it has retired; ask
+        ChangeFeeds for the board's new feed then.
+        """
+        with self._condition:
+            self._last_used = time.monotonic()
+            return not self.retired
+
+    def subscribe(self):
+        with self._condition:
+            self._subscribers += 1
+
+    def unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+            self._last_used = time.monotonic()
+
+    def _retire_if_idle(self):
+        """
+        Retires the feed of a board other than the default one once nothing
+        used it for idle_seconds. Returns True if it did.
+        """
+        if self.board == DEFAULT_BOARD:
+            return False
+        with self._condition:
+            if (self._subscribers or self._async_waiters
+                    or time.monotonic() - self._last_used < self.idle_seconds):
+                return False
+            self.retired = True
+            self._events.clear()
+            self._formatted = {}
+        return True
+
+    def add_listener(self, listener):
+        """
+        Registers an object that follows the feed in memory (see deadlines.py):
+        listener.feed_started() is called once the feed has read the head of
+        the log (within an application context), then
+        listener.feed_events(events) from the feed thread with every batch of
+        new events, and listener.feed_stopped() if the feed retires.
+        """
+        self._listeners.append(listener)
+
+    def start(self):
+        """
+        Starts the feed thread on first use. Reads the current head of the
+        log first, so callers can rely on last_seq once this returns.
+        """
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            with board_context(self.app, self.board):
+                head = self._read_head()
+                for listener in self._listeners:
+                    listener.feed_started()
+                db.session.remove()
+            with self._condition:
+                self.last_seq = self._floor = head
+            self._thread = threading.Thread(target=self._run, name=f'change-feed-{self.board}', daemon=True)
+            self._thread.start()
+
+    def _read_head(self):
+        return db.session.execute(db.select(db.func.coalesce(db.func.max(TaskChange.seq), 0))).scalar_one()
+
+    def _run(self):
+        while True:
+            woken = self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            if not woken:
+                if self._retire_if_idle():
+                    break
+                if not shards.is_open(self.board):
+                    continue # Idle poll: do not reopen a shard the LRU closed
+            with board_context(self.app, self.board):
+                try:
+                    while self.poll():
+                        pass
+                    self._prune()
+                except Exception:
+                    logger.exception('Change feed poll failed')
+                finally:
+                    db.session.remove()
+        for listener in self._listeners:
+            try:
+                listener.feed_stopped()
+            except Exception:
+                logger.exception('Change feed listener failed')
+        if self.on_retire is not None:
+            self.on_retire(self)
+
+    def _load_events(self, since, limit, session=None):
+        """
+        Reads up to `limit` log entries after `since` and attaches the current
+        summary of each changed task (one query for the log, one for the tasks).
+        """
+        session = session or db.session
+        entries = session.execute(
+            db.select(TaskChange.seq, TaskChange.task_id, TaskChange.action)
+            .where(TaskChange.seq > since).order_by(TaskChange.seq).limit(limit)
+        ).all()
+        if not entries:
+            return []
+        task_ids = {entry.task_id for entry in entries}
+        tasks = {task['id']: task for task in fetch_dicts(
+            select_fields(SUMMARY_FIELDS).where(Task.id.in_(task_ids)), SUMMARY_FIELDS, session)}
+        missing = task_ids - tasks.keys()
+        if missing:
+            # Tasks archived since the change (see archive.py)
+            tasks.update((task['id'], task) for task in fetch_dicts(
+                select_fields(SUMMARY_FIELDS, TaskArchive).where(TaskArchive.id.in_(missing)), SUMMARY_FIELDS, session))
+        return [{'seq': entry.seq, 'task_id': entry.task_id, 'action': entry.action,
+                 'task': tasks.get(entry.task_id)} for entry in entries]
+
+    def poll(self):
+        """
+        Moves new log entries into the buffer and wakes waiting streams.
+        Returns True if a full batch was read (more may be waiting).
+        """
+        events = self._load_events(self.last_seq, self.batch_size)
+        if not events:
+            return False
+        with self._condition:
+            combined = list(self._events) + events
+            if len(combined) > self.buffer_size:
+                # The oldest events fall out of the ring buffer
+                self._floor = combined[-self.buffer_size - 1]['seq']
+            self._events.extend(events)
+            self.last_seq = events[-1]['seq']
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, set()
+        by_loop = {}
+        for future in waiters:
+            by_loop.setdefault(future.get_loop(), []).append(future)
+        for loop, futures in by_loop.items():
+            try:
+                # One wake-up of the loop for all of its streams
+                loop.call_soon_threadsafe(_resolve, futures)
+            except RuntimeError: # The loop was closed (server shut down)
+                pass
+        for listener in self._listeners:
+            try:
+                listener.feed_events(events)
+            except Exception:
+                logger.exception('Change feed listener failed')
+        return len(events) == self.batch_size
+
+    def _prune(self):
+        """
+        Deletes log entries older than the retention window, in large steps
+        so the DELETE runs rarely.
+        """
+        if self.retention <= 0 or self.last_seq - self._pruned_through < self.retention + self.retention // 10:
+            return
+        cutoff = self.last_seq - self.retention
+        db.session.execute(db.delete(TaskChange).where(TaskChange.seq <= cutoff))
+        db.session.commit()
+        self._pruned_through = cutoff
+
+    def buffered_changes(self, since, limit=None):
+        """
+        Returns (events, reset) from the in-memory buffer, or None when the
+        buffer no longer covers `since` and the log table must be read.
+        """
+        limit = limit or self.batch_size
+        with self._condition:
+            if since > self.last_seq:
+                return [], True
+            if since >= self._floor:
+                # Walk back from the newest event: a caught-up stream only
+                # looks at the events it has not seen
+                events = []
+                for change in reversed(self._events):
+                    if change['seq'] <= since:
+                        break
+                    events.append(change)
+                events.reverse()
+                return events[:limit], False
+        return None
+
+    def changes_since(self, since, limit=None, session=None):
+        """
+        Returns (events, reset) for the changes after `since`: from the
+        in-memory buffer when it still covers `since`, otherwise from the log
+        table. reset is True when `since` is older than the retained log or
+        newer than its head; the client must then reload its lists.
+        Without a session, must be called within an application context.
+        """
+        buffered = self.buffered_changes(since, limit)
+        if buffered is not None:
+            return buffered
+        session = session or db.session
+        oldest = session.execute(db.select(db.func.min(TaskChange.seq))).scalar()
+        if oldest is None or since < oldest - 1:
+            return [], True
+        return self._load_events(since, limit or self.batch_size, session), False
+
+    def wait(self, since, timeout):
+        """
+        Blocks until an event newer than `since` is available or the timeout
+        expires. Returns True if there is something new.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self.last_seq > since, timeout)
+
+    def format_change(self, change):
+        """
+        The SSE text of a change event, encoded once however many streams
+        send it.
+        """
+        text = self._formatted.get(change['seq'])
+        if text is None:
+            if len(self._formatted) > 2 * self.buffer_size:
+                self._formatted = {}
+            text = self._formatted[change['seq']] = format_sse('change', change, change['seq'])
+        return text
+
+    async def wait_async(self, since, timeout):
+        """
+        wait() for coroutines (the ASGI app): a waiting client holds a future,
+        not a thread, and the feed thread resolves it on the event loop.
+        """
+        future = asyncio.get_running_loop().create_future()
+        with self._condition:
+            if self.last_seq > since:
+                return True
+            self._async_waiters.add(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(future)
+        return self.last_seq > since
+
+
+class ChangeFeeds:
+    """
+    The ChangeFeed of each board, created on first use with the same
+    settings. The feeds of boards other than the default one retire when
+    left unused (see ChangeFeed.idle_seconds); the next get() creates a new
+    one, which reads the log head again.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.app = None
+        self._feeds = {}
+        self._listener_factories = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app, session):
+        """
+        Binds the feeds to the application and wakes the feed of a board
+        whenever a transaction that wrote to its log commits.
+        """
+        self.app = app
+        self.watch_session(session)
+
+    def watch_session(self, session):
+        """
+        Wakes the feed thread when a transaction of `session` (a session, a
+        scoped session or a Session class) that wrote log entries commits.
+        """
+        @event.listens_for(session, 'after_commit')
+        def wake_change_feed(sess):
+            board = sess.info.pop('logged_changes', None)
+            if board is not None:
+                feed = self._feeds.get(board)
+                if feed is not None: # No feed yet: it reads the log head when it starts
+                    feed.wake()
+
+        @event.listens_for(session, 'after_rollback')
+        def discard_logged_changes(sess):
+            sess.info.pop('logged_changes', None)
+
+    def add_listener_factory(self, factory):
+        """
+        factory(board) returns a listener (see ChangeFeed.add_listener) for
+        the feed of each board, when that feed is created.
+        """
+        self._listener_factories.append(factory)
+
+    def get(self, board=None):
+        """
+        The feed of a board (default: the current one).
+        """
+        board = board or current_board()
+        feed = self._feeds.get(board)
+        if feed is not None and feed.touch():
+            return feed
+        with self._lock:
+            feed = self._feeds.get(board)
+            if feed is None or not feed.touch():
+                feed = ChangeFeed(board, on_retire=self._forget, **self.options)
+                feed.app = self.app
+                for factory in self._listener_factories:
+                    feed.add_listener(factory(board))
+                self._feeds[board] = feed
+        return feed
+
+    def _forget(self, feed):
+        with self._lock:
+            if self._feeds.get(feed.board) is feed:
+                del self._feeds[feed.board]
+
+
+def _resolve(futures):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
+
+
+change_feeds = ChangeFeeds(
+    buffer_size=_env_number('CHANGE_FEED_BUFFER', 1000),
+    poll_interval=_env_number('CHANGE_FEED_POLL_SECONDS', 1.0, float),
+    retention=_env_number('CHANGE_LOG_RETENTION', 100000),
+)
+
+# Concurrent /events streams per process. Each open stream holds one server
+# thread (gunicorn runs --threads 4), so streams beyond this limit are refused
+# with 503 and the browser falls back to polling /changes.
+SSE_MAX_STREAMS = _env_number('SSE_MAX_STREAMS', 2)
+# Streams are closed after this many seconds so threads are recycled; the
+# browser reconnects by itself and resumes with the Last-Event-ID header.
+SSE_STREAM_SECONDS = _env_number('SSE_STREAM_SECONDS', 300)
+SSE_HEARTBEAT_SECONDS = 15
+
+_stream_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS) if SSE_MAX_STREAMS > 0 else None
+
+
+def acquire_stream_slot():
+    return _stream_slots is not None and _stream_slots.acquire(blocking=False)
+
+
+def release_stream_slot():
+    _stream_slots.release()
+
+
+def format_sse(event_name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_name}')
+    lines.append('data: ' + dumps(data).decode('utf-8'))
+    return '\n'.join(lines) + '\n\n'
+
+
+def event_stream(feed, since):
+    """
+    Generator for /events: replays the changes after `since`, then pushes new
+    ones as they arrive. Runs inside the request's application context
+    (stream_with_context); the route releases the stream slot on close.
+    """
+    feed.subscribe() # Keeps the feed from retiring
+    try:
+        yield 'retry: 2000\n\n' # Reconnect delay for the browser
+        deadline = time.monotonic() + SSE_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            events, reset = feed.changes_since(since)
+            db.session.remove() # Do not hold a connection while idle
+            if reset:
+                since = feed.last_seq
+                yield format_sse('reset', {'last_seq': since}, since)
+                continue
+            for change in events:
+                yield feed.format_change(change)
+                since = change['seq']
+            if events:
+                continue
+            if not feed.wait(since, SSE_HEARTBEAT_SECONDS):
+                # Comment line keeps proxies from closing an idle connection;
+                # the id lets a reconnect resume from here.
+                yield f': keep-alive\nid: {since}\n\n'
+    finally:
+        feed.unsubscribe()
+
+
+async def async_event_stream(feed, since, read_changes, max_seconds=None):
+    """
+    event_stream() for the ASGI app. read_changes(since) is a coroutine
+    function returning feed.changes_since(since) (it reads the log table
+    through the async engine when the buffer does not cover `since`).
+    """
+    feed.subscribe()
+    try:
+        yield 'retry: 2000\n\n'
+        deadline = time.monotonic() + (max_seconds or SSE_STREAM_SECONDS)
+        while time.monotonic() < deadline:
+            events, reset = await read_changes(since)
+            if reset:
+                since = feed.last_seq
+                yield format_sse('reset', {'last_seq': since}, since)
+                continue
+            for change in events:
+                yield feed.format_change(change)
+                since = change['seq']
+            if events:
+                continue
+            if not await feed.wait_async(since, SSE_HEARTBEAT_SECONDS):
+                yield f': keep-alive\nid: {since}\n\n'
+    finally:
+        feed.unsubscribe()
@@ -0,0 +1,153 @@
+# compression.py
+
+"""
+Negotiated compression of the API and page responses.
+
+JSON (and the HTML page) larger than COMPRESS_MIN_BYTES is compressed with
+brotli when the client accepts it and the `brotli` package is installed, and
+with gzip otherwise. Smaller bodies are sent as they are: below about a
+kilobyte the saving does not pay for the work. Streamed responses (exports,
+/events) and files are left alone; the hashed static assets are compressed
+once at build time instead (see assets.py).
+
+A compressed body is a different representation, so its ETag is marked
+weak; If-None-Match is evaluated with the weak comparison, so revalidation
+still answers 304. A strong ETag identifies the exact body, so the
+compressed form of such a response (the cached task lists) is kept in a
+small LRU and a repeated list fetch does not compress it again.
+
+COMPRESS_RESPONSES=false turns this off, e.g. behind a proxy that already
+compresses.
+"""
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError: # brotli is optional: gzip only
+    brotli = None
+
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'true').lower() not in ('0', 'false', 'no', 'off')
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES') or 1024)
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html'}
+GZIP_LEVEL = 6 # Per response: close to the best ratio at a fraction of level 9's time
+BROTLI_QUALITY = 5
+MEMO_MAX_ENTRIES = 64
+
+
+def available_encodings():
+    """
+    Content codings this process can produce, preferred first.
+    """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings, offered=None):
+    """
+    Picks the first coding of `offered` (default: available_encodings())
+    that the request's Accept-Encoding allows, or None.
+    """
+    for encoding in offered if offered is not None else available_encodings():
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, best=False):
+    """
+    Compresses bytes with 'br' or 'gzip'. best=True uses the maximum level
+    (for files compressed once at build time).
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    # mtime=0: the same input always gives the same bytes
+    return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+
+class CompressedBodies:
+    """
+    LRU of compressed bodies keyed by (strong ETag, coding).
+    """
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+compressed_bodies = CompressedBodies()
+
+
+def is_compressed(size, accept_encodings):
+    """
+    True if a body of `size` bytes is compressed for this Accept-Encoding,
+    i.e. if its ETag is sent weak. Lets a 304 carry the same ETag as the
+    200 it stands for.
+    """
+    return COMPRESS_RESPONSES and size >= COMPRESS_MIN_BYTES and choose_encoding(accept_encodings) is not None
+
+
+def compress_body(data, accept_encodings, etag=None):
+    """
+    Compresses a response body for a request's Accept-Encoding (a werkzeug
+    Accept object). etag: the response's strong ETag, if any, to reuse an
+    earlier result. Returns (data, coding), coding None if left as is.
+    """
+    if not is_compressed(len(data), accept_encodings):
+        return data, None
+    encoding = choose_encoding(accept_encodings)
+    key = (etag, encoding) if etag else None
+    compressed = compressed_bodies.get(key) if key else None
+    if compressed is None:
+        compressed = compress(data, encoding)
+        if key:
+            compressed_bodies.put(key, compressed)
+    return compressed, encoding
+
+
+def init_compression(app):
+    """
+    Registers the after_request hook compressing eligible responses.
+    Register it after hooks that should see the compressed size (metrics.py):
+    after_request functions run in reverse order of registration.
+    """
+    if not COMPRESS_RESPONSES:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough
+                or response.is_streamed or 'Content-Encoding' in response.headers
+                or response.status_code < 200 or response.status_code in (204, 304)):
+            return response
+        response.vary.add('Accept-Encoding') # Shared caches must key on it either way
+        if (response.content_length or 0) < COMPRESS_MIN_BYTES:
+            return response
+        etag, weak = response.get_etag()
+        data, encoding = compress_body(response.get_data(), request.accept_encodings, None if weak else etag)
+        if encoding is None:
+            return response
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,295 @@
+# deadlines.py
+
+"""
+In-memory deadline scheduler: which active tasks are overdue, due soon or
+scheduled to start soon, without reading the task list.
+
+DeadlineScheduler keeps the active tasks in binary heaps keyed on
+limit_date (and, for "todo" tasks, on scheduled_start_date). It is built
+once, when the change feed starts, from a single query on the partial
+index ix_tasks_active_limit_date, and from then on it follows the change
+feed: every committed change (from any route, the ASGI app or another
+process) carries the task's current summary, and only the tasks whose
+dates or status changed are pushed again. Outdated heap entries are left
+in place and skipped (each entry carries the version of the task it was
+pushed for); the heaps are rebuilt from memory when they fill with them.
+
+due() reads the entries up to a horizon without popping them: it walks
+the heap as a tree, smallest key first, so returning k tasks visits
+O(k log k) nodes whatever the number of active tasks.
+
+A timer thread sleeps until the earliest future deadline. When a deadline
+passes it appends an 'overdue' entry to the change log, so /events and
+/changes clients are told (and re-render the task as overdue) without any
+periodic scan. Deadlines that passed while the server was down are not
+announced again: those tasks are already overdue when the lists load. With
+several server processes, each one announces the deadline; clients apply
+the duplicate entries as no-op updates.
+
+Each board has its own scheduler, created together with the board's feed
+and stopped with it when the feed retires (boards other than the default
+one, after BOARD_IDLE_SECONDS unused). The next feed of the board builds a
+new one; deadlines that passed in between are not announced.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime
+
+from boards import board_context, current_board
+from changes import record_changes
+from models import db, Task, ACTIVE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+MAX_SLEEP_SECONDS = 60 # Re-check the clock at least this often (clock changes)
+
+
+def _as_datetime(value):
+    # Feed events carry ISO strings when orjson is not installed
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _walk(heap, bound, is_current):
+    """
+    Yields the current entries of a heap whose key is <= bound, smallest
+    first, without modifying the heap: a second heap holds the frontier of
+    nodes still to visit.
+    """
+    if not heap:
+        return
+    frontier = [(heap[0], 0)]
+    while frontier:
+        entry, index = heapq.heappop(frontier)
+        if entry[0] > bound:
+            break # Every node below is larger too
+        if is_current(entry):
+            yield entry
+        for child in (2 * index + 1, 2 * index + 2):
+            if child < len(heap):
+                heapq.heappush(frontier, (heap[child], child))
+
+
+def rebuild_statement():
+    return db.select(Task.id, Task.limit_date, Task.scheduled_start_date, Task.status) \
+        .where(Task.active_filter()).order_by(Task.limit_date.asc(), Task.display_order.asc())
+
+
+class DeadlineScheduler:
+    """
+    Heaps of the active tasks' deadlines and scheduled starts of one board,
+    kept current by the board's change feed (see the module docstring).
+    """
+
+    def __init__(self, app, board, on_stop=None):
+        self.app = app
+        self.board = board
+        self.on_stop = on_stop # Called with the scheduler once it has stopped
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._tasks = {} # task_id -> (limit_date, scheduled_start_date, status, version)
+        self._deadlines = [] # (limit_date, task_id, version)
+        self._starts = [] # (scheduled_start_date, task_id, version), "todo" tasks only
+        self._alarms = [] # (limit_date, task_id) of deadlines not yet announced
+        self._versions = itertools.count(1)
+        self._thread = None
+
+    def feed_started(self):
+        """
+        Builds the heaps (called by the change feed, in an application
+        context, right after it read the head of the log) and starts the
+        timer thread.
+        """
+        self.rebuild()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'deadline-scheduler-{self.board}', daemon=True)
+            self._thread.start()
+
+    def feed_stopped(self):
+        """
+        The feed retired: stops the timer thread and frees the heaps.
+        """
+        with self._condition:
+            self._stopped = True
+            self._tasks = {}
+            self._deadlines, self._starts, self._alarms = [], [], []
+            self._condition.notify()
+        if self.on_stop is not None:
+            self.on_stop(self)
+
+    def rebuild(self):
+        """
+        Reloads every active task with one query, a walk of the partial index
+        ix_tasks_active_limit_date (no scan of the archive or of finished
+        tasks).
+        """
+        rows = db.session.execute(rebuild_statement()).all()
+        now = datetime.utcnow()
+        with self._condition:
+            self._tasks = {}
+            self._deadlines = []
+            for task_id, limit_date, start, status in rows:
+                version = next(self._versions)
+                self._tasks[task_id] = (limit_date, start, status, version)
+                self._deadlines.append((limit_date, task_id, version))
+            heapq.heapify(self._deadlines) # Nearly sorted already: ties on limit_date are not in ID order
+            self._rebuild_secondary(now)
+            self._condition.notify()
+
+    def _rebuild_secondary(self, now):
+        self._starts = [(start, task_id, version) for task_id, (_, start, status, version) in self._tasks.items()
+                        if status == 'todo' and start is not None]
+        heapq.heapify(self._starts)
+        self._alarms = [(limit_date, task_id) for task_id, (limit_date, *_) in self._tasks.items() if limit_date > now]
+        heapq.heapify(self._alarms)
+
+    def _compact(self, now):
+        """
+        Drops the outdated entries once the heaps hold several times more
+        entries than there are tasks.
+        """
+        if len(self._deadlines) + len(self._starts) + len(self._alarms) <= 3 * len(self._tasks) + 1000:
+            return
+        self._deadlines = sorted((limit_date, task_id, version)
+                                 for task_id, (limit_date, _, _, version) in self._tasks.items())
+        self._rebuild_secondary(now)
+
+    def feed_events(self, events):
+        """
+        Applies a batch of change feed events: pushes the tasks whose dates
+        or status changed and forgets the ones that are no longer active.
+        """
+        if any(event['action'] == 'import' for event in events):
+            # An import entry does not say which tasks were added
+            self.rebuild()
+            return
+        now = datetime.utcnow()
+        with self._condition:
+            earliest = self._alarms[0][0] if self._alarms else None
+            for event in events:
+                self._apply(event['task_id'], event['task'], now)
+            self._compact(now)
+            if self._alarms and (earliest is None or self._alarms[0][0] < earliest):
+                self._condition.notify() # The timer thread sleeps until a later deadline
+
+    def _apply(self, task_id, task, now):
+        current = self._tasks.get(task_id)
+        if task is None or task['status'] not in ACTIVE_STATUSES:
+            self._tasks.pop(task_id, None)
+            return
+        limit_date = _as_datetime(task['limit_date'])
+        start = _as_datetime(task['scheduled_start_date'])
+        if current is not None and current[:3] == (limit_date, start, task['status']):
+            return
+        version = next(self._versions)
+        self._tasks[task_id] = (limit_date, start, task['status'], version)
+        heapq.heappush(self._deadlines, (limit_date, task_id, version))
+        if task['status'] == 'todo' and start is not None:
+            heapq.heappush(self._starts, (start, task_id, version))
+        if limit_date > now and (current is None or current[0] != limit_date):
+            heapq.heappush(self._alarms, (limit_date, task_id))
+
+    def _is_current(self, entry):
+        task = self._tasks.get(entry[1])
+        return task is not None and task[3] == entry[2]
+
+    def due(self, now, horizon, limit):
+        """
+        Returns (overdue, due_soon, starting_soon, truncated): lists of task
+        IDs with limit_date < now, now <= limit_date <= horizon, and "todo"
+        tasks with scheduled_start_date <= horizon, each ordered by that date
+        and cut at `limit` IDs in total.
+        """
+        with self._condition:
+            deadlines = list(itertools.islice(_walk(self._deadlines, horizon, self._is_current), limit + 1))
+            starts = list(itertools.islice(_walk(self._starts, horizon, self._is_current),
+                                           max(0, limit + 1 - len(deadlines))))
+        truncated = len(deadlines) + len(starts) > limit
+        deadlines, starts = deadlines[:limit], starts[:max(0, limit - len(deadlines))]
+        overdue = [task_id for limit_date, task_id, _ in deadlines if limit_date < now]
+        due_soon = [task_id for limit_date, task_id, _ in deadlines if limit_date >= now]
+        return overdue, due_soon, [task_id for _, task_id, _ in starts], truncated
+
+    def _pop_passed(self, now):
+        passed = []
+        while self._alarms and self._alarms[0][0] <= now:
+            limit_date, task_id = heapq.heappop(self._alarms)
+            task = self._tasks.get(task_id)
+            # Skip deadlines that were moved or tasks that are no longer active
+            if task is not None and task[0] == limit_date and task_id not in passed:
+                passed.append(task_id)
+        return passed
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                now = datetime.utcnow()
+                passed = self._pop_passed(now)
+                if not passed:
+                    timeout = MAX_SLEEP_SECONDS
+                    if self._alarms:
+                        timeout = min(timeout, max(0.0, (self._alarms[0][0] - now).total_seconds()))
+                    self._condition.wait(timeout)
+                    continue
+            self._announce(passed)
+
+    def _announce(self, task_ids):
+        """
+        Appends one 'overdue' change log entry per task; the change feed
+        delivers them like any other change.
+        """
+        with board_context(self.app, self.board):
+            try:
+                record_changes(db.session, [(task_id, 'overdue') for task_id in task_ids])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('Could not record overdue tasks %s', task_ids)
+            finally:
+                db.session.remove()
+
+
+class DeadlineSchedulers:
+    """
+    The DeadlineScheduler of each board, attached to the board's change feed
+    when the feed is created.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.feeds = None
+        self._schedulers = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, feeds):
+        self.app = app
+        self.feeds = feeds
+        feeds.add_listener_factory(self._create)
+
+    def _create(self, board):
+        scheduler = DeadlineScheduler(self.app, board, on_stop=self._forget)
+        with self._lock:
+            self._schedulers[board] = scheduler
+        return scheduler
+
+    def _forget(self, scheduler):
+        with self._lock:
+            if self._schedulers.get(scheduler.board) is scheduler:
+                del self._schedulers[scheduler.board]
+
+    def get(self, board=None):
+        """
+        The scheduler of a board (default: the current one) and its feed;
+        start the feed to build the heaps.
+        """
+        feed = self.feeds.get(board or current_board())
+        return self._schedulers[feed.board], feed
+
+
+deadline_schedulers = DeadlineSchedulers()
@@ -0,0 +1,159 @@
+# group_commit.py
+
+"""
+Optional group commit for the single-task lifecycle routes (GROUP_COMMIT=true).
+
+By default every start/pause/end/update/delete/restore request commits its
+own transaction, and SQLite's single writer serializes them one commit (and,
+depending on the journal settings, one fsync) at a time. In group-commit mode
+the routes hand their write to one writer thread instead. The writer takes
+everything queued at that moment, waits up to GROUP_COMMIT_WINDOW_MS for
+more, applies the writes in arrival order in one transaction and commits
+once. Each request blocks until its batch has committed, so its response,
+and every read made after it, sees the write.
+
+Rejected writes (validation errors, unknown task) are answered without
+writing anything and do not affect the rest of the batch. If a write fails
+unexpectedly, or the commit fails, the batch is rolled back and replayed
+one write per transaction, so only the failing request gets the error.
+
+Each board has its own queue and writer thread: boards are separate
+databases, so their batches commit independently. The thread of a board
+other than the default one exits after BOARD_IDLE_SECONDS without writes.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from boards import BOARD_IDLE_SECONDS, DEFAULT_BOARD, board_context, current_board
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+def _env_number(name, default, convert=int):
+    value = os.environ.get(name)
+    return convert(value) if value else default
+
+
+class GroupCommitWriter:
+    """
+    One writer thread per board applying queued writes in batches.
+    apply(*args) (set by init_app) performs one write in the current
+    transaction without committing and returns its result.
+    """
+
+    def __init__(self, enabled=False, window=0.001, max_batch=100, idle_seconds=BOARD_IDLE_SECONDS):
+        self.enabled = enabled
+        self.window = window # Seconds to wait for more writes once one has arrived
+        self.max_batch = max_batch
+        self.idle_seconds = idle_seconds # Boards other than the default one: thread exits after this long idle
+        self.app = None
+        self.apply = None
+        self._queues = {} # board -> queue of its writer thread
+        self._lock = threading.Lock()
+
+    def init_app(self, app, apply):
+        self.app = app
+        self.apply = apply
+
+    def submit(self, *args):
+        """
+        Queues a write for the current board, starting the board's writer
+        thread if needed, and blocks until the batch containing it has
+        committed. Returns apply's result, or raises the exception apply raised.
+        """
+        board = current_board()
+        future = Future()
+        # Under the lock: a thread only exits while its queue is empty
+        with self._lock:
+            writes = self._queues.get(board)
+            if writes is None:
+                writes = self._queues[board] = queue.Queue()
+                threading.Thread(target=self._run, args=(board, writes), name=f'group-commit-{board}',
+                                 daemon=True).start()
+            writes.put((args, future))
+        return future.result()
+
+    def _next(self, board, writes):
+        """
+        Waits for the first write of a batch. Returns None once the thread
+        of a board other than the default one should exit.
+        """
+        if board == DEFAULT_BOARD:
+            return writes.get()
+        while True:
+            try:
+                return writes.get(timeout=self.idle_seconds)
+            except queue.Empty:
+                with self._lock:
+                    if writes.empty():
+                        del self._queues[board]
+                        return None
+
+    def _collect(self, first, writes):
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(writes.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(writes.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, board, writes):
+        while True:
+            first = self._next(board, writes)
+            if first is None:
+                return
+            batch = self._collect(first, writes)
+            with board_context(self.app, board):
+                try:
+                    self._write(batch)
+                except Exception as e: # Never leave a request waiting
+                    logger.exception('Group commit failed')
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                finally:
+                    db.session.remove()
+
+    def _write(self, batch):
+        try:
+            results = [self.apply(*args) for args, _ in batch]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if len(batch) == 1:
+                raise
+            # Find the failing write: replay the batch one write per transaction
+            for args, future in batch:
+                try:
+                    result = self.apply(*args)
+                    db.session.commit()
+                    future.set_result(result)
+                except Exception as e:
+                    db.session.rollback()
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+group_writer = GroupCommitWriter(
+    enabled=os.environ.get('GROUP_COMMIT', '').lower() in ('1', 'true', 'yes', 'on'),
+    window=_env_number('GROUP_COMMIT_WINDOW_MS', 1.0, float) / 1000,
+    max_batch=_env_number('GROUP_COMMIT_MAX_BATCH', 100),
+)
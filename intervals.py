@@ -0,0 +1,168 @@
+# intervals.py
+
+"""
+Time-range (overlap) queries over the scheduled and actual task periods.
+
+A B-tree index can bound only one end of an interval, so "which tasks
+overlap this week" would still scan every task that started before the end
+of the week. On SQLite each kind of period therefore gets an R*Tree virtual
+table (tasks_scheduled_rtree, tasks_actual_rtree) holding one 1-dimensional
+box (lo, hi) per task, as seconds since the epoch. Triggers on tasks keep the
+boxes in sync with every write, whichever route (or bulk statement) made it.
+
+An R*Tree stores 32-bit floats, rounded outwards, so its answer is a small
+superset of the overlapping tasks; the query re-checks the exact datetime
+columns on those candidates only. Actual periods that are still running
+(actual_end_date is NULL) extend to OPEN_END.
+
+The archive (tasks_archive) has R*Trees of its own; /tasks/range queries
+both tiers.
+
+Other databases (or SQLite builds without R*Tree) run the same exact
+conditions directly on the task tables.
+"""
+
+import weakref
+from datetime import datetime
+
+from sqlalchemy import inspect
+
+from models import db, Task, TaskArchive
+from serializers import SUMMARY_FIELDS, select_fields
+
+# Period columns of each kind of range query
+RANGE_KINDS = {
+    'scheduled': ('scheduled_start_date', 'scheduled_end_date'),
+    'actual': ('actual_start_date', 'actual_end_date'),
+}
+EPOCH = datetime(1970, 1, 1)
+OPEN_END = 1e12 # Upper bound of a period without an end (year ~33658)
+
+
+def rtree_table_name(content_table, kind):
+    return f'{content_table}_{kind}_rtree'
+
+
+def _epoch_sql(column):
+    # Seconds since the epoch of a stored datetime (NULL if unset or unparsable)
+    return f'(julianday({column}) - 2440587.5) * 86400.0'
+
+
+def _box_select(rtree, kind, source, prefix):
+    """
+    INSERT ... SELECT writing the box of each row of `source` into the R*Tree.
+    """
+    start, end = RANGE_KINDS[kind]
+    end_sql = _epoch_sql(f'{prefix}{end}')
+    if kind == 'actual':
+        end_sql = f'coalesce({end_sql}, {OPEN_END})'
+    from_sql = f' FROM {source}' if source else ''
+    # min/max: an R*Tree rejects boxes with lo > hi, which must not make the
+    # write on the tasks table fail
+    return (f'INSERT INTO {rtree}(id, lo, hi) SELECT row_id, min(s, e), max(s, e) '
+            f'FROM (SELECT {prefix}id AS row_id, {_epoch_sql(f"{prefix}{start}")} AS s, {end_sql} AS e{from_sql}) '
+            f'WHERE s IS NOT NULL AND e IS NOT NULL')
+
+
+def rtree_ddl(content_table, kind):
+    """
+    CREATE statements for the R*Tree of one kind of period of content_table
+    and the triggers keeping it in sync.
+    """
+    rtree = rtree_table_name(content_table, kind)
+    start, end = RANGE_KINDS[kind]
+    insert_new = _box_select(rtree, kind, None, 'new.')
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, lo, hi)',
+        f'CREATE TRIGGER IF NOT EXISTS {rtree}_ai AFTER INSERT ON {content_table} BEGIN '
+        f'{insert_new}; END',
+        f'CREATE TRIGGER IF NOT EXISTS {rtree}_ad AFTER DELETE ON {content_table} BEGIN '
+        f'DELETE FROM {rtree} WHERE id = old.id; END',
+        # Other edits (status, name, ...) do not touch the index
+        f'CREATE TRIGGER IF NOT EXISTS {rtree}_au AFTER UPDATE OF {start}, {end} ON {content_table} BEGIN '
+        f'DELETE FROM {rtree} WHERE id = old.id; {insert_new}; END',
+    ]
+
+
+def rtree_available(connection):
+    """
+    True if the connection is SQLite and was built with R*Tree.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    options = connection.exec_driver_sql('PRAGMA compile_options').scalars().all()
+    return 'ENABLE_RTREE' in options
+
+
+def create_range_indexes(engine, content_table=Task.__tablename__):
+    """
+    Creates the missing R*Trees and their triggers and fills them from the
+    existing rows. Returns the names of the tables created.
+    """
+    created = []
+    with engine.begin() as conn:
+        if not rtree_available(conn):
+            return created
+        for kind in RANGE_KINDS:
+            rtree = rtree_table_name(content_table, kind)
+            if inspect(conn).has_table(rtree):
+                continue
+            for statement in rtree_ddl(content_table, kind):
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(_box_select(rtree, kind, content_table, '')) # Existing rows
+            created.append(rtree)
+    return created
+
+
+# Engines known to have the R*Trees (checked once per engine)
+_rtree_engines = weakref.WeakSet()
+
+
+def range_index_available(session):
+    """
+    True if /tasks/range can use the R*Trees in this database.
+    """
+    engine = session.get_bind()
+    if engine in _rtree_engines:
+        return True
+    connection = session.connection()
+    if rtree_available(connection) and all(
+            inspect(connection).has_table(rtree_table_name(model.__tablename__, kind))
+            for model in (Task, TaskArchive) for kind in RANGE_KINDS):
+        _rtree_engines.add(engine)
+        return True
+    return False
+
+
+def _epoch(value):
+    return (value - EPOCH).total_seconds()
+
+
+def overlap_statement(start, end, kind, statuses=None, use_rtree=True, model=Task):
+    """
+    SELECT of the summary projection of the tasks of one tier (Task or
+    TaskArchive) whose `kind` period overlaps [start, end] (both inclusive),
+    ordered by the period start.
+    """
+    start_column, end_column = (getattr(model, column) for column in RANGE_KINDS[kind])
+    statement = select_fields(SUMMARY_FIELDS, model)
+    if use_rtree:
+        rtree = db.table(rtree_table_name(model.__tablename__, kind), db.column('id'), db.column('lo'), db.column('hi'))
+        candidates = db.select(rtree.c.id).where(rtree.c.lo <= _epoch(end), rtree.c.hi >= _epoch(start))
+        statement = statement.where(model.id.in_(candidates))
+
+    # Exact check (the R*Tree boxes are rounded outwards)
+    statement = statement.where(start_column.is_not(None), start_column <= end)
+    if kind == 'actual':
+        statement = statement.where(db.or_(end_column.is_(None), end_column >= start))
+    else:
+        statement = statement.where(end_column >= start)
+    if statuses:
+        status = model.status
+        if use_rtree:
+            # `status || ''` cannot use the (status, ...) indexes: without ANALYZE
+            # statistics SQLite would otherwise walk every task of the status
+            # instead of starting from the (much narrower) window.
+            status = status.concat('')
+        statement = statement.where(status.in_(statuses))
+    return statement.order_by(start_column, model.id)
@@ -0,0 +1,323 @@
+# metrics.py
+
+"""
+Opt-in request and query instrumentation (METRICS_ENABLED=true).
+
+For every request the time spent in SQL (SQLAlchemy engine events), the
+number of statements, the rows turned into dicts and the time spent encoding
+JSON (hooks in serializers.py) are collected in a thread-local record, so a
+slow response can be attributed to the database, to Python-side row handling
+or to encoding. Per endpoint they are aggregated into Prometheus counters and
+histograms served at /metrics, and each response carries a Server-Timing
+header with its own breakdown (shown by the browser's developer tools).
+
+Profiling: with METRICS_PROFILING=true, a request with ?_profile=1 (or the
+header X-Profile: 1) runs under cProfile and returns the report instead of
+its normal body. METRICS_PROFILE_SAMPLE=0.01 profiles a random 1% of the
+requests and logs their reports.
+
+When METRICS_ENABLED is not set nothing is registered: the only cost left is
+one `is None` check in the serializers.
+
+Metrics are per process; with several gunicorn workers each one reports its
+own (the Dockerfile runs a single worker).
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+
+from flask import request
+from sqlalchemy import event
+
+import serializers
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'task_manager'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+PROFILE_LINES = 40 # Functions listed in a profile report
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def metrics_enabled():
+    return _env_flag('METRICS_ENABLED')
+
+
+class RequestStats:
+    """
+    What one request did; filled in by the engine events and serializer hooks
+    running in the request's thread.
+    """
+    __slots__ = ('endpoint', 'method', 'status', 'started', 'duration',
+                 'sql_count', 'sql_time', 'rows', 'encode_time', 'profiler', 'profile_mode', 'streamed')
+
+    def __init__(self, endpoint, method):
+        self.endpoint = endpoint
+        self.method = method
+        self.status = 500 # Until a response is produced
+        self.started = time.perf_counter()
+        self.duration = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.encode_time = 0.0
+        self.profiler = None
+        self.profile_mode = None
+        self.streamed = False
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot: above every bucket (+Inf only)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Registry:
+    """
+    Counters and histograms keyed by label values, rendered in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {} # name -> (type, help, label names, {label values: value or Histogram})
+
+    def _series(self, kind, name, help_text, label_names):
+        entry = self.metrics.get(name)
+        if entry is None:
+            entry = self.metrics[name] = (kind, help_text, label_names, {})
+        return entry[3]
+
+    def inc(self, name, help_text, label_names, label_values, amount=1):
+        series = self._series('counter', name, help_text, label_names)
+        series[label_values] = series.get(label_values, 0) + amount
+
+    def observe(self, name, help_text, label_names, label_values, value, buckets):
+        series = self._series('histogram', name, help_text, label_names)
+        histogram = series.get(label_values)
+        if histogram is None:
+            histogram = series[label_values] = Histogram(buckets)
+        histogram.observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, label_names, series) in sorted(self.metrics.items()):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for label_values, value in sorted(series.items()):
+                    if kind == 'counter':
+                        lines.append(f'{name}{_labels(label_names, label_values)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ('+Inf',), value.counts):
+                        cumulative += count
+                        labels = _labels(label_names + ('le',), label_values + (bound,))
+                        lines.append(f'{name}_bucket{labels} {cumulative}')
+                    labels = _labels(label_names, label_values)
+                    lines.append(f'{name}_sum{labels} {value.sum}')
+                    lines.append(f'{name}_count{labels} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+_current = threading.local()
+
+ENDPOINT = ('endpoint',)
+REQUEST = ('endpoint', 'method')
+
+
+def _record_request(stats):
+    """
+    Adds a finished request to the registry (one lock per request).
+    """
+    labels = (stats.endpoint,)
+    with registry.lock:
+        registry.inc(f'{PREFIX}_requests_total', 'Requests handled.',
+                     ('endpoint', 'method', 'status'), (stats.endpoint, stats.method, str(stats.status)))
+        registry.observe(f'{PREFIX}_request_duration_seconds', 'Time until the response was ready (streams: until they started).',
+                         REQUEST, (stats.endpoint, stats.method), stats.duration, LATENCY_BUCKETS)
+        registry.observe(f'{PREFIX}_sql_statements_per_request', 'SQL statements executed per request.',
+                         ENDPOINT, labels, stats.sql_count, STATEMENT_BUCKETS)
+        registry.inc(f'{PREFIX}_sql_statements_total', 'SQL statements executed.', ENDPOINT, labels, stats.sql_count)
+        registry.inc(f'{PREFIX}_sql_duration_seconds_total', 'Time spent executing SQL.', ENDPOINT, labels, stats.sql_time)
+        registry.inc(f'{PREFIX}_rows_serialized_total', 'Rows converted to JSON objects.', ENDPOINT, labels, stats.rows)
+        registry.inc(f'{PREFIX}_json_encode_seconds_total', 'Time spent encoding JSON.', ENDPOINT, labels, stats.encode_time)
+
+
+def _record_response_bytes(endpoint, size):
+    with registry.lock:
+        registry.inc(f'{PREFIX}_response_bytes_total', 'Response body bytes sent.', ENDPOINT, (endpoint,), size)
+
+
+def _streamed_body(body, stats):
+    """
+    Passes a streamed body through. The queries and rows of the stream are
+    counted for its request, which is recorded, with the bytes sent, when the
+    stream ends or is closed.
+    """
+    size = 0
+    _current.stats = stats # The stream runs after the request's teardown
+    try:
+        for chunk in body:
+            size += len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            yield chunk
+            _current.stats = stats
+    finally:
+        _current.stats = None
+        close = getattr(body, 'close', None)
+        if close is not None:
+            close()
+        _record_request(stats)
+        _record_response_bytes(stats.endpoint, size)
+
+
+def _profile_report(stats):
+    stats.profiler.disable()
+    output = io.StringIO()
+    report = pstats.Stats(stats.profiler, stream=output)
+    report.sort_stats('cumulative').print_stats(PROFILE_LINES)
+    header = (f'{stats.method} {request.full_path} -> {stats.status}: {stats.duration * 1000:.1f} ms, '
+              f'{stats.sql_count} SQL statements in {stats.sql_time * 1000:.1f} ms, {stats.rows} rows serialized, '
+              f'JSON encoding {stats.encode_time * 1000:.1f} ms\n')
+    return header + output.getvalue()
+
+
+def instrument_engine(engine):
+    """
+    Counts the statements of an engine and the time spent in them.
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info['metrics_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('metrics_started', time.perf_counter())
+        stats = getattr(_current, 'stats', None)
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_time += elapsed
+            return
+        # Outside requests: the change feed thread, CLI commands
+        with registry.lock:
+            registry.inc(f'{PREFIX}_sql_statements_total', 'SQL statements executed.', ENDPOINT, ('background',))
+            registry.inc(f'{PREFIX}_sql_duration_seconds_total', 'Time spent executing SQL.', ENDPOINT, ('background',), elapsed)
+
+
+def init_metrics(app, engine):
+    """
+    Registers the request hooks, the engine events and the /metrics endpoint.
+    """
+    profiling = _env_flag('METRICS_PROFILING')
+    sample_rate = float(os.environ.get('METRICS_PROFILE_SAMPLE') or 0)
+    instrument_engine(engine)
+
+    @app.before_request
+    def start_request_stats():
+        # The URL rule, not the path, so task IDs do not create new series
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        stats = _current.stats = RequestStats(endpoint, request.method)
+        if profiling and (request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'):
+            stats.profile_mode = 'respond'
+        elif sample_rate and random.random() < sample_rate:
+            stats.profile_mode = 'log'
+        if stats.profile_mode:
+            stats.profiler = cProfile.Profile()
+            stats.profiler.enable()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = getattr(_current, 'stats', None)
+        if stats is None:
+            return response
+        stats.status = response.status_code
+        stats.duration = time.perf_counter() - stats.started
+
+        if stats.profiler is not None:
+            report = _profile_report(stats)
+            stats.profiler = None
+            if stats.profile_mode == 'respond':
+                return app.response_class(report, mimetype='text/plain')
+            logger.info('Sampled profile: %s', report)
+
+        response.headers['Server-Timing'] = (
+            f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.sql_count} statements", '
+            f'encode;dur={stats.encode_time * 1000:.2f}, '
+            f'total;dur={stats.duration * 1000:.2f}'
+        )
+        if response.is_streamed:
+            stats.streamed = True
+            response.response = _streamed_body(response.response, stats)
+        else:
+            _record_response_bytes(stats.endpoint, response.calculate_content_length() or 0)
+        return response
+
+    @app.teardown_request
+    def record_request_stats(exc):
+        stats = getattr(_current, 'stats', None)
+        if stats is None:
+            return
+        _current.stats = None
+        if stats.streamed:
+            return # Recorded when the stream ends
+        if stats.profiler is not None: # Unhandled exception: after_request did not run
+            stats.profiler.disable()
+        if stats.duration is None:
+            stats.duration = time.perf_counter() - stats.started
+        _record_request(stats)
+
+    def metrics():
+        return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    serializers.observer = _ThreadObserver
+
+
+class _ThreadObserver:
+    """
+    serializers.observer: forwards to the current thread's request record.
+    Rows and encoding outside a request (e.g. the change feed) are ignored.
+    """
+
+    @staticmethod
+    def rows_serialized(count):
+        stats = getattr(_current, 'stats', None)
+        if stats is not None:
+            stats.rows += count
+
+    @staticmethod
+    def encoded(seconds):
+        stats = getattr(_current, 'stats', None)
+        if stats is not None:
+            stats.encode_time += seconds
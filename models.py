@@ -1,15 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
+from boards import BoardSession
+
 # Initialize the SQLAlchemy database instance.
 # This instance will be used to define models and interact with the database.
-db = SQLAlchemy()
+# Its sessions send each statement to the current board's database (boards.py).
+db = SQLAlchemy(session_options={'class_': BoardSession})
+
+# Statuses shown in the active task list ("todo" and "doing").
+# The partial indexes on Task and the listing queries in app.py are both built
+# from this tuple; SQLite only uses a partial index when the query repeats the
+# index's WHERE clause literally, so keep them in sync through active_filter().
+ACTIVE_STATUSES = ('todo', 'doing')
+ACTIVE_STATUS_SQL = "status IN (%s)" % ", ".join(f"'{status}'" for status in ACTIVE_STATUSES)
 
-class Task(db.Model):
+class TaskColumns:
     """
-    Represents a single task in the task management application.
+    Columns of a task, shared by the live tasks table (Task) and the archive
+    of old completed/deleted tasks (TaskArchive).
     """
-    __tablename__ = 'tasks'  # Explicitly naming the table (optional but good practice)
 
     # Core Task Information
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)  # Unique identifier for the task
@@ -36,8 +46,111 @@ class Task(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False) # Timestamp of task creation
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False) # Timestamp of last update
 
+
+class Task(TaskColumns, db.Model):
+    """
+    Represents a single task in the task management application.
+    """
+    __tablename__ = 'tasks'  # Explicitly naming the table (optional but good practice)
+
+    # Indexes matching the filter and sort order of each listing endpoint.
+    # Active tasks: partial indexes that only contain "todo"/"doing" rows, so
+    #   /get_tasks walks the index in order without a temp B-tree sort.
+    # Archives: (status, sort column); the rowid (id) is implicitly the last
+    #   key column, which also covers the "id" tie-breaker.
+    __table_args__ = (
+        db.Index('ix_tasks_active_display_order', 'display_order', 'limit_date',
+                 sqlite_where=db.text(ACTIVE_STATUS_SQL), postgresql_where=db.text(ACTIVE_STATUS_SQL)),
+        db.Index('ix_tasks_active_limit_date', 'limit_date', 'display_order',
+                 sqlite_where=db.text(ACTIVE_STATUS_SQL), postgresql_where=db.text(ACTIVE_STATUS_SQL)),
+        db.Index('ix_tasks_status_actual_end_date', 'status', 'actual_end_date'),
+        db.Index('ix_tasks_status_updated_at', 'status', 'updated_at'),
+    )
+
+    @classmethod
+    def active_filter(cls):
+        """
+        Filter expression for active tasks, rendered with literal values
+        (status IN ('todo', 'doing')) so it matches the partial indexes above.
+        """
+        return cls.status.in_(db.bindparam('active_statuses', list(ACTIVE_STATUSES),
+                                           expanding=True, literal_execute=True))
+
     def __repr__(self):
         """
         String representation of the Task object, useful for debugging.
         """
         return f'<Task {self.id}: {self.name} ({self.status})>'
+
+
+class TaskArchive(TaskColumns, db.Model):
+    """
+    Cold tier: completed and deleted tasks that ended long ago, moved out of
+    the tasks table by `flask archive-tasks` (see archive.py) so the pages
+    and indexes read by the active list stay small. Rows keep their task ID.
+    Reads of single tasks, the archive listings, search and range queries
+    cover both tables; writing to an archived task moves it back first.
+    """
+    __tablename__ = 'tasks_archive'
+
+    # Only the archive listings read this table by range
+    __table_args__ = (
+        db.Index('ix_tasks_archive_status_actual_end_date', 'status', 'actual_end_date'),
+        db.Index('ix_tasks_archive_status_updated_at', 'status', 'updated_at'),
+    )
+
+    def __repr__(self):
+        return f'<TaskArchive {self.id}: {self.name} ({self.status})>'
+
+
+class TaskChange(db.Model):
+    """
+    One entry of the append-only change log: task `task_id` was changed by
+    `action` ('create', 'update', 'start', 'pause', 'end', 'delete',
+    'restore' or 'reorder'). Written in the same transaction as the change.
+    An 'overdue' entry records that the task's deadline passed (deadlines.py).
+    An 'import' entry (task_id 0) stands for a whole chunk of imported tasks.
+    `seq` only ever grows (AUTOINCREMENT never reuses values, even after old
+    entries are pruned), so clients use it as their position in the log.
+    """
+    __tablename__ = 'task_changes'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    task_id = db.Column(db.Integer, nullable=False) # No foreign key: the log outlives the row it describes
+    action = db.Column(db.String(20), nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<TaskChange {self.seq}: {self.action} task {self.task_id}>'
+
+
+class TaskDailyStats(db.Model):
+    """
+    Aggregates over the completed tasks, one row per completion day (UTC,
+    from actual_end_date) and is_not_main flag. Kept up to date incrementally
+    by the routes that change tasks (see stats.py), so /stats never has to
+    scan the task history. Durations are stored as sums in seconds.
+    """
+    __tablename__ = 'task_daily_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    is_not_main = db.Column(db.Boolean, primary_key=True)
+
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    # Cycle time: actual_start_date -> actual_end_date
+    cycle_time_sum = db.Column(db.Float, nullable=False, default=0)
+    cycle_time_count = db.Column(db.Integer, nullable=False, default=0)
+    # Lead time: created_at -> actual_end_date
+    lead_time_sum = db.Column(db.Float, nullable=False, default=0)
+    lead_time_count = db.Column(db.Integer, nullable=False, default=0)
+    # Slip against the deadline: actual_end_date - limit_date (negative = early)
+    limit_slip_sum = db.Column(db.Float, nullable=False, default=0)
+    late_count = db.Column(db.Integer, nullable=False, default=0)
+    # Slip against the plan: actual_end_date - scheduled_end_date
+    scheduled_slip_sum = db.Column(db.Float, nullable=False, default=0)
+    scheduled_count = db.Column(db.Integer, nullable=False, default=0)
+    scheduled_late_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TaskDailyStats {self.day} is_not_main={self.is_not_main}: {self.completed_count} completed>'
@@ -0,0 +1,40 @@
+# schema.py
+
+from sqlalchemy import inspect
+
+from intervals import create_range_indexes
+from models import db, Task, TaskArchive
+from search import SEARCH_TIERS, create_search_index
+from stats import rebuild_stats, stats_need_backfill
+
+
+def upgrade_schema(engine=None):
+    """
+    Brings an existing database up to date with the definitions in models.py.
+
+    db.create_all() only creates missing tables; it never touches a table that
+    already exists, so tasks.db files created by older versions would never get
+    the listing indexes. Every step here is idempotent and safe to run on each
+    startup. Returns the names of the objects that were created.
+    """
+    engine = engine or db.engine
+    created = []
+    for table in (Task.__table__, TaskArchive.__table__):
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            with engine.begin() as conn:
+                if not inspect(conn).has_index(table.name, index.name):
+                    index.create(bind=conn)
+                    created.append(index.name)
+
+    for content_table, fts_table in SEARCH_TIERS:
+        # Full-text search index (SQLite with FTS5 only), filled from the existing rows
+        if create_search_index(engine, content_table, fts_table):
+            created.append(fts_table)
+        # Interval indexes for /tasks/range (SQLite with R*Tree only)
+        created.extend(create_range_indexes(engine, content_table))
+
+    # Databases from before task_daily_stats: compute the aggregates once
+    if stats_need_backfill():
+        rebuild_stats()
+        created.append('task_daily_stats (backfilled)')
+    return created
@@ -0,0 +1,178 @@
+# search.py
+
+"""
+Full-text search over task names and details.
+
+On SQLite the tasks are indexed by an external-content FTS5 table
+(tasks_fts) that stores only the index and reads the text from the tasks
+table. Triggers on tasks keep it in sync with every INSERT, DELETE and
+UPDATE of name/detail, whichever route (or bulk statement) made the change.
+
+The trigram tokenizer is used because task names are often Japanese, which
+has no spaces between words: every term then matches as a substring, in any
+language. A trigram needs at least three characters, so shorter terms are
+matched with LIKE against the tasks table instead. When all terms are short
+there is nothing to rank by and results come newest first.
+
+Archived tasks (tasks_archive) have their own index, tasks_archive_fts,
+and every search covers both tiers. bm25 statistics are per index, so scores
+of hot and archived tasks are close to, but not exactly, comparable.
+
+Other databases (or SQLite builds without FTS5) fall back to LIKE matching
+for every term.
+"""
+
+import weakref
+
+from sqlalchemy import inspect
+
+from models import db, Task, TaskArchive
+from serializers import SUMMARY_FIELDS
+
+FTS_TABLE = 'tasks_fts'
+ARCHIVE_FTS_TABLE = 'tasks_archive_fts'
+# (content table, FTS table) of each tier
+SEARCH_TIERS = (
+    (Task.__tablename__, FTS_TABLE),
+    (TaskArchive.__tablename__, ARCHIVE_FTS_TABLE),
+)
+# bm25 column weights: a hit in the name counts more than one in the detail
+NAME_WEIGHT = 10.0
+DETAIL_WEIGHT = 1.0
+TRIGRAM_LENGTH = 3
+
+
+def fts_ddl(content_table, fts_table):
+    """
+    CREATE statements for an FTS5 index over content_table(name, detail)
+    and the triggers keeping it in sync.
+    """
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"name, detail, content='{content_table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, name, detail) VALUES (new.id, new.name, new.detail); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, name, detail) VALUES ('delete', old.id, old.name, old.detail); END",
+        # Status changes do not touch name/detail and leave the index alone
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF name, detail ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, name, detail) VALUES ('delete', old.id, old.name, old.detail); "
+        f"INSERT INTO {fts_table}(rowid, name, detail) VALUES (new.id, new.name, new.detail); END",
+    ]
+
+
+def fts_available(connection):
+    """
+    True if the connection is SQLite and was built with FTS5.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    options = connection.exec_driver_sql('PRAGMA compile_options').scalars().all()
+    return 'ENABLE_FTS5' in options
+
+
+def create_search_index(engine, content_table=Task.__tablename__, fts_table=FTS_TABLE):
+    """
+    Creates the FTS index and its triggers if missing and fills the index from
+    the existing rows. Returns True if the index was created.
+    """
+    with engine.begin() as conn:
+        if not fts_available(conn):
+            return False
+        if inspect(conn).has_table(fts_table):
+            return False
+        for statement in fts_ddl(content_table, fts_table):
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+    return True
+
+
+def rebuild_search_index(engine, fts_table=FTS_TABLE):
+    """
+    Re-reads every row of the content table into the index and merges the
+    index segments (`flask rebuild-search`).
+    """
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+        conn.exec_driver_sql(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')")
+
+
+# Engines known to have the FTS index (checked once per engine)
+_fts_engines = weakref.WeakSet()
+
+
+def search_available(session):
+    """
+    True if /search can use the FTS indexes in this database.
+    """
+    engine = session.get_bind()
+    if engine in _fts_engines:
+        return True
+    connection = session.connection()
+    if fts_available(connection) and all(inspect(connection).has_table(fts) for _, fts in SEARCH_TIERS):
+        _fts_engines.add(engine)
+        return True
+    return False
+
+
+def parse_terms(query):
+    """
+    Splits the user's query into terms (whitespace-separated, all required).
+    """
+    return [term for term in query.split() if term]
+
+
+def _fts_phrase(term):
+    # Quote each term so FTS5 operators and punctuation are matched literally
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _tier_sql(content_table, fts_table, ranked, conditions):
+    """
+    SELECT of the matching rows of one tier (content table aliased as t).
+    """
+    columns = ', '.join(f't.{field}' for field in SUMMARY_FIELDS)
+    if ranked:
+        where = ' AND '.join([f'{fts_table} MATCH :match'] + conditions)
+        return (f'SELECT {columns}, -bm25({fts_table}, {NAME_WEIGHT}, {DETAIL_WEIGHT}) AS score '
+                f'FROM {fts_table} JOIN {content_table} AS t ON t.id = {fts_table}.rowid WHERE {where}')
+    where = ' AND '.join(conditions) or '1 = 1'
+    return f'SELECT {columns}, NULL AS score FROM {content_table} AS t WHERE {where}'
+
+
+def search_tasks(terms, statuses=None, limit=50, offset=0, use_fts=True):
+    """
+    Returns (rows, ranked) for the tasks of both tiers matching every term:
+    up to limit + 1 row mappings (SUMMARY_FIELDS plus 'score') starting at
+    offset. Ranked results are ordered by bm25 relevance (best first), the
+    others by id (newest first).
+    """
+    long_terms = [t for t in terms if len(t) >= TRIGRAM_LENGTH] if use_fts else []
+    short_terms = [t for t in terms if t not in long_terms]
+    params = {'limit': limit + 1, 'offset': offset}
+    conditions = []
+
+    for i, term in enumerate(short_terms):
+        params[f'like_{i}'] = _like_pattern(term)
+        conditions.append(f"(t.name LIKE :like_{i} ESCAPE '\\' OR t.detail LIKE :like_{i} ESCAPE '\\')")
+    if statuses:
+        conditions.append('t.status IN :statuses')
+        params['statuses'] = list(statuses)
+    ranked = bool(long_terms)
+    if ranked:
+        params['match'] = ' '.join(_fts_phrase(term) for term in long_terms)
+
+    sql = ' UNION ALL '.join(_tier_sql(content_table, fts_table, ranked, conditions)
+                             for content_table, fts_table in SEARCH_TIERS)
+    order = 'score DESC, id DESC' if ranked else 'id DESC'
+    statement = db.text(f'{sql} ORDER BY {order} LIMIT :limit OFFSET :offset')
+    if statuses:
+        statement = statement.bindparams(db.bindparam('statuses', expanding=True))
+    statement = statement.columns(*(db.column(field, Task.__table__.c[field].type) for field in SUMMARY_FIELDS),
+                                  db.column('score', db.Float))
+    return db.session.execute(statement, params).all(), ranked
@@ -0,0 +1,111 @@
+# serializers.py
+
+"""
+Column-projected serialization of tasks for the JSON API.
+
+Listing endpoints select only the columns they return as plain row tuples
+(no ORM instances, no identity map) and turn them into dicts in one pass.
+JSON is encoded with orjson when it is installed, which also formats
+datetimes natively; otherwise the stdlib encoder is used and datetimes are
+converted to ISO strings first.
+"""
+
+import json
+import time
+
+from models import db, Task
+
+try:
+    import orjson
+except ImportError: # orjson is optional
+    orjson = None
+
+# Set by metrics.py when instrumentation is enabled: gets told how many rows
+# were converted (rows_serialized) and how long encoding took (encoded).
+observer = None
+
+# Every column returned by the single-task detail endpoint
+FULL_FIELDS = (
+    'id', 'name', 'detail', 'limit_date',
+    'scheduled_start_date', 'scheduled_end_date',
+    'actual_start_date', 'actual_end_date',
+    'is_not_main', 'status', 'display_order', 'delete_reason',
+    'created_at', 'updated_at',
+)
+# List views: everything except the unbounded 'detail' text
+SUMMARY_FIELDS = tuple(field for field in FULL_FIELDS if field != 'detail')
+
+DATETIME_FIELDS = frozenset((
+    'limit_date', 'scheduled_start_date', 'scheduled_end_date',
+    'actual_start_date', 'actual_end_date', 'created_at', 'updated_at',
+))
+
+
+def select_fields(fields=SUMMARY_FIELDS, model=Task):
+    """
+    Returns a SELECT of the given columns of Task (or TaskArchive), yielding
+    plain row tuples.
+    """
+    return db.select(*(getattr(model, field) for field in fields))
+
+
+def rows_to_dicts(rows, fields=SUMMARY_FIELDS):
+    """
+    Converts row tuples selected with select_fields(fields) into dicts.
+    Datetimes are left as-is when orjson will encode them; otherwise they are
+    converted to ISO 8601 strings column by column.
+    """
+    if orjson is not None:
+        output = [dict(zip(fields, row)) for row in rows]
+    else:
+        datetime_positions = [i for i, field in enumerate(fields) if field in DATETIME_FIELDS]
+        output = []
+        for row in rows:
+            values = list(row)
+            for i in datetime_positions:
+                if values[i] is not None:
+                    values[i] = values[i].isoformat()
+            output.append(dict(zip(fields, values)))
+    if observer is not None:
+        observer.rows_serialized(len(output))
+    return output
+
+
+def fetch_dicts(statement, fields=SUMMARY_FIELDS, session=None):
+    """
+    Executes a statement built from select_fields(fields) and returns the rows as dicts.
+    """
+    return rows_to_dicts((session or db.session).execute(statement), fields)
+
+
+def _default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _encode(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def dumps(obj):
+    """
+    Encodes obj as compact JSON bytes, using orjson when available.
+    """
+    if observer is None:
+        return _encode(obj)
+    started = time.perf_counter()
+    data = _encode(obj)
+    observer.encoded(time.perf_counter() - started)
+    return data
+
+
+def loads(data):
+    """
+    Decodes JSON text or bytes, using orjson when available.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
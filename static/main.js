@@ -23,6 +23,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const endTaskBtn = document.getElementById('end-task-btn');
     const sortByLimitBtn = document.getElementById('sort-by-limit-btn');
 
+    // Path of the board this page belongs to ('' for the default board, '/boards/<name>' otherwise)
+    const API_ROOT = document.body.dataset.root || '';
+
     // Gantt Chart Area
     const ganttTarget = document.getElementById('gantt-target');
 
@@ -44,10 +47,32 @@ document.addEventListener('DOMContentLoaded', function() {
     const completedTasksListArea = document.getElementById('completed-tasks-list');
     const deletedTasksListArea = document.getElementById('deleted-tasks-list');
 
+    // Bulk action buttons (multi-select)
+    const activeBulkActions = document.getElementById('active-bulk-actions');
+    const bulkCompleteBtn = document.getElementById('bulk-complete-btn');
+    const bulkDeleteBtn = document.getElementById('bulk-delete-btn');
+    const bulkRestoreCompletedBtn = document.getElementById('bulk-restore-completed-btn');
+    const bulkRestoreDeletedBtn = document.getElementById('bulk-restore-deleted-btn');
+
     // --- Global State Variables ---
     let activeTasks = [];     // 現在アクティブなタスクのデータを保持する配列
     let completedTasks = [];  // 完了したタスクのデータを保持する配列
     let deletedTasks = [];    // 削除したタスクのデータを保持する配列
+    // 完了・削除済みリストはページ単位で取得する (カーソル方式)
+    let completedNextCursor = null; // 次ページ取得用カーソル (null なら最終ページ)
+    let deletedNextCursor = null;
+    let isLoadingCompleted = false;
+    let isLoadingDeleted = false;
+    // 一括操作のために選択されているタスクID (リストごと)
+    const selectedTaskIds = { active: new Set(), completed: new Set(), deleted: new Set() };
+
+    // 変更フィード (/events, /changes) の状態
+    let currentSortBy = 'display_order'; // アクティブタスクの現在の並び順
+    let lastChangeSeq = null;            // 反映済みの最後の変更番号 (null なら未接続)
+    let changeStream = null;             // EventSource (SSE)
+    let changePollTimer = null;          // SSE が使えない場合のポーリング用タイマー
+    const CHANGE_POLL_INTERVAL_MS = 5000;
+    const dirtyLists = new Set();        // 次の描画で再描画するリスト
 
     let currentEditTaskDetails = null; // Stores the full details of the task being edited
     let sortableInstance = null; 
@@ -234,6 +259,40 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     // --- End Popup Management ---
 
+    // --- Multi-select ---
+    function createSelectCheckbox(listName, taskId) {
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.className = 'task-select-checkbox h-4 w-4 mr-2 flex-shrink-0 text-blue-600 border-gray-300 rounded';
+        checkbox.checked = selectedTaskIds[listName].has(String(taskId));
+        checkbox.addEventListener('click', (event) => event.stopPropagation()); // 詳細・編集ポップアップを開かない
+        checkbox.addEventListener('change', () => {
+            if (checkbox.checked) {
+                selectedTaskIds[listName].add(String(taskId));
+            } else {
+                selectedTaskIds[listName].delete(String(taskId));
+            }
+            updateBulkActionButtons();
+        });
+        return checkbox;
+    }
+
+    // 表示されなくなったタスクを選択から外す
+    function pruneSelection(listName, tasks) {
+        const visibleIds = new Set(tasks.map(task => String(task.id)));
+        selectedTaskIds[listName].forEach(id => {
+            if (!visibleIds.has(id)) selectedTaskIds[listName].delete(id);
+        });
+        updateBulkActionButtons();
+    }
+
+    function updateBulkActionButtons() {
+        activeBulkActions.classList.toggle('hidden', selectedTaskIds.active.size === 0);
+        bulkRestoreCompletedBtn.classList.toggle('hidden', selectedTaskIds.completed.size === 0);
+        bulkRestoreDeletedBtn.classList.toggle('hidden', selectedTaskIds.deleted.size === 0);
+    }
+    // --- End Multi-select ---
+
     // --- Task Rendering Functions ---
     function renderTasks(tasks) {
         let ul = document.getElementById('active-tasks-ul');
@@ -252,6 +311,8 @@ document.addEventListener('DOMContentLoaded', function() {
             existingNoTasksMessage.remove();
         }
 
+        pruneSelection('active', tasks || []);
+
         if (!tasks || tasks.length === 0) {
             const noTasksMessage = document.createElement('p');
             noTasksMessage.textContent = 'No active tasks.';
@@ -335,6 +396,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 scheduledDatesDiv.textContent = 'Scheduled: Not set';
             }
 
+            li.appendChild(createSelectCheckbox('active', task.id));
             li.appendChild(nameDiv);
             li.appendChild(limitDateDiv);
             li.appendChild(scheduledDatesDiv);
@@ -594,8 +656,35 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    function createCompletedTaskItem(task) {
+        const li = document.createElement('li');
+        li.className = 'task-item-condensed flex justify-between items-center py-2 text-sm text-gray-700 cursor-pointer'; 
+        li.dataset.taskId = task.id; 
+        
+        const textSpan = document.createElement('span');
+        textSpan.className = 'flex-grow';
+        textSpan.textContent = `${task.name} (Completed: ${new Date(task.actual_end_date).toLocaleDateString()})`;
+        
+        const restoreBtn = document.createElement('button');
+        restoreBtn.className = 'restore-btn bg-green-500 hover:bg-green-600 text-white px-3 py-1 text-xs rounded-md ml-2 transition-colors duration-200'; 
+        restoreBtn.dataset.taskId = task.id;
+        restoreBtn.textContent = 'Restore';
+        
+        li.appendChild(createSelectCheckbox('completed', task.id));
+        li.appendChild(textSpan);
+        li.appendChild(restoreBtn);
+
+        li.addEventListener('click', async (event) => {
+            if (!event.target.classList.contains('restore-btn')) {
+                showViewTaskDetailsPopupWithDetails(task.id);
+            }
+        });
+        return li;
+    }
+
     function renderCompletedTasks(tasks) {
         completedTasksListArea.innerHTML = ''; 
+        pruneSelection('completed', tasks || []);
         if (!tasks || tasks.length === 0) {
             const noCompletedMessage = document.createElement('p');
             noCompletedMessage.textContent = 'No completed tasks.';
@@ -605,34 +694,53 @@ document.addEventListener('DOMContentLoaded', function() {
         } 
         const ul = document.createElement('ul');
         ul.className = 'task-list-condensed divide-y divide-gray-200'; 
-        tasks.forEach(task => { 
-            const li = document.createElement('li');
-            li.className = 'task-item-condensed flex justify-between items-center py-2 text-sm text-gray-700 cursor-pointer'; 
-            li.dataset.taskId = task.id; 
-            
-            const textSpan = document.createElement('span');
-            textSpan.textContent = `${task.name} (Completed: ${new Date(task.actual_end_date).toLocaleDateString()})`;
-            
-            const restoreBtn = document.createElement('button');
-            restoreBtn.className = 'restore-btn bg-green-500 hover:bg-green-600 text-white px-3 py-1 text-xs rounded-md ml-2 transition-colors duration-200'; 
-            restoreBtn.dataset.taskId = task.id;
-            restoreBtn.textContent = 'Restore';
-            
-            li.appendChild(textSpan);
-            li.appendChild(restoreBtn);
-            ul.appendChild(li);
+        tasks.forEach(task => ul.appendChild(createCompletedTaskItem(task)));
+        completedTasksListArea.appendChild(ul);
+    }
 
-            li.addEventListener('click', async (event) => {
-                if (!event.target.classList.contains('restore-btn')) {
-                    showViewTaskDetailsPopupWithDetails(task.id);
-                }
-            });
+    // 追加で読み込んだページを既存のリストの末尾に追加する
+    function appendCompletedTasks(tasks) {
+        const ul = completedTasksListArea.querySelector('ul');
+        if (!ul) {
+            renderCompletedTasks(completedTasks);
+            return;
+        }
+        tasks.forEach(task => ul.appendChild(createCompletedTaskItem(task)));
+    }
+
+    function createDeletedTaskItem(task) {
+        const li = document.createElement('li');
+        li.className = 'task-item-condensed flex justify-between items-center py-2 text-sm text-gray-700 cursor-pointer'; 
+        li.dataset.taskId = task.id; 
+        
+        const textSpan = document.createElement('span');
+        textSpan.className = 'flex-grow';
+        let text = `${task.name} (Deleted: ${new Date(task.updated_at).toLocaleDateString()})`;
+        if (task.delete_reason) {
+            text += ` - Reason: ${task.delete_reason}`;
+        }
+        textSpan.textContent = text;
+
+        const restoreBtn = document.createElement('button');
+        restoreBtn.className = 'restore-btn bg-green-500 hover:bg-green-600 text-white px-3 py-1 text-xs rounded-md ml-2 transition-colors duration-200'; 
+        restoreBtn.dataset.taskId = task.id;
+        restoreBtn.textContent = 'Restore';
+        
+        li.appendChild(createSelectCheckbox('deleted', task.id));
+        li.appendChild(textSpan);
+        li.appendChild(restoreBtn);
+
+        li.addEventListener('click', async (event) => {
+            if (!event.target.classList.contains('restore-btn')) {
+                showViewTaskDetailsPopupWithDetails(task.id);
+            }
         });
-        completedTasksListArea.appendChild(ul);
+        return li;
     }
 
     function renderDeletedTasks(tasks) {
         deletedTasksListArea.innerHTML = ''; 
+        pruneSelection('deleted', tasks || []);
         if (!tasks || tasks.length === 0) {
             const noDeletedMessage = document.createElement('p');
             noDeletedMessage.textContent = 'No deleted tasks.';
@@ -642,41 +750,25 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         const ul = document.createElement('ul');
         ul.className = 'task-list-condensed divide-y divide-gray-200'; 
-        tasks.forEach(task => { 
-            const li = document.createElement('li');
-            li.className = 'task-item-condensed flex justify-between items-center py-2 text-sm text-gray-700 cursor-pointer'; 
-            li.dataset.taskId = task.id; 
-            
-            const textSpan = document.createElement('span');
-            let text = `${task.name} (Deleted: ${new Date(task.updated_at).toLocaleDateString()})`;
-            if (task.delete_reason) {
-                text += ` - Reason: ${task.delete_reason}`;
-            }
-            textSpan.textContent = text;
-
-            const restoreBtn = document.createElement('button');
-            restoreBtn.className = 'restore-btn bg-green-500 hover:bg-green-600 text-white px-3 py-1 text-xs rounded-md ml-2 transition-colors duration-200'; 
-            restoreBtn.dataset.taskId = task.id;
-            restoreBtn.textContent = 'Restore';
-            
-            li.appendChild(textSpan);
-            li.appendChild(restoreBtn);
-            ul.appendChild(li);
-
-            li.addEventListener('click', async (event) => {
-                if (!event.target.classList.contains('restore-btn')) {
-                    showViewTaskDetailsPopupWithDetails(task.id);
-                }
-            });
-        });
+        tasks.forEach(task => ul.appendChild(createDeletedTaskItem(task)));
         deletedTasksListArea.appendChild(ul);
     }
 
+    // 追加で読み込んだページを既存のリストの末尾に追加する
+    function appendDeletedTasks(tasks) {
+        const ul = deletedTasksListArea.querySelector('ul');
+        if (!ul) {
+            renderDeletedTasks(deletedTasks);
+            return;
+        }
+        tasks.forEach(task => ul.appendChild(createDeletedTaskItem(task)));
+    }
+
     // --- API Call and Data Handling Functions ---
     async function showEditTaskPopupWithDetails(taskId) {
         editErrorMessageDiv.textContent = ''; 
         try {
-            const response = await fetch(`/task/${taskId}`);
+            const response = await fetch(`${API_ROOT}/task/${taskId}`);
             if (!response.ok) {
                 const errorData = await response.json();
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
@@ -692,7 +784,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     async function showViewTaskDetailsPopupWithDetails(taskId) {
         try {
-            const response = await fetch(`/task/${taskId}`);
+            const response = await fetch(`${API_ROOT}/task/${taskId}`);
             if (!response.ok) {
                 const errorData = await response.json();
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
@@ -708,8 +800,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
 
     async function fetchAndRenderActiveTasks(sortBy = 'display_order') {
+        currentSortBy = sortBy; // 変更フィードで届いたタスクも同じ順序で並べる
         try {
-            const response = await fetch(`/get_tasks?sort_by=${sortBy}`);
+            const response = await fetch(`${API_ROOT}/get_tasks?sort_by=${sortBy}`);
             if (!response.ok) {
                 const errorData = await response.json();
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
@@ -721,51 +814,7 @@ document.addEventListener('DOMContentLoaded', function() {
             renderTasks(activeTasks); // ★ グローバル activeTasks を渡す ★
             console.log("fetchAndRenderActiveTasks: Calling renderGraphicalGantt.");
             renderGraphicalGantt(activeTasks); // ★ グローバル activeTasks を渡す ★
-            
-            const activeTasksULElement = document.getElementById('active-tasks-ul');
-            if (activeTasksULElement && sortBy === 'display_order' && activeTasks.length > 0) { // `tasks.length` を `activeTasks.length` に変更
-                 if (sortableInstance) {
-                    sortableInstance.destroy(); 
-                 }
-                sortableInstance = new Sortable(activeTasksULElement, {
-                    animation: 150,
-                    ghostClass: 'sortable-ghost',
-                    chosenClass: 'sortable-chosen',
-                    dragClass: 'sortable-drag',
-                    onEnd: async function (evt) {
-                        const parentEl = evt.to;
-                        const orderedIds = Array.from(parentEl.children).map(child => child.dataset.taskId);
-
-                        try {
-                            const sortResponse = await fetch('/update_task_order', {
-                                method: 'POST',
-                                headers: { 'Content-Type': 'application/json' },
-                                body: JSON.stringify({ ordered_ids: orderedIds }),
-                            });
-                            if (!sortResponse.ok) {
-                                const err = await sortResponse.json();
-                                console.error('Failed to update task order:', err.error);
-                                fetchAndRenderActiveTasks(); // エラー時は元の順序に戻す
-                                alert(`Error updating task order: ${err.error || 'Server error'}`);
-                            } else {
-                                console.log('Task order updated successfully.');
-                                // ★NEW: サーバー更新成功時も、必ず画面を再取得して更新する★
-                                fetchAndRenderActiveTasks();
-                                // prev: if (sortBy !== 'display_order') { fetchAndRenderActiveTasks('display_order'); }
-                                // 　　　↑これだと `sortBy` が `display_order` の場合に実行されない。
-                            }
-                        } catch (error) {
-                            console.error('Error sending task order:', error);
-                            fetchAndRenderActiveTasks(); // エラー時も再取得
-                            alert('Error sending task order to server.');
-                        }
-                    },
-                });
-            } else if (sortableInstance) {
-                // display_order 以外のソートの場合やタスクが0件の場合は並び替えを無効化
-                sortableInstance.destroy();
-                sortableInstance = null;
-            }
+            setupSortable();
 
         } catch (error) {
             console.error('Error fetching tasks:', error);
@@ -773,35 +822,349 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    async function fetchAndRenderCompletedTasks() { 
+    // display_order 順で表示している場合だけドラッグ&ドロップでの並び替えを有効にする
+    function setupSortable() {
+        const activeTasksULElement = document.getElementById('active-tasks-ul');
+        if (activeTasksULElement && currentSortBy === 'display_order' && activeTasks.length > 0) { // `tasks.length` を `activeTasks.length` に変更
+             if (sortableInstance) {
+                sortableInstance.destroy(); 
+             }
+            sortableInstance = new Sortable(activeTasksULElement, {
+                animation: 150,
+                ghostClass: 'sortable-ghost',
+                chosenClass: 'sortable-chosen',
+                dragClass: 'sortable-drag',
+                onEnd: async function (evt) {
+                    if (evt.oldIndex === evt.newIndex) return; // 位置が変わっていなければ何もしない
+
+                    // 移動したタスクと、移動先で上下に隣接するタスクだけを送る (サーバー側では移動したタスクの行だけが更新される)
+                    const prevItem = evt.item.previousElementSibling;
+                    const nextItem = evt.item.nextElementSibling;
+                    const movePayload = {
+                        task_id: evt.item.dataset.taskId,
+                        prev_id: prevItem ? prevItem.dataset.taskId : null,
+                        next_id: nextItem ? nextItem.dataset.taskId : null,
+                    };
+
+                    try {
+                        const sortResponse = await fetch(`${API_ROOT}/update_task_order`, {
+                            method: 'POST',
+                            headers: { 'Content-Type': 'application/json' },
+                            body: JSON.stringify(movePayload),
+                        });
+                        if (!sortResponse.ok) {
+                            const err = await sortResponse.json();
+                            console.error('Failed to update task order:', err.error);
+                            fetchAndRenderActiveTasks(); // エラー時は元の順序に戻す
+                            alert(`Error updating task order: ${err.error || 'Server error'}`);
+                        } else {
+                            console.log('Task order updated successfully.');
+                            // 新しい display_order は変更フィードで届く (未接続の場合は再取得する)
+                            refreshLists('active');
+                        }
+                    } catch (error) {
+                        console.error('Error sending task order:', error);
+                        fetchAndRenderActiveTasks(); // エラー時も再取得
+                        alert('Error sending task order to server.');
+                    }
+                },
+            });
+        } else if (sortableInstance) {
+            // display_order 以外のソートの場合やタスクが0件の場合は並び替えを無効化
+            sortableInstance.destroy();
+            sortableInstance = null;
+        }
+    }
+
+    /**
+     * Fetches one page of an archive listing (completed / deleted tasks).
+     * @param {string} url - The listing endpoint.
+     * @param {string|null} cursor - The next_cursor of the previous page, or null for the first page.
+     * @returns {Promise<{tasks: Array, next_cursor: string|null}>}
+     */
+    async function fetchArchivePage(url, cursor) {
+        const params = new URLSearchParams();
+        if (cursor) params.set('cursor', cursor);
+        const query = params.toString();
+        const response = await fetch(query ? `${url}?${query}` : url);
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    }
+
+    // loadMore が true の場合は次のページを読み込んで末尾に追加し、false の場合は先頭ページから再取得する
+    async function fetchAndRenderCompletedTasks(loadMore = false) { 
+        if (loadMore && (!completedNextCursor || isLoadingCompleted)) return;
+        isLoadingCompleted = true;
         try {
-            const response = await fetch('/get_completed_tasks');
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+            const page = await fetchArchivePage(`${API_ROOT}/get_completed_tasks`, loadMore ? completedNextCursor : null);
+            completedNextCursor = page.next_cursor;
+            if (loadMore) {
+                completedTasks = completedTasks.concat(page.tasks);
+                appendCompletedTasks(page.tasks);
+            } else {
+                completedTasks = page.tasks;
+                renderCompletedTasks(completedTasks);
             }
-            const tasks = await response.json();
-            completedTasks = tasks; // ★ 追加 ★
-            renderCompletedTasks(completedTasks); // 既存
         } catch (error) {
             console.error('Error fetching completed tasks:', error);
-            completedTasksListArea.innerHTML = `<p class="text-red-600">Error loading completed tasks: ${error.message}</p>付け`; 
+            completedTasksListArea.innerHTML = `<p class="text-red-600">Error loading completed tasks: ${error.message}</p>`; 
+        } finally {
+            isLoadingCompleted = false;
         }
     }
 
-    async function fetchAndRenderDeletedTasks() {
+    async function fetchAndRenderDeletedTasks(loadMore = false) {
+        if (loadMore && (!deletedNextCursor || isLoadingDeleted)) return;
+        isLoadingDeleted = true;
         try {
-            const response = await fetch('/get_deleted_tasks');
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+            const page = await fetchArchivePage(`${API_ROOT}/get_deleted_tasks`, loadMore ? deletedNextCursor : null);
+            deletedNextCursor = page.next_cursor;
+            if (loadMore) {
+                deletedTasks = deletedTasks.concat(page.tasks);
+                appendDeletedTasks(page.tasks);
+            } else {
+                deletedTasks = page.tasks;
+                renderDeletedTasks(deletedTasks);
             }
-            const tasks = await response.json();
-            deletedTasks = tasks; // ★ 追加 ★
-            renderDeletedTasks(deletedTasks); // 既存
         } catch (error) {
             console.error('Error fetching deleted tasks:', error);
             deletedTasksListArea.innerHTML = `<p class="text-red-600">Error loading deleted tasks: ${error.message}</p>`; 
+        } finally {
+            isLoadingDeleted = false;
+        }
+    }
+
+    // リストの下端付近までスクロールされたかどうか
+    function isScrolledNearBottom(element) {
+        return element.scrollTop + element.clientHeight >= element.scrollHeight - 50;
+    }
+
+    /**
+     * Applies many task actions in one request via /tasks/batch.
+     * @param {Array<Object>} operations - e.g. [{action: 'end', task_id: 1}, ...]
+     * @returns {Promise<Object>} The batch response ({applied, failed, results}).
+     */
+    async function runBatch(operations) {
+        const response = await fetch(`${API_ROOT}/tasks/batch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ operations }),
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw data;
+        }
+        return data;
+    }
+
+    // 選択中のタスクにまとめて action を適用する
+    async function handleBulkAction(listName, action, extraFields = {}) {
+        const taskIds = Array.from(selectedTaskIds[listName]);
+        if (taskIds.length === 0) return;
+
+        try {
+            const data = await runBatch(taskIds.map(taskId => ({ action, task_id: taskId, ...extraFields })));
+            const failures = data.results.filter(result => result.code !== 200);
+            if (failures.length > 0) {
+                alert(`${failures.length} task(s) could not be updated:\n` +
+                      failures.map(result => `#${result.task_id}: ${result.error}`).join('\n'));
+            }
+        } catch (error) {
+            console.error(`Error running bulk ${action}:`, error);
+            alert(`Error: ${error.error || '予期せぬエラーが発生しました。'}`);
+        }
+
+        selectedTaskIds[listName].clear();
+        updateBulkActionButtons();
+        refreshLists('active', 'completed', 'deleted');
+    }
+
+    // --- Live Updates (change feed) ---
+    // サーバーの変更ログを /events (SSE) で受け取り、変更されたタスクだけをローカルのリストに反映する。
+    // リスト全体を再取得しないので、クライアント数が増えてもサーバーの読み込みは変更の数にしか比例しない。
+    // SSE が使えない場合 (接続数の上限で 503 など) は /changes?since= を定期的にポーリングする。
+
+    // どのリストに表示されるか (status ごと)
+    const STATUS_LISTS = { todo: 'active', doing: 'active', completed: 'completed', deleted: 'deleted' };
+
+    function compareActiveTasks(a, b) {
+        const byLimitDate = a.limit_date.localeCompare(b.limit_date);
+        const byDisplayOrder = a.display_order - b.display_order;
+        return currentSortBy === 'limit_date' ? (byLimitDate || byDisplayOrder) : (byDisplayOrder || byLimitDate);
+    }
+
+    // 完了・削除済みリストと同じ並び順 (新しい順、同時刻は ID の大きい順)
+    function compareNewestFirst(field) {
+        return (a, b) => (b[field] || '').localeCompare(a[field] || '') || b.id - a.id;
+    }
+
+    const liveLists = {
+        active: {
+            get: () => activeTasks, set: (tasks) => { activeTasks = tasks; },
+            compare: compareActiveTasks, fullyLoaded: () => true,
+        },
+        completed: {
+            get: () => completedTasks, set: (tasks) => { completedTasks = tasks; },
+            compare: compareNewestFirst('actual_end_date'), fullyLoaded: () => !completedNextCursor,
+        },
+        deleted: {
+            get: () => deletedTasks, set: (tasks) => { deletedTasks = tasks; },
+            compare: compareNewestFirst('updated_at'), fullyLoaded: () => !deletedNextCursor,
+        },
+    };
+
+    /**
+     * Applies one change from the feed to the local lists: the task is removed
+     * from every list and re-inserted, in order, into the list for its status.
+     * @param {Object} change - {seq, task_id, action, task} (task is null if it no longer exists).
+     */
+    function applyTaskChange(change) {
+        const task = change.task;
+        const targetList = task ? STATUS_LISTS[task.status] : null;
+        Object.entries(liveLists).forEach(([listName, list]) => {
+            const tasks = list.get();
+            let updated = tasks.filter(t => t.id !== change.task_id);
+            if (listName === targetList) {
+                // まだ読み込んでいないページに入るタスクは追加しない (スクロールしたときに読み込まれる)
+                const last = updated[updated.length - 1];
+                if (list.fullyLoaded() || (last && list.compare(task, last) < 0)) {
+                    updated = updated.concat([task]).sort(list.compare);
+                }
+            }
+            if (updated.length !== tasks.length || listName === targetList) {
+                list.set(updated);
+                dirtyLists.add(listName);
+            }
+        });
+    }
+
+    function handleChanges(changes) {
+        let needsReload = false;
+        changes.forEach(change => {
+            if (lastChangeSeq !== null && change.seq <= lastChangeSeq) return; // 反映済み
+            if (change.action === 'import') {
+                needsReload = true; // 一括インポートはタスクごとの変更を持たないので、リストを読み直す
+            } else {
+                applyTaskChange(change);
+            }
+            lastChangeSeq = change.seq;
+        });
+        if (needsReload) {
+            scheduleReload();
+            return;
+        }
+        if (dirtyLists.size > 0) {
+            requestAnimationFrame(renderDirtyLists); // 連続した変更はまとめて 1 回だけ描画する
+        }
+    }
+
+    function renderDirtyLists() {
+        if (dirtyLists.has('active')) {
+            renderTasks(activeTasks);
+            renderGraphicalGantt(activeTasks);
+            setupSortable();
+        }
+        if (dirtyLists.has('completed')) {
+            const scrollTop = completedTasksListArea.scrollTop; // スクロール位置を保つ
+            renderCompletedTasks(completedTasks);
+            completedTasksListArea.scrollTop = scrollTop;
+        }
+        if (dirtyLists.has('deleted')) {
+            const scrollTop = deletedTasksListArea.scrollTop;
+            renderDeletedTasks(deletedTasks);
+            deletedTasksListArea.scrollTop = scrollTop;
+        }
+        dirtyLists.clear();
+    }
+
+    // インポート中は変更が続けて届くので、再読み込みは少し待ってから 1 回だけ行う
+    let reloadTimer = null;
+    function scheduleReload() {
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(reloadAllLists, 1000);
+    }
+
+    // 現在の変更番号を取得してから全リストを読み込む (その間の変更は後から差分として届く)
+    async function reloadAllLists() {
+        try {
+            const response = await fetch(`${API_ROOT}/changes`);
+            if (response.ok) {
+                lastChangeSeq = (await response.json()).last_seq;
+            }
+        } catch (error) {
+            console.error('Error fetching change feed position:', error);
+        }
+        await Promise.all([
+            fetchAndRenderActiveTasks(currentSortBy),
+            fetchAndRenderCompletedTasks(),
+            fetchAndRenderDeletedTasks(),
+        ]);
+    }
+
+    function connectChangeStream() {
+        if (!window.EventSource) {
+            startChangePolling();
+            return;
+        }
+        changeStream = new EventSource(`${API_ROOT}/events?since=${lastChangeSeq}`);
+        changeStream.addEventListener('change', (event) => handleChanges([JSON.parse(event.data)]));
+        changeStream.addEventListener('reset', () => reloadAllLists()); // 変更ログから外れるほど遅れた
+        changeStream.addEventListener('error', () => {
+            // CONNECTING の間はブラウザが Last-Event-ID 付きで自動的に再接続する。
+            // CLOSED (503 など) の場合はポーリングに切り替える。
+            if (changeStream.readyState === EventSource.CLOSED) {
+                changeStream = null;
+                startChangePolling();
+            }
+        });
+    }
+
+    function startChangePolling() {
+        if (!changePollTimer) {
+            changePollTimer = setInterval(pollChanges, CHANGE_POLL_INTERVAL_MS);
+        }
+    }
+
+    async function pollChanges() {
+        try {
+            const response = await fetch(`${API_ROOT}/changes?since=${lastChangeSeq}`);
+            if (!response.ok) return;
+            const data = await response.json();
+            if (data.reset) {
+                reloadAllLists();
+                return;
+            }
+            handleChanges(data.changes);
+            if (data.has_more) pollChanges();
+        } catch (error) {
+            console.error('Error polling changes:', error);
+        }
+    }
+
+    // 操作が成功した後に呼ぶ: 変更フィードに接続していれば差分が届くので何もしない (ポーリング中はすぐに問い合わせる)。
+    // フィードが使えない場合だけ、指定されたリストを再取得する。
+    function refreshLists(...listNames) {
+        if (listNames.includes('active') && currentSortBy !== 'display_order') {
+            fetchAndRenderActiveTasks(); // これまで通り、操作の後は display_order 順の表示に戻す
+            listNames = listNames.filter(name => name !== 'active');
+        }
+        if (changePollTimer) {
+            pollChanges();
+            return;
+        }
+        if (changeStream) return;
+        if (listNames.includes('active')) fetchAndRenderActiveTasks(currentSortBy);
+        if (listNames.includes('completed')) fetchAndRenderCompletedTasks();
+        if (listNames.includes('deleted')) fetchAndRenderDeletedTasks();
+    }
+
+    async function startLiveUpdates() {
+        await reloadAllLists();
+        if (lastChangeSeq !== null) {
+            connectChangeStream();
         }
     }
 
@@ -844,7 +1207,7 @@ document.addEventListener('DOMContentLoaded', function() {
         };
 
         try {
-            const response = await fetch('/add_task', {
+            const response = await fetch(`${API_ROOT}/add_task`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(taskData),
@@ -856,7 +1219,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             hideAddTaskPopup(); 
             addTaskForm.reset(); 
-            fetchAndRenderActiveTasks(); 
+            refreshLists('active'); 
         } catch (error) {
             console.error('Error adding task:', error);
             addErrorMessageDiv.textContent = `Error: ${error.error || '予期せぬエラーが発生しました。'}`;
@@ -902,7 +1265,7 @@ document.addEventListener('DOMContentLoaded', function() {
         };
 
         try {
-            const response = await fetch(`/update_task/${taskId}`, {
+            const response = await fetch(`${API_ROOT}/update_task/${taskId}`, {
                 method: 'POST', 
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(taskData),
@@ -913,7 +1276,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw err;
             }
             hideEditTaskPopup(); 
-            fetchAndRenderActiveTasks(); 
+            refreshLists('active'); 
         }
         catch (error) {
             console.error('Error updating task:', error);
@@ -927,7 +1290,7 @@ document.addEventListener('DOMContentLoaded', function() {
         deleteConfirmErrorMessageDiv.textContent = '';
 
         try {
-            const response = await fetch(`/delete_task/${taskId}`, {
+            const response = await fetch(`${API_ROOT}/delete_task/${taskId}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ delete_reason }),
@@ -938,8 +1301,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw err;
             }
             hideDeleteConfirmPopup(); 
-            fetchAndRenderActiveTasks(); 
-            fetchAndRenderDeletedTasks(); 
+            refreshLists('active', 'deleted'); 
         } catch (error) {
             console.error('Error deleting task:', error);
             deleteConfirmErrorMessageDiv.textContent = `Error: ${error.error || '予期せぬエラーが発生しました。'}`;
@@ -953,7 +1315,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (!taskId) return;
 
             try {
-                const response = await fetch(`/restore_task/${taskId}`, { method: 'POST' });
+                const response = await fetch(`${API_ROOT}/restore_task/${taskId}`, { method: 'POST' });
                 if (!response.ok) {
                     const err = await response.json();
                     throw err; 
@@ -965,9 +1327,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     hideViewTaskDetailsPopup();
                 }
 
-                fetchAndRenderActiveTasks(); 
-                fetchAndRenderCompletedTasks(); 
-                fetchAndRenderDeletedTasks(); 
+                refreshLists('active', 'completed', 'deleted'); 
             } catch (error) {
                 console.error('Error restoring task:', error);
                 alert(`Error restoring task: ${error.error || '予期せぬエラーが発生しました。'}`);
@@ -985,11 +1345,11 @@ document.addEventListener('DOMContentLoaded', function() {
         
         if (currentEditTaskDetails && currentEditTaskDetails.status === 'doing') {
             // 現在 'doing' なら Pause (Stop)
-            targetUrl = `/pause_task/${taskId}`;
+            targetUrl = `${API_ROOT}/pause_task/${taskId}`;
             successMessage = 'Task paused.';
         } else {
             // それ以外なら Start
-            targetUrl = `/start_task/${taskId}`;
+            targetUrl = `${API_ROOT}/start_task/${taskId}`;
             successMessage = 'Task started.';
         }
 
@@ -1009,7 +1369,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 currentEditTaskDetails.status = data.status; 
                 updateEditActionButtonsState(); // ボタンの状態を再更新
             }
-            fetchAndRenderActiveTasks(); 
+            refreshLists('active'); 
         } catch (error) {
             console.error('Error during start/stop task:', error);
             editErrorMessageDiv.textContent = `Error: ${error.error || '予期せぬエラーが発生しました。'}`;
@@ -1047,7 +1407,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const taskId = editTaskIdInput.value;
         editErrorMessageDiv.textContent = ''; 
         try {
-            const response = await fetch(`/end_task/${taskId}`, { method: 'POST' });
+            const response = await fetch(`${API_ROOT}/end_task/${taskId}`, { method: 'POST' });
             if (!response.ok) {
                 const err = await response.json();
                 throw err;
@@ -1061,8 +1421,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
 
             hideEditTaskPopup(); 
-            fetchAndRenderActiveTasks(); 
-            fetchAndRenderCompletedTasks(); 
+            refreshLists('active', 'completed'); 
         } catch (error) { 
             console.error('Error ending task:', error);
             editErrorMessageDiv.textContent = `Error: ${error.error || '予期せぬエラーが発生しました。'}`;
@@ -1071,6 +1430,28 @@ document.addEventListener('DOMContentLoaded', function() {
     
     completedTasksListArea.addEventListener('click', handleRestoreTask);
     deletedTasksListArea.addEventListener('click', handleRestoreTask);
+
+    // 一括操作
+    bulkCompleteBtn.addEventListener('click', () => handleBulkAction('active', 'end'));
+    bulkDeleteBtn.addEventListener('click', () => {
+        const deleteReason = prompt(`Delete ${selectedTaskIds.active.size} task(s)? Reason for delete (optional):`, '');
+        if (deleteReason === null) return; // キャンセル
+        handleBulkAction('active', 'delete', { delete_reason: deleteReason || null });
+    });
+    bulkRestoreCompletedBtn.addEventListener('click', () => handleBulkAction('completed', 'restore'));
+    bulkRestoreDeletedBtn.addEventListener('click', () => handleBulkAction('deleted', 'restore'));
+
+    // 下端までスクロールしたら次のページを読み込む
+    completedTasksListArea.addEventListener('scroll', () => {
+        if (isScrolledNearBottom(completedTasksListArea)) {
+            fetchAndRenderCompletedTasks(true);
+        }
+    });
+    deletedTasksListArea.addEventListener('scroll', () => {
+        if (isScrolledNearBottom(deletedTasksListArea)) {
+            fetchAndRenderDeletedTasks(true);
+        }
+    });
     
     if (popupOverlay) {
         popupOverlay.addEventListener('click', (event) => {
@@ -1097,8 +1478,6 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
    
-    // Initial fetch and render
-    fetchAndRenderActiveTasks();
-    fetchAndRenderCompletedTasks();
-    fetchAndRenderDeletedTasks();
+    // Initial fetch and render, then follow the change feed
+    startLiveUpdates();
 });
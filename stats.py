@@ -0,0 +1,242 @@
+# stats.py
+
+"""
+Incrementally maintained analytics over completed tasks.
+
+A completed task contributes to the task_daily_stats row of its completion
+day: one completion, its cycle time, lead time and slip. Whenever a route
+changes a task, it removes the task's old contribution and adds the new one
+(StatsDelta), and the net difference is written with one upsert per affected
+day, in the same transaction as the change. Completing, restoring or
+deleting a completed task, or editing its dates, therefore keeps the
+aggregates exact. /stats only reads the daily rows of the requested range
+and never rescans the history.
+"""
+
+from datetime import timedelta
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Task, TaskArchive, TaskDailyStats
+
+# Columns a contribution is computed from (selected by the routes' snapshots)
+STATS_FIELDS = ('status', 'is_not_main', 'created_at', 'limit_date',
+                'scheduled_end_date', 'actual_start_date', 'actual_end_date')
+
+# Aggregate columns of TaskDailyStats that deltas add to
+AGGREGATE_COLUMNS = (
+    'completed_count', 'cycle_time_sum', 'cycle_time_count',
+    'lead_time_sum', 'lead_time_count', 'limit_slip_sum', 'late_count',
+    'scheduled_slip_sum', 'scheduled_count', 'scheduled_late_count',
+)
+
+BUCKETS = ('day', 'week')
+
+
+def contribution(task):
+    """
+    Returns ((day, is_not_main), {column: value}) for a completed task, or
+    None if the task does not count towards the statistics.
+    """
+    end = task.actual_end_date
+    if task.status != 'completed' or end is None:
+        return None
+
+    values = {'completed_count': 1}
+    if task.actual_start_date is not None:
+        values['cycle_time_sum'] = (end - task.actual_start_date).total_seconds()
+        values['cycle_time_count'] = 1
+    if task.created_at is not None:
+        values['lead_time_sum'] = (end - task.created_at).total_seconds()
+        values['lead_time_count'] = 1
+    if task.limit_date is not None:
+        slip = (end - task.limit_date).total_seconds()
+        values['limit_slip_sum'] = slip
+        values['late_count'] = 1 if slip > 0 else 0
+    if task.scheduled_end_date is not None:
+        slip = (end - task.scheduled_end_date).total_seconds()
+        values['scheduled_slip_sum'] = slip
+        values['scheduled_count'] = 1
+        values['scheduled_late_count'] = 1 if slip > 0 else 0
+    return (end.date(), bool(task.is_not_main)), values
+
+
+def snapshot(task):
+    """
+    Copies the STATS_FIELDS of a task (ORM instance or row) so its old
+    contribution can be removed after the instance has been modified.
+    """
+    return SimpleNamespace(**{field: getattr(task, field) for field in STATS_FIELDS})
+
+
+class StatsDelta:
+    """
+    Net change of the daily aggregates caused by one transaction.
+    """
+
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, task, sign=1):
+        """
+        Adds (sign=1) or removes (sign=-1) the contribution of a task.
+        """
+        found = contribution(task)
+        if found is None:
+            return
+        key, values = found
+        row = self.rows.setdefault(key, dict.fromkeys(AGGREGATE_COLUMNS, 0))
+        for column, value in values.items():
+            row[column] += sign * value
+
+    def change(self, before, after):
+        """
+        Records a task going from the state `before` to the state `after`.
+        """
+        self.add(before, -1)
+        self.add(after, 1)
+
+    def apply(self, session):
+        """
+        Writes the non-zero differences, one upsert per (day, is_not_main).
+        """
+        for (day, is_not_main), values in self.rows.items():
+            if not any(values.values()):
+                continue # e.g. an edit that does not touch the dates
+            _upsert(session, day, is_not_main, values)
+        self.rows = {}
+
+
+def _upsert(session, day, is_not_main, values):
+    table = TaskDailyStats.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert
+        statement = insert(table).values(day=day, is_not_main=is_not_main, **values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['day', 'is_not_main'],
+            set_={column: table.c[column] + statement.excluded[column] for column in values},
+        )
+        session.execute(statement)
+        return
+
+    # Other databases: update the existing row, or insert it
+    updated = session.execute(
+        db.update(table)
+        .where(table.c.day == day, table.c.is_not_main == is_not_main)
+        .values({column: table.c[column] + value for column, value in values.items()})
+    )
+    if updated.rowcount == 0:
+        session.execute(db.insert(table).values(day=day, is_not_main=is_not_main, **values))
+
+
+def rebuild_stats(session=None, chunk_size=5000):
+    """
+    Recomputes every aggregate from the tasks and tasks_archive tables: used
+    to backfill the statistics of an existing database and by
+    `flask rebuild-stats`. Streams the completed tasks, so memory use stays flat.
+    Returns the number of completed tasks counted.
+    """
+    session = session or db.session
+    session.execute(db.delete(TaskDailyStats))
+    delta = StatsDelta()
+    counted = 0
+    for model in (Task, TaskArchive):
+        rows = session.execute(
+            db.select(*(getattr(model, field) for field in STATS_FIELDS))
+            .where(model.status == 'completed')
+            .execution_options(yield_per=chunk_size)
+        )
+        for row in rows:
+            delta.add(row)
+            counted += 1
+    # The table is empty, so every aggregate row is a plain INSERT
+    inserts = [{'day': day, 'is_not_main': is_not_main, **values}
+               for (day, is_not_main), values in delta.rows.items()]
+    if inserts:
+        session.execute(db.insert(TaskDailyStats), inserts)
+    session.commit()
+    return counted
+
+
+def stats_need_backfill(session=None):
+    """
+    True if there are completed tasks but no aggregates yet (a database
+    created before task_daily_stats existed).
+    """
+    session = session or db.session
+    has_stats = session.execute(db.select(TaskDailyStats.day).limit(1)).first() is not None
+    if has_stats:
+        return False
+    return any(session.execute(db.select(model.id).where(model.status == 'completed').limit(1)).first() is not None
+               for model in (Task, TaskArchive))
+
+
+def bucket_start(day, bucket):
+    return day - timedelta(days=day.weekday()) if bucket == 'week' else day
+
+
+def _hours(total_seconds, count):
+    return round(total_seconds / count / 3600, 2) if count else None
+
+
+def summarize(values):
+    """
+    Turns summed aggregate columns into the figures reported by /stats.
+    """
+    return {
+        'completed': values['completed_count'],
+        'avg_cycle_time_hours': _hours(values['cycle_time_sum'], values['cycle_time_count']),
+        'avg_lead_time_hours': _hours(values['lead_time_sum'], values['lead_time_count']),
+        'late': values['late_count'],
+        'avg_limit_slip_hours': _hours(values['limit_slip_sum'], values['completed_count']), # limit_date is mandatory
+        'scheduled': values['scheduled_count'],
+        'scheduled_late': values['scheduled_late_count'],
+        'avg_scheduled_slip_hours': _hours(values['scheduled_slip_sum'], values['scheduled_count']),
+    }
+
+
+def overdue_count(now, is_not_main=None):
+    """
+    Number of active tasks whose deadline has passed. Overdue-ness changes
+    with the clock rather than with writes, so it is counted live; the
+    range scan on the partial index ix_tasks_active_limit_date only visits
+    active tasks, never the archive.
+    """
+    statement = db.select(db.func.count()).select_from(Task) \
+        .where(Task.active_filter(), Task.limit_date < now)
+    if is_not_main is not None:
+        statement = statement.where(Task.is_not_main == is_not_main)
+    return db.session.execute(statement).scalar_one()
+
+
+def completion_series(start, end, bucket='day', is_not_main=None):
+    """
+    Reads the daily aggregates between the dates start and end (inclusive),
+    optionally for one is_not_main value, and sums them per bucket. Every
+    bucket in the range is returned, including empty ones.
+    Returns (series, totals).
+    """
+    statement = db.select(TaskDailyStats.day, *(getattr(TaskDailyStats, c) for c in AGGREGATE_COLUMNS)) \
+        .where(TaskDailyStats.day >= start, TaskDailyStats.day <= end)
+    if is_not_main is not None:
+        statement = statement.where(TaskDailyStats.is_not_main == is_not_main)
+
+    buckets = {}
+    day = bucket_start(start, bucket)
+    step = timedelta(days=7 if bucket == 'week' else 1)
+    while day <= end:
+        buckets[day] = dict.fromkeys(AGGREGATE_COLUMNS, 0)
+        day += step
+
+    totals = dict.fromkeys(AGGREGATE_COLUMNS, 0)
+    for row in db.session.execute(statement):
+        target = buckets[bucket_start(row.day, bucket)]
+        for column in AGGREGATE_COLUMNS:
+            value = getattr(row, column)
+            target[column] += value
+            totals[column] += value
+
+    series = [{'start': day.isoformat(), **summarize(values)} for day, values in buckets.items()]
+    return series, summarize(totals)
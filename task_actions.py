@@ -0,0 +1,206 @@
+# task_actions.py
+
+"""
+Validation and state transitions for the task lifecycle actions.
+
+Each plan_* function checks whether an action is allowed for a task and
+returns the column values to write together with the JSON body to report,
+without touching the database. The single-task routes in app.py apply the
+values to an ORM instance; /tasks/batch applies them to many tasks with bulk
+UPDATEs. Both therefore share exactly the same rules and messages.
+
+`task` only needs attribute access to the current column values, so it can be
+a Task instance or a plain snapshot of a row.
+"""
+
+import re
+from datetime import datetime
+
+DATE_FORMAT_ERROR = 'Invalid {field} format: . Use YYYY-MM-DD or YYYY-MM-DDTHH:MM'
+
+
+class ActionError(Exception):
+    """
+    Raised when an action is rejected; carries the HTTP status to report.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# Accepted date strings: 'YYYY-MM-DD', 'YYYY-MM-DDTHH:MM' and, for data coming
+# back from /export, 'YYYY-MM-DDTHH:MM:SS' with optional milli/microseconds.
+_DATETIME_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}(:\d{2}(\.\d{3}(\d{3})?)?)?)?')
+
+
+def parse_datetime(date_string):
+    """
+    Helper function to parse a date string into a datetime object.
+    Supports 'YYYY-MM-DDTHH:MM' and 'YYYY-MM-DD' formats, plus the ISO 8601
+    timestamps with seconds written by /export.
+    Returns None if the string is empty or parsing fails.
+    """
+    if not date_string:
+        return None
+    # Check the shape first, then let the C-implemented fromisoformat do the
+    # parsing: much faster than strptime, which matters for /import.
+    if not isinstance(date_string, str) or not _DATETIME_PATTERN.fullmatch(date_string):
+        return None
+    try:
+        return datetime.fromisoformat(date_string)
+    except ValueError:
+        # Right shape but not a real date (e.g. month 13)
+        return None
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def plan_update(task, data, now):
+    """
+    Edits a task's name, detail, dates and is_not_main flag.
+    """
+    # Extract and validate required fields
+    name = data.get('name')
+    if not name:
+        raise ActionError('Name is required')
+
+    limit_date_str = data.get('limit_date')
+    if not limit_date_str:
+        raise ActionError('Limit date is required')
+
+    limit_date = parse_datetime(limit_date_str)
+    if not limit_date:
+        raise ActionError(DATE_FORMAT_ERROR.format(field='limit_date'))
+
+    # Extract and validate optional date fields
+    scheduled_start_date_str = data.get('scheduled_start_date')
+    scheduled_end_date_str = data.get('scheduled_end_date')
+
+    scheduled_start_date = parse_datetime(scheduled_start_date_str)
+    scheduled_end_date = parse_datetime(scheduled_end_date_str)
+
+    if scheduled_start_date_str and not scheduled_start_date:
+        raise ActionError(DATE_FORMAT_ERROR.format(field='scheduled_start_date'))
+    if scheduled_end_date_str and not scheduled_end_date:
+        raise ActionError(DATE_FORMAT_ERROR.format(field='scheduled_end_date'))
+
+    # Validate consistency of scheduled dates
+    if (scheduled_start_date and not scheduled_end_date) or \
+       (not scheduled_start_date and scheduled_end_date):
+        raise ActionError('Both scheduled_start_date and scheduled_end_date must be provided if one is present, or both left empty.')
+
+    values = {
+        'name': name,
+        'detail': data.get('detail'), # Detail is optional
+        'limit_date': limit_date,
+        'scheduled_start_date': scheduled_start_date,
+        'scheduled_end_date': scheduled_end_date,
+        'is_not_main': data.get('is_not_main', task.is_not_main), # Default to existing value if not provided
+        'updated_at': now,
+    }
+    return values, {'message': 'Task updated successfully'}
+
+
+def plan_delete(task, data, now):
+    """
+    Soft-deletes a task (marks it as 'deleted').
+    """
+    values = {
+        'status': 'deleted',
+        'delete_reason': data.get('delete_reason', None), # Optional reason for deletion
+        'actual_end_date': now, # Mark deletion time as actual end time
+        'updated_at': now,
+    }
+    return values, {'message': 'Task deleted successfully'}
+
+
+def plan_start(task, data, now):
+    """
+    Marks a task as 'doing' and sets its actual start time.
+    """
+    # Handle idempotency: if already completed, do nothing further.
+    if task.status == 'completed':
+        return {}, {'message': 'Task is already completed', 'actual_start_date': _isoformat(task.actual_start_date)}
+
+    # Set actual_start_date only if not already set (first time starting)
+    actual_start_date = task.actual_start_date or now
+    values = {'actual_start_date': actual_start_date, 'status': 'doing', 'updated_at': now}
+    return values, {
+        'message': 'Task started',
+        'actual_start_date': actual_start_date.isoformat(),
+        'status': 'doing'
+    }
+
+
+def plan_pause(task, data, now):
+    """
+    Reverts a 'doing' task back to 'todo'. Keeps actual_start_date but
+    clears actual_end_date (if it was set).
+    """
+    if task.status != 'doing':
+        raise ActionError('Task is not in a "doing" state and cannot be paused.')
+
+    values = {'status': 'todo', 'actual_end_date': None, 'updated_at': now}
+    return values, {
+        'message': 'Task paused (returned to todo)',
+        'task_id': task.id,
+        'new_status': 'todo'
+    }
+
+
+def plan_end(task, data, now):
+    """
+    Marks a task as 'completed' and sets its actual end time.
+    """
+    # Handle idempotency: if already completed, do nothing further.
+    if task.status == 'completed':
+        return {}, {'message': 'Task is already completed', 'actual_end_date': _isoformat(task.actual_end_date)}
+
+    # Ensure task has a start time; if not, set it to now (e.g., if started and ended immediately)
+    actual_start_date = task.actual_start_date or now
+    values = {
+        'actual_start_date': actual_start_date,
+        'actual_end_date': now,
+        'status': 'completed',
+        'updated_at': now,
+    }
+    return values, {
+        'message': 'Task completed',
+        'actual_start_date': actual_start_date.isoformat(),
+        'actual_end_date': now.isoformat(),
+        'status': 'completed'
+    }
+
+
+def plan_restore(task, data, now):
+    """
+    Restores a 'completed' or 'deleted' task back to 'todo'.
+    """
+    if task.status not in ['completed', 'deleted']:
+        raise ActionError('Task is not in a restorable state (must be completed or deleted).')
+
+    # actual_start_date can remain, indicating it was once started.
+    # display_order is kept. It will reappear in active tasks based on this order.
+    values = {'status': 'todo', 'actual_end_date': None, 'delete_reason': None, 'updated_at': now}
+    return values, {
+        'message': 'Task restored successfully',
+        'task_id': task.id,
+        'new_status': 'todo'
+    }
+
+
+# Action names accepted by /tasks/batch
+ACTIONS = {
+    'update': plan_update,
+    'delete': plan_delete,
+    'start': plan_start,
+    'pause': plan_pause,
+    'end': plan_end,
+    'restore': plan_restore,
+}
+# Action name of each planner, as recorded in the change log
+ACTION_NAMES = {plan: name for name, plan in ACTIONS.items()}
@@ -0,0 +1,245 @@
+# transfer.py
+
+"""
+Streaming export and bulk import of the full task history.
+
+/export walks the tasks table with a server-side cursor (yield_per) and turns
+each partition of rows into one chunk of NDJSON or CSV, so memory use stays
+flat however many rows there are. /import reads the request body line by
+line, validates each row with the same rules as /add_task (dates go through
+parse_datetime), and inserts the valid rows in chunks: one executemany
+INSERT and one commit per chunk.
+
+Both formats carry every column (serializers.FULL_FIELDS), so an export can
+be imported again as-is. The export covers both tiers (tasks and
+tasks_archive); imported tasks always go to the tasks table.
+"""
+
+import csv
+import io
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Task, TaskArchive
+from serializers import FULL_FIELDS, DATETIME_FIELDS, dumps, loads, rows_to_dicts, select_fields
+from task_actions import DATE_FORMAT_ERROR, parse_datetime
+
+# Supported formats and their content types
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+TASK_STATUSES = ('todo', 'doing', 'completed', 'deleted')
+
+EXPORT_PARTITION_SIZE = 2000 # Rows fetched from the cursor per chunk written
+IMPORT_CHUNK_SIZE = 5000 # Rows per INSERT/commit
+IMPORT_MAX_ERRORS = 100 # Row errors reported back (the count is always exact)
+
+
+class ImportAborted(Exception):
+    """
+    Raised when a chunk cannot be written. Chunks committed before it stay
+    imported; `summary` tells how far the import got.
+    """
+
+    def __init__(self, message, summary, status=500):
+        super().__init__(message)
+        self.message = message
+        self.summary = summary
+        self.status = status
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_chunks(fmt, statuses=None):
+    """
+    Yields the export as encoded chunks, one per partition of the cursor.
+    Must run inside an application context (stream_with_context).
+    """
+    tiers = []
+    for model in (Task, TaskArchive):
+        statement = select_fields(FULL_FIELDS, model)
+        if statuses:
+            statement = statement.where(model.status.in_(statuses))
+        tiers.append(statement)
+    # Both sides are read in rowid order, so SQLite merges them without sorting
+    statement = db.union_all(*tiers).order_by('id')
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_PARTITION_SIZE))
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(FULL_FIELDS)
+        for rows in result.partitions():
+            writer.writerows([_csv_value(value) for value in row] for row in rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8') # Header only (no rows)
+    else:
+        for rows in result.partitions():
+            yield b''.join(dumps(task) + b'\n' for task in rows_to_dicts(rows, FULL_FIELDS))
+
+
+def read_lines(stream):
+    """
+    Decodes a binary request stream into text lines (UTF-8, optional BOM).
+    The stream is buffered first: iterating the raw WSGI input by lines would
+    read it one byte at a time.
+    """
+    first = True
+    for line in io.BufferedReader(stream, buffer_size=256 * 1024):
+        text = line.decode('utf-8')
+        if first:
+            text = text.lstrip('\ufeff')
+            first = False
+        yield text
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value in (None, '', 0, '0', 'false', 'False'):
+        return False
+    if value in (1, '1', 'true', 'True'):
+        return True
+    raise ValueError(f'Invalid is_not_main value: {value!r}')
+
+
+def validate_row(record, keep_ids=False, now=None):
+    """
+    Checks one imported record (dict of column name -> JSON/CSV value) and
+    returns the column values to insert. Raises ValueError with the reason
+    if the record is invalid.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Each record must be an object')
+
+    name = record.get('name')
+    if not name:
+        raise ValueError('Name is required')
+    if not record.get('limit_date'):
+        raise ValueError('Limit date is required')
+
+    values = {'name': name}
+    for field in DATETIME_FIELDS:
+        raw = record.get(field)
+        values[field] = parse_datetime(raw)
+        if raw and values[field] is None:
+            raise ValueError(DATE_FORMAT_ERROR.format(field=field))
+
+    if (values['scheduled_start_date'] is None) != (values['scheduled_end_date'] is None):
+        raise ValueError('Both scheduled_start_date and scheduled_end_date must be provided if one is present, or both left empty.')
+
+    status = record.get('status') or 'todo'
+    if status not in TASK_STATUSES:
+        raise ValueError(f'Invalid status: {status!r}')
+    values['status'] = status
+
+    try:
+        values['display_order'] = int(record.get('display_order') or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid display_order value: {record.get('display_order')!r}")
+    values['is_not_main'] = _parse_bool(record.get('is_not_main'))
+    values['detail'] = record.get('detail')
+    values['delete_reason'] = record.get('delete_reason')
+
+    # Keep the original timestamps when present
+    now = now or datetime.utcnow()
+    values['created_at'] = values['created_at'] or now
+    values['updated_at'] = values['updated_at'] or values['created_at']
+    # Finished tasks always have an end date (set by /end_task and /delete_task);
+    # it orders the completed/deleted lists and dates the statistics
+    if status in ('completed', 'deleted') and values['actual_end_date'] is None:
+        values['actual_end_date'] = values['updated_at']
+
+    if keep_ids:
+        try:
+            values['id'] = int(record['id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('A numeric "id" is required when keeping IDs')
+    return values
+
+
+def _records(lines, fmt):
+    """
+    Yields (line number, record or the ValueError that prevented decoding it).
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            # CSV has no NULL: empty cells become None, as in the export
+            yield reader.line_num, {field: value if value != '' else None for field, value in record.items()}
+    else:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield number, loads(line)
+            except ValueError as e:
+                yield number, ValueError(f'Invalid JSON: {e}')
+
+
+def import_tasks(lines, fmt, keep_ids=False, before_commit=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Imports tasks from text lines in the given format. Invalid rows are
+    skipped and reported; valid rows are inserted chunk by chunk.
+    before_commit(rows) is called with each chunk just before it commits,
+    so the caller can add its own bookkeeping to the same transaction.
+    Returns {'imported', 'skipped', 'errors': [{'line', 'error'}, ...]}.
+    Raises ImportAborted if a chunk cannot be written (e.g. duplicate IDs).
+    """
+    summary = {'imported': 0, 'skipped': 0, 'errors': []}
+    chunk = []
+    now = datetime.utcnow()
+
+    def write_chunk():
+        if keep_ids:
+            # The IDs of archived tasks are taken too
+            ids = [row['id'] for row in chunk]
+            archived = db.session.execute(
+                db.select(TaskArchive.id).where(TaskArchive.id.in_(ids)).limit(1)).scalar()
+            if archived is not None:
+                db.session.rollback()
+                raise ImportAborted(f'Import stopped, a chunk conflicts with archived task {archived}', summary, 409)
+        try:
+            # Core INSERT: one executemany for the whole chunk (the ORM bulk
+            # path splits rows into batches by which columns are NULL)
+            db.session.execute(Task.__table__.insert(), chunk)
+            if before_commit is not None:
+                before_commit(chunk)
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            raise ImportAborted(f'Import stopped, a chunk conflicts with existing tasks: {e.orig}', summary, 409)
+        except Exception as e:
+            db.session.rollback()
+            raise ImportAborted(f'Import stopped: {str(e)}', summary)
+        summary['imported'] += len(chunk)
+        chunk.clear()
+
+    for line_number, record in _records(lines, fmt):
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            chunk.append(validate_row(record, keep_ids, now))
+        except ValueError as e:
+            summary['skipped'] += 1
+            if len(summary['errors']) < IMPORT_MAX_ERRORS:
+                summary['errors'].append({'line': line_number, 'error': str(e)})
+            continue
+        if len(chunk) >= chunk_size:
+            write_chunk()
+    if chunk:
+        write_chunk()
+    return summary